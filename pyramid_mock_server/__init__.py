@@ -9,6 +9,8 @@ from __future__ import unicode_literals
 import sys
 
 import six
+from pyramid.settings import asbool
+from pyramid.settings import aslist
 
 from pyramid_mock_server.swagger_util import get_swagger20_resources_iterator_from_pyramid_swagger
 from pyramid_mock_server.view_maker import setup_routes_views
@@ -23,6 +25,25 @@ def includeme(config):
     custom_view_packages = settings.get('pyramid_mock_server.custom_view_packages')
     responses_path = settings.get('pyramid_mock_server.mock_responses_path')
     excluded_paths = settings.get('pyramid_mock_server.excluded_paths')
+    match_cache_size = int(settings.get('pyramid_mock_server.match_cache_size', 0))
+    gzip_min_size = settings.get('pyramid_mock_server.gzip_min_size')
+    if gzip_min_size is not None:
+        gzip_min_size = int(gzip_min_size)
+    cache_control = settings.get('pyramid_mock_server.cache_control')
+    lazy_rendering = asbool(settings.get('pyramid_mock_server.lazy_rendering', False))
+    load_workers = int(settings.get('pyramid_mock_server.load_workers', 0))
+    render_cache_directory = settings.get('pyramid_mock_server.render_cache_directory')
+    bytecode_cache_directory = settings.get('pyramid_mock_server.bytecode_cache_directory')
+    reload_interval = settings.get('pyramid_mock_server.reload_interval')
+    if reload_interval is not None:
+        reload_interval = float(reload_interval)
+    json_codec = settings.get('pyramid_mock_server.json_codec')
+    json_format = settings.get('pyramid_mock_server.json_format')
+    detect_static_files = asbool(settings.get('pyramid_mock_server.detect_static_files', False))
+    ignore_patterns = aslist(settings.get('pyramid_mock_server.ignore_patterns', ''))
+    radix_routing = asbool(settings.get('pyramid_mock_server.radix_routing', False))
+    fault_profiles_path = settings.get('pyramid_mock_server.fault_profiles_path')
+    response_arena = settings.get('pyramid_mock_server.response_arena') or None
 
     # Read resources:
     resources = settings.get('pyramid_mock_server.resources', [])
@@ -48,4 +69,19 @@ def includeme(config):
         resources=resources,
         excluded_paths=excluded_paths,
         custom_view_packages=custom_view_packages,
+        match_cache_size=match_cache_size,
+        gzip_min_size=gzip_min_size,
+        cache_control=cache_control,
+        lazy_rendering=lazy_rendering,
+        load_workers=load_workers,
+        render_cache_directory=render_cache_directory,
+        bytecode_cache_directory=bytecode_cache_directory,
+        reload_interval=reload_interval,
+        json_codec=json_codec,
+        json_format=json_format,
+        detect_static_files=detect_static_files,
+        ignore_patterns=ignore_patterns,
+        radix_routing=radix_routing,
+        fault_profiles_path=fault_profiles_path,
+        response_arena=response_arena,
     )
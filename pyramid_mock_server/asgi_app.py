@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+ASGI application serving the mock responses from an event loop, so slow clients
+and slow custom views do not hold a thread each.
+
+This module uses the python 3.5+ coroutine syntax, it cannot be imported on python 2.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from pyramid.httpexceptions import HTTPException
+from pyramid.request import Request
+
+from pyramid_mock_server.fast_app import FastMockApp
+from pyramid_mock_server.view_maker import is_coroutine_view
+from pyramid_mock_server.view_maker import make_response
+
+
+def make_blocking_view(view):
+    """ Make a view function running a coroutine view in its own event loop,
+    for the WSGI applications.
+
+    :param view: coroutine function taking a pyramid request
+    :return: view function
+    """
+    def blocking_view(request):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(view(request))
+        finally:
+            loop.close()
+    return blocking_view
+
+
+def _make_environ(scope):
+    """ Make the WSGI environment of an ASGI request, without wsgi.input
+
+    :param scope: ASGI http connection scope
+    :return: dict
+    """
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': 'HTTP/{0}'.format(scope.get('http_version', '1.1')),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        value = value.decode('latin-1')
+        if name in environ:
+            value = environ[name] + ',' + value
+        environ[name] = value
+    return environ
+
+
+async def _set_wsgi_input(environ, receive):
+    """ Read the whole body of an ASGI request into the WSGI environment """
+    body = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        body.append(message.get('body', b''))
+        more_body = message.get('more_body', False)
+    environ['wsgi.input'] = io.BytesIO(b''.join(body))
+    # The body can be read even if the client sent no Content-Length
+    environ['wsgi.input_terminated'] = True
+
+
+async def _send_response(send, status_code, headerlist, app_iter):
+    """
+    :param status_code: int
+    :param headerlist: list of (name, value) strings
+    :param app_iter: iterable of bytes
+    """
+    await send({
+        'type': 'http.response.start',
+        'status': status_code,
+        'headers': [
+            (name.lower().encode('latin-1'), value.encode('latin-1'))
+            for name, value in headerlist
+        ],
+    })
+    # The last chunk is held back to be sent with more_body False
+    pending_chunk = b''
+    try:
+        for chunk in app_iter:
+            if pending_chunk:
+                await send({'type': 'http.response.body', 'body': pending_chunk, 'more_body': True})
+            pending_chunk = chunk
+    finally:
+        close = getattr(app_iter, 'close', None)
+        if close is not None:
+            close()
+    await send({'type': 'http.response.body', 'body': pending_chunk})
+
+
+def _call_wsgi_app(app, environ):
+    """ Call a WSGI application and read its whole response
+
+    :return: (status code, headerlist, body) tuple
+    """
+    started = []
+
+    def start_response(status, headerlist, exc_info=None):
+        started[:] = [int(status.split(' ', 1)[0]), headerlist]
+        return lambda data: None
+
+    app_iter = app(environ, start_response)
+    try:
+        body = b''.join(app_iter)
+    finally:
+        close = getattr(app_iter, 'close', None)
+        if close is not None:
+            close()
+    return started[0], started[1], body
+
+
+class ASGIMockApp(object):
+    """ ASGI application serving the mock responses of a pyramid application
+    including pyramid_mock_server.
+
+    The mock responses are sent from the event loop, as the FastMockApp does, and
+    their simulated latency is awaited without holding a thread.
+    Coroutine custom views are awaited in the event loop, and the other custom
+    views are called in a thread pool, with a pyramid request holding the
+    matchdict and the registry of the application. All the other requests are
+    passed to the pyramid application, in the thread pool.
+
+    As the tweens are skipped, neither is the pyramid_swagger validation done
+    for the mock responses and the custom views.
+    """
+
+    def __init__(self, pyramid_app, max_workers=None):
+        """
+        :param pyramid_app: pyramid Router made from a config including pyramid_mock_server
+        :param max_workers: size of the thread pool running the blocking views and the
+            pyramid application, the concurrent.futures default if None.
+        """
+        self._fast_app = FastMockApp(pyramid_app)
+        self._registry = pyramid_app.registry
+        self._custom_views = pyramid_app.registry.pyramid_mock_server_custom_views
+        self._fault_profiles = pyramid_app.registry.pyramid_mock_server_fault_profiles
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise ValueError('Unsupported ASGI connection type {0!r}'.format(scope['type']))
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.shutdown':
+                self._executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+
+    async def _http(self, scope, receive, send):
+        environ = _make_environ(scope)
+        route_match = self._fast_app.match_route(environ)
+
+        if route_match is not None:
+            route, matchdict = route_match
+            view = self._custom_views.get(route.name, {}).get(environ['REQUEST_METHOD'])
+            if view is not None:
+                await self._call_custom_view(view, route, matchdict, environ, receive, send)
+                return
+
+            mock_response = self._fast_app.match_mock_response(route, matchdict, environ)
+            if mock_response is not None:
+                await self._send_mock_response(mock_response, environ, send)
+                return
+
+        await _set_wsgi_input(environ, receive)
+        status_code, headerlist, body = await asyncio.get_event_loop().run_in_executor(
+            self._executor,
+            _call_wsgi_app,
+            self._fast_app,
+            environ,
+        )
+        await _send_response(send, status_code, headerlist, [body])
+
+    async def _send_mock_response(self, mock_response, environ, send):
+        if self._fault_profiles is not None:
+            delay, mock_response = self._fault_profiles.apply(mock_response)
+            # The event loop keeps serving the other requests in the meantime
+            if delay:
+                await asyncio.sleep(delay)
+
+        if 'HTTP_IF_NONE_MATCH' in environ:
+            # Let webob answer the conditional requests, the body is already in memory
+            status_code, headerlist, body = _call_wsgi_app(
+                make_response(mock_response, Request(environ)),
+                environ,
+            )
+            await _send_response(send, status_code, headerlist, [body])
+            return
+
+        data, headerlist = mock_response.body.select(environ.get('HTTP_ACCEPT_ENCODING'))
+        await _send_response(
+            send,
+            mock_response.http_response_code,
+            headerlist,
+            [data] if isinstance(data, bytes) else data.iter_chunks(),
+        )
+
+    async def _call_custom_view(self, view, route, matchdict, environ, receive, send):
+        await _set_wsgi_input(environ, receive)
+        request = Request(environ)
+        request.registry = self._registry
+        request.matched_route = route
+        request.matchdict = matchdict
+
+        try:
+            if is_coroutine_view(view):
+                response = await view(request)
+            else:
+                response = await asyncio.get_event_loop().run_in_executor(
+                    self._executor,
+                    view,
+                    request,
+                )
+        except HTTPException as e:
+            # Like the pyramid default exception view, the exception is the response
+            status_code, headerlist, body = _call_wsgi_app(e, environ)
+            await _send_response(send, status_code, headerlist, [body])
+            return
+        await _send_response(send, response.status_code, response.headerlist, response.app_iter)
@@ -3,41 +3,35 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import json
-import os
+import io
 import sys
 from argparse import ArgumentParser
 from copy import deepcopy
 
 from bravado_core.spec import Spec
-from pyramid.config import Configurator
 from webtest import AppError
 from webtest import TestApp
 
+from pyramid_mock_server.json_codec import get_json_codec
+from pyramid_mock_server.serve import make_wsgi_app
 
-def _mock_server_app(swagger_spec_path, mock_responses_path, custom_view_packages):
-    """Create the WSGI application, post-fork."""
-
-    # Create a basic pyramid Configurator.
-    config = Configurator(settings={
-        'service_name': 'mobile_api_mock_server',
-
-        'pyramid_swagger.dereference_served_schema': True,
-        'pyramid_swagger.schema_directory': os.path.abspath(os.path.dirname(swagger_spec_path)),
-        'pyramid_swagger.schema_file': os.path.basename(swagger_spec_path),
-        'pyramid_swagger.swagger_versions': ['2.0'],
-        'pyramid_swagger.enable_request_validation': False,
-        'pyramid_swagger.enable_response_validation': True,
 
-        # pyramid_mock_server config
-        'pyramid_mock_server.mock_responses_path': mock_responses_path,
-        'pyramid_mock_server.get_resources_from_pyramid_swagger_2_0_schema': True,
-        'pyramid_mock_server.custom_view_packages': custom_view_packages or [],
-    })
+def _write_utf8(stream, text):
+    """ Write text to a text stream as UTF-8, whatever its encoding: the one of
+    stdout depends on the locale, and is ascii on python 2 when it is piped.
+    """
+    stream.flush()
+    getattr(stream, 'buffer', stream).write(text.encode('utf-8'))
 
-    config.include('pyramid_mock_server')
 
-    return TestApp(config.make_wsgi_app())
+def _mock_server_app(swagger_spec_path, mock_responses_path, custom_view_packages, json_codec=None):
+    """Create the WSGI application, post-fork."""
+    return TestApp(make_wsgi_app(
+        swagger_spec_path,
+        mock_responses_path,
+        custom_view_packages=custom_view_packages,
+        settings={'pyramid_mock_server.json_codec': json_codec},
+    ))
 
 
 def _bravado_core_spec(mock_server_app):
@@ -99,12 +93,22 @@ def main(argv=None):
         help='By default the generated specs are validated to ensure that they '
              'could be used in clientlibs',
     )
+    parser.add_argument(
+        '--json-codec',
+        dest='json_codec',
+        default='json',
+        choices=['auto', 'json', 'orjson', 'ujson'],
+        help='JSON library used to load the mock responses and write the specs, '
+             'auto picks the fastest installed one',
+    )
     args = parser.parse_args(argv)
+    json_codec = get_json_codec(args.json_codec)
 
     mock_server_app = _mock_server_app(
         args.swagger_spec,
         args.mock_responses,
         args.custom_view,
+        json_codec=json_codec.name,
     )
     bravado_core_spec = _bravado_core_spec(mock_server_app)
     flattened_enhanced_specs = _insert_examples_in_flattened_specs(
@@ -116,11 +120,12 @@ def main(argv=None):
         # NOTE: Spec.from_dict alters the input specs, so we need to copy them
         Spec.from_dict(deepcopy(flattened_enhanced_specs))
 
+    output = json_codec.dumps(flattened_enhanced_specs, indent=2)
     if not args.output:
-        print(json.dumps(flattened_enhanced_specs, sort_keys=True, indent=2))
+        _write_utf8(sys.stdout, output + '\n')
     else:
-        with open(args.output, 'w') as f:
-            json.dump(flattened_enhanced_specs, f, sort_keys=True, indent=2)
+        with io.open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
 
     return 0
 
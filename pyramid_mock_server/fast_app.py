@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+WSGI application serving the mock responses straight from the ResponseCollection,
+without going through the pyramid request processing.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import time
+
+import six
+from pyramid.interfaces import IRoutesMapper
+from six.moves.urllib.parse import parse_qsl
+from webob import Request
+from webob.util import status_generic_reasons
+from webob.util import status_reasons
+
+from pyramid_mock_server.router import build_route_index
+from pyramid_mock_server.view_maker import make_mock_response_matcher
+from pyramid_mock_server.view_maker import make_response
+
+
+def _wsgi_to_bytes(wsgi_string):
+    """
+    :return: the raw bytes of a WSGI environment string, they are decoded as latin-1
+        on python 3.
+    """
+    if six.PY2:  # pragma: no cover
+        return wsgi_string
+    return wsgi_string.encode('latin-1')  # pragma: python3 only
+
+
+def _parse_query(query_string):
+    """
+    :return: list of (name, value) WSGI strings
+    """
+    if six.PY2:  # pragma: no cover
+        return parse_qsl(query_string, keep_blank_values=True)
+    return parse_qsl(  # pragma: python3 only
+        query_string,
+        keep_blank_values=True,
+        encoding='latin-1',
+    )
+
+
+def _decode_path(environ):
+    """
+    :return: the decoded PATH_INFO, like the path_info of the pyramid requests.
+    :raises: UnicodeDecodeError if it is not valid UTF-8
+    """
+    return _wsgi_to_bytes(environ.get('PATH_INFO') or str('/')).decode('utf-8')
+
+
+def _decode_query(environ):
+    """
+    :return: dict of the query arguments, the last value wins like with request.GET
+    :raises: UnicodeDecodeError if they are not valid UTF-8
+    """
+    return {
+        _wsgi_to_bytes(name).decode('utf-8'): _wsgi_to_bytes(value).decode('utf-8')
+        for name, value in _parse_query(environ.get('QUERY_STRING', str('')))
+    }
+
+
+def _make_status(code):
+    """
+    :return: the WSGI status line of an HTTP status code, like webob makes it
+    """
+    reason = status_reasons.get(code) or status_generic_reasons[code // 100]
+    return str('{0} {1}').format(code, reason)
+
+
+class FastMockApp(object):
+    """ WSGI application serving the mock responses of a pyramid application
+    including pyramid_mock_server, without the pyramid request, tweens and view lookup.
+
+    The requests it cannot answer itself are passed to the pyramid application:
+    the routes that are not served by the generated mock views (custom views,
+    excluded paths, the other views of the application), the routes using regular
+    expressions or predicates, the endpoints without mock response, and the
+    paths or query strings which are not valid UTF-8.
+
+    As the tweens are skipped, neither is the pyramid_swagger validation done.
+    """
+
+    def __init__(self, pyramid_app):
+        """
+        :param pyramid_app: pyramid Router made from a config including pyramid_mock_server
+        """
+        registry = pyramid_app.registry
+        try:
+            self._response_collection = registry.pyramid_mock_server_response_collection
+            self._mock_operations = registry.pyramid_mock_server_mock_operations
+            self._fault_profiles = registry.pyramid_mock_server_fault_profiles
+        except AttributeError:
+            raise ValueError('pyramid_mock_server is not included in the pyramid application')
+
+        self._pyramid_app = pyramid_app
+        # The routes are kept in the pyramid order, the first matching one wins
+        self._tree, self._other_routes = build_route_index(
+            registry.getUtility(IRoutesMapper).get_routes(),
+        )
+
+        # {operation: (response collection version, matcher)}
+        self._matchers = {}
+        self._statuses = {}
+
+    def _get_matcher(self, operation):
+        version = self._response_collection.version
+        matcher_version, matcher = self._matchers.get(operation, (None, None))
+        if matcher_version != version:
+            matcher = make_mock_response_matcher(
+                self._response_collection.get_variations(operation),
+            )
+            self._matchers[operation] = (version, matcher)
+        return matcher
+
+    def _get_status(self, code):
+        status = self._statuses.get(code)
+        if status is None:
+            status = self._statuses[code] = _make_status(code)
+        return status
+
+    def match_route(self, environ):
+        """ Find the route pyramid would match for a request
+
+        :param environ: WSGI environment of the request
+        :return: (route, matchdict) tuple, or None if no route is found or if it
+            can only be found by pyramid
+        """
+        try:
+            path = _decode_path(environ)
+        except UnicodeDecodeError:
+            return None
+
+        tree_match = self._tree.match(path)
+        if tree_match is None:
+            return None
+        index, route, matchdict = tree_match
+
+        # An earlier route pyramid would try first matches as well
+        for route_index, other_route in self._other_routes:
+            if route_index > index:
+                break
+            if other_route.match(path) is not None:
+                return None
+
+        return route, matchdict
+
+    def match_mock_response(self, route, matchdict, environ):
+        """ Find the mock response of a request for a matched route
+
+        :param route: pyramid route matching the request
+        :param matchdict: path arguments of the request
+        :param environ: WSGI environment of the request
+        :return: MockResponse, or None if the request has to be handled by pyramid
+        """
+        operation = self._mock_operations.get(route.name, {}).get(environ.get('REQUEST_METHOD'))
+        if operation is None:
+            return None
+        matcher = self._get_matcher(operation)
+        if matcher is None:
+            return None
+
+        try:
+            return matcher(matchdict, lambda: _decode_query(environ))
+        except UnicodeDecodeError:
+            return None
+
+    def match(self, environ):
+        """ Find the mock response of a request
+
+        :param environ: WSGI environment of the request
+        :return: MockResponse, or None if the request has to be handled by pyramid
+        """
+        route_match = self.match_route(environ)
+        if route_match is None:
+            return None
+        return self.match_mock_response(route_match[0], route_match[1], environ)
+
+    def __call__(self, environ, start_response):
+        mock_response = self.match(environ)
+        if mock_response is None:
+            return self._pyramid_app(environ, start_response)
+
+        if self._fault_profiles is not None:
+            delay, mock_response = self._fault_profiles.apply(mock_response)
+            if delay:
+                time.sleep(delay)
+
+        if 'HTTP_IF_NONE_MATCH' in environ:
+            # Let webob answer the conditional requests
+            return make_response(mock_response, Request(environ))(environ, start_response)
+
+        data, headerlist = mock_response.body.select(environ.get('HTTP_ACCEPT_ENCODING'))
+        start_response(self._get_status(mock_response.http_response_code), list(headerlist))
+        if isinstance(data, bytes):
+            return [data]
+        # Mapped file or arena slice
+        return data.app_iter(environ)
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Simulated latency and faults of the mock responses, declared per endpoint or per
+variation in a JSON file, eg.
+
+    {
+        "foo_response.GET": {
+            "latency": {"percentiles": {"50": 0.02, "99": 0.5}},
+            "faults": [{"status": 503, "rate": 0.01}]
+        },
+        "foo_{foo_id#42}_v1_response.POST": {
+            "latency": {"uniform": [1, 2]}
+        }
+    }
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import bisect
+import io
+import numbers
+import random
+
+import six
+
+from pyramid_mock_server.json_codec import get_json_codec
+from pyramid_mock_server.mock_loader import MockResponse
+from pyramid_mock_server.util import extract_operation_and_response_code_from_filename
+from pyramid_mock_server.util import norm_operation
+
+
+_DEFAULT_FAULT_BODY = {'message': 'Injected fault'}
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def _is_status(value):
+    return (
+        isinstance(value, six.integer_types) and
+        not isinstance(value, bool) and
+        100 <= value <= 599
+    )
+
+
+def _make_fixed_sampler(delay):
+    if not _is_number(delay) or delay < 0:
+        raise ValueError('Invalid delay {0!r}'.format(delay))
+    return lambda random_generator: delay
+
+
+def _make_uniform_sampler(bounds):
+    if (
+        not isinstance(bounds, (list, tuple)) or
+        len(bounds) != 2 or
+        not all(_is_number(bound) for bound in bounds)
+    ):
+        raise ValueError('Invalid uniform delay bounds {0!r}'.format(bounds))
+    low, high = bounds
+    if not 0 <= low <= high:
+        raise ValueError('Invalid uniform delay bounds {0!r}'.format(bounds))
+    return lambda random_generator: random_generator.uniform(low, high)
+
+
+def _make_percentiles_sampler(delays_by_percentile):
+    """ The delays are interpolated linearly between the given percentiles, the
+    requests below the first percentile get its delay, the ones above the last
+    percentile get its delay.
+    """
+    if (
+        not isinstance(delays_by_percentile, dict) or
+        not all(_is_number(delay) for delay in delays_by_percentile.values())
+    ):
+        raise ValueError('Invalid delay percentiles {0!r}'.format(delays_by_percentile))
+    points = sorted(
+        (float(percentile), delay) for percentile, delay in delays_by_percentile.items()
+    )
+    percentiles = [percentile for percentile, _ in points]
+    delays = [delay for _, delay in points]
+    if (
+        not points or
+        not 0 <= percentiles[0] <= percentiles[-1] <= 100 or
+        delays[0] < 0 or
+        delays != sorted(delays)
+    ):
+        raise ValueError('Invalid delay percentiles {0!r}'.format(delays_by_percentile))
+
+    def sample(random_generator):
+        percentile = random_generator.random() * 100
+        index = bisect.bisect_left(percentiles, percentile)
+        if index == 0:
+            return delays[0]
+        if index == len(points):
+            return delays[-1]
+        low_percentile, low_delay = points[index - 1]
+        high_percentile, high_delay = points[index]
+        ratio = (percentile - low_percentile) / (high_percentile - low_percentile)
+        return low_delay + ratio * (high_delay - low_delay)
+
+    return sample
+
+
+_SAMPLER_FACTORIES = {
+    'fixed': _make_fixed_sampler,
+    'uniform': _make_uniform_sampler,
+    'percentiles': _make_percentiles_sampler,
+}
+
+
+def _make_delay_sampler(latency):
+    """
+    :param latency: {kind: parameters} dict, with a single kind among _SAMPLER_FACTORIES
+    :return: function(random_generator) returning a delay in seconds
+    """
+    if (
+        not isinstance(latency, dict) or
+        len(latency) != 1 or
+        next(iter(latency)) not in _SAMPLER_FACTORIES
+    ):
+        raise ValueError(
+            'Invalid latency {0!r}, it must have one of the keys {1}'.format(
+                latency,
+                ', '.join(sorted(_SAMPLER_FACTORIES)),
+            ),
+        )
+    kind, parameters = next(iter(latency.items()))
+    return _SAMPLER_FACTORIES[kind](parameters)
+
+
+class FaultProfile(object):
+    """ Latency and faults of the responses of an operation """
+
+    def __init__(self, operation, latency=None, faults=(), json_codec=None):
+        """
+        :param operation: Operation the profile applies to
+        :param latency: {'fixed': seconds}, {'uniform': [min seconds, max seconds]} or
+            {'percentiles': {percentile: seconds}} dict, or None for no delay.
+        :param faults: list of {'status': int, 'rate': float, 'body': JSON document} dicts,
+            the status must be an HTTP status code between 100 and 599,
+            each fault is served instead of the mock response at the given rate.
+            The body is optional.
+        :param json_codec: JSONCodec serializing the fault bodies
+        """
+        json_codec = json_codec or get_json_codec()
+        self._delay_sampler = _make_delay_sampler(latency) if latency else None
+        # (cumulated rate, MockResponse) tuples
+        self._faults = []
+        cumulated_rate = 0
+        for fault in faults:
+            if not isinstance(fault, dict) or set(fault) - {'rate', 'status', 'body'}:
+                raise ValueError('Invalid fault {0!r}'.format(fault))
+            rate = fault.get('rate')
+            status = fault.get('status')
+            if not _is_status(status):
+                raise ValueError('Invalid fault status {0!r}'.format(status))
+            if not _is_number(rate) or not 0 <= rate <= 1:
+                raise ValueError('Invalid fault rate {0!r}'.format(rate))
+            cumulated_rate += rate
+            self._faults.append((
+                cumulated_rate,
+                MockResponse(
+                    operation,
+                    json_codec.dumps(fault.get('body', _DEFAULT_FAULT_BODY)),
+                    status,
+                ),
+            ))
+        if cumulated_rate > 1:
+            raise ValueError('The fault rates add up to more than 1')
+
+    def apply(self, mock_response, random_generator):
+        """ Draw the delay and the fault of a response
+
+        :param mock_response: MockResponse matching the request
+        :param random_generator: random.Random instance
+        :return: (delay in seconds, MockResponse to send) tuple
+        """
+        if self._faults:
+            draw = random_generator.random()
+            for cumulated_rate, fault_response in self._faults:
+                if draw < cumulated_rate:
+                    mock_response = fault_response
+                    break
+
+        delay = self._delay_sampler(random_generator) if self._delay_sampler else 0
+        return delay, mock_response
+
+
+class FaultProfiles(object):
+    """ The fault profiles of the mock responses.
+
+    A profile declared for a mock file name applies to its variation, and if the name
+    has no argument value, eg. foo_{foo_id}_v1_response.GET or foo_response.GET, to all
+    the variations of the endpoint without a profile of their own.
+    """
+
+    def __init__(self, profiles, json_codec=None, random_generator=None):
+        """
+        :param profiles: {mock file name, without .json: profile} dict, the profiles are
+            dicts with the optional latency and faults keys of FaultProfile.
+        :param json_codec: JSONCodec serializing the fault bodies
+        :param random_generator: random.Random instance drawing the delays and faults
+        :raises: ValueError if profiles is not a dict or a profile is invalid
+        """
+        if not isinstance(profiles, dict):
+            raise ValueError('Invalid fault profiles {0!r}'.format(profiles))
+        self._random = random_generator or random.Random()
+        self._profile_by_operation = {}
+        for name, profile in profiles.items():
+            operation, _ = extract_operation_and_response_code_from_filename(
+                name[:-len('.json')] if name.endswith('.json') else name,
+            )
+            if operation is None:
+                raise ValueError('Invalid mock file name {0!r}'.format(name))
+            if not isinstance(profile, dict) or set(profile) - {'latency', 'faults'}:
+                raise ValueError('Invalid fault profile {0!r} of {1}'.format(profile, name))
+            self._profile_by_operation[operation] = FaultProfile(
+                operation,
+                latency=profile.get('latency'),
+                faults=profile.get('faults', ()),
+                json_codec=json_codec,
+            )
+
+    def get_profile(self, operation):
+        """
+        :param operation: Operation of a mock response
+        :return: FaultProfile, or None
+        """
+        profile = self._profile_by_operation.get(operation)
+        if profile is None:
+            profile = self._profile_by_operation.get(norm_operation(operation))
+        return profile
+
+    def apply(self, mock_response):
+        """ Draw the delay and the fault of a response
+
+        :param mock_response: MockResponse matching the request
+        :return: (delay in seconds, MockResponse to send) tuple
+        """
+        profile = self.get_profile(mock_response.operation)
+        if profile is None:
+            return 0, mock_response
+        return profile.apply(mock_response, self._random)
+
+
+def load_fault_profiles(path, json_codec=None):
+    """ Load the fault profiles declared in a JSON file
+
+    :param path: path of the file
+    :param json_codec: name of the JSON codec parsing the file and serializing the fault bodies
+    :raises: ValueError if the file does not hold a JSON object or a profile is invalid
+    :return: FaultProfiles
+    """
+    json_codec = get_json_codec(json_codec)
+    with io.open(path, encoding='utf-8') as f:
+        profiles = json_codec.loads(f.read())
+    return FaultProfiles(profiles, json_codec=json_codec)
@@ -2,61 +2,115 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
-import json
+import threading
+from collections import defaultdict
 
 import six
+from jinja2 import Environment
+from jinja2 import FileSystemBytecodeCache
 from jinja2 import nodes
 from jinja2.ext import Extension
+from jinja2.utils import LRUCache
 
+from pyramid_mock_server.json_codec import get_json_codec
+from pyramid_mock_server.util import atomic_write
 
-def json_hard_update(base, update):
-    result = json.loads(base)
-    result.update(json.loads(update))
-    return json.dumps(result, sort_keys=True, indent=4)
 
+def _check_objects(base, update, base_name):
+    """ Only JSON objects can be updated
 
-def _patch(base, patch):
+    :param base_name: name of the base document in the error message
+    :raises: ValueError if base or update is not a dict
+    """
+    for name, document in ((base_name, base), ('its update', update)):
+        if not isinstance(document, dict):
+            raise ValueError(
+                'Cannot update {0}, {1} is not a JSON object: {2!r}'.format(
+                    base_name,
+                    name,
+                    document,
+                ),
+            )
+
+
+def _hard_updated(base, update):
+    result = dict(base)
+    result.update(update)
+    return result
+
+
+def _patched(base, patch):
+    """ Return a copy of base patched with patch, only the dictionaries
+    along the patched paths are copied so base is left unchanged.
+    """
+    result = dict(base)
     for key, value in six.iteritems(patch):
-        if key in base and type(base[key]) == dict and type(value) == dict:
-            _patch(base[key], value)
+        if key in result and type(result[key]) == dict and type(value) == dict:
+            result[key] = _patched(result[key], value)
         else:
-            base[key] = value
+            result[key] = value
+    return result
+
+
+def _dumps(json_codec, document):
+    return json_codec.dumps(document, indent=4)
 
 
-def json_soft_update(base, update):
-    base_json = json.loads(base)
-    update_json = json.loads(update)
+def json_hard_update(base, update, json_codec=None):
+    json_codec = json_codec or get_json_codec()
+    base, update = json_codec.loads(base), json_codec.loads(update)
+    _check_objects(base, update, 'the base document')
+    return _dumps(json_codec, _hard_updated(base, update))
 
-    _patch(base_json, update_json)
 
-    return json.dumps(base_json, sort_keys=True, indent=4)
+def json_soft_update(base, update, json_codec=None):
+    json_codec = json_codec or get_json_codec()
+    base, update = json_codec.loads(base), json_codec.loads(update)
+    _check_objects(base, update, 'the base document')
+    return _dumps(json_codec, _patched(base, update))
 
 
-class JSONOverrideExtension(Extension):
+def _create_document_cache(environment):
+    """ Create the cache of the parsed base documents, bounded like the
+    template cache of the environment.
     """
-    Adds an override keyword to the jinja syntax. This allow to update
-    2 json dictionaries together.
-    Syntax is as follow:
+    template_cache = environment.cache
+    if template_cache is None:
+        return None
+    if isinstance(template_cache, LRUCache):
+        return LRUCache(template_cache.capacity)
+    return {}
 
-    {% override "template.json" %}
-    {
-      "attr1": "override"
-    }
-    {% endoverride %}
 
-    with template.json being a valid template name.
+class _JSONUpdateExtension(Extension):
+    """
+    Base of the extensions updating the json document of another template.
 
-    The override decorated dictionary will update the dictionary defined in the
-    passed template
+    The base documents are parsed once per environment and shared by all the
+    templates updating them, the updates are applied to copies. The documents
+    produced by nested updates are reused as is by the enclosing update instead
+    of being parsed again. If the environment has auto_reload set, the documents
+    of the modified templates are rendered and parsed again.
+
+    The documents are parsed and serialized with the json_codec attribute of the
+    environment, the standard library unless it is replaced.
     """
-    tags = set(['override'])
+
+    def __init__(self, environment):
+        super(_JSONUpdateExtension, self).__init__(environment)
+        environment.extend(
+            json_codec=get_json_codec(),
+            json_document_cache=_create_document_cache(environment),
+            # output string -> document of the updates made while rendering a base template
+            json_rendered_documents=threading.local(),
+        )
 
     def parse(self, parser):
         lineno = next(parser.stream).lineno
 
         filename = parser.stream.expect('string').value
 
-        body = parser.parse_statements(['name:endoverride'], drop_needle=True)
+        body = parser.parse_statements(['name:end' + self.tag], drop_needle=True)
 
         return nodes.CallBlock(
             self.call_method('_override', [nodes.Const(filename)]),
@@ -65,14 +119,81 @@ class JSONOverrideExtension(Extension):
             body,
         ).set_lineno(lineno)
 
+    def _get_base_document(self, filename):
+        environment = self.environment
+        cache = environment.json_document_cache
+        cached = cache.get(filename) if cache is not None else None
+        if cached is not None and all(template.is_up_to_date for template in cached[2]):
+            document, dependencies, _ = cached
+            record_dependencies = getattr(environment, 'record_dependencies', None)
+            if record_dependencies is not None:
+                record_dependencies(dependencies)
+            return document
+
+        rendered_documents = environment.json_rendered_documents
+        previous_documents = getattr(rendered_documents, 'documents', None)
+        rendered_documents.documents = documents = {}
+        try:
+            render_template = getattr(environment, 'render_template', None)
+            if render_template is not None:
+                base_str, dependencies = render_template(filename)
+            else:
+                base_str, dependencies = environment.get_template(filename).render(), set()
+        finally:
+            rendered_documents.documents = previous_documents
+
+        document = documents.get(base_str.strip())
+        if document is None:
+            document = environment.json_codec.loads(base_str)
+        if cache is not None:
+            dependencies = frozenset(dependencies) | {filename}
+            # The templates the document comes from, to parse it again once they are modified
+            templates = tuple(
+                environment.get_template(name) for name in dependencies
+            ) if environment.auto_reload else ()
+            cache[filename] = (document, dependencies, templates)
+        return document
+
     def _override(self, filename, caller=None):
-        override_str = caller()
-        base_str = self.environment.get_template(filename).render()
+        json_codec = self.environment.json_codec
+        update = json_codec.loads(caller())
+        base = self._get_base_document(filename)
+        _check_objects(base, update, filename)
+        document = self._merge(base, update)
+        result = _dumps(json_codec, document)
+
+        documents = getattr(self.environment.json_rendered_documents, 'documents', None)
+        if documents is not None:
+            documents[result] = document
+        return result
+
+
+class JSONOverrideExtension(_JSONUpdateExtension):
+    """
+    Adds an override keyword to the jinja syntax. This allow to update
+    2 json dictionaries together.
+    Syntax is as follow:
+
+    {% override "template.json" %}
+    {
+      "attr1": "override"
+    }
+    {% endoverride %}
+
+    with template.json being a valid template name.
+
+    The override decorated dictionary will update the dictionary defined in the
+    passed template
+    """
+    tag = 'override'
+    tags = set([tag])
 
-        return json_hard_update(base_str, override_str)
+    @staticmethod
+    def _merge(base, update):
+        return _hard_updated(base, update)
 
 
-class JSONPatchExtension(Extension):
+class JSONPatchExtension(_JSONUpdateExtension):
     """
     Adds an patch keyword to the jinja syntax. This allow to update
     2 json dictionaries together.
@@ -91,24 +212,137 @@ class JSONPatchExtension(Extension):
     All the values that the decorated dictionary defines will be updated in the
     passed template, with respect to hierarchy, and leaving most values as is
     """
-    tags = set(['patch'])
+    tag = 'patch'
+    tags = set([tag])
 
-    def parse(self, parser):
-        lineno = next(parser.stream).lineno
+    @staticmethod
+    def _merge(base, update):
+        return _patched(base, update)
 
-        filename = parser.stream.expect('string').value
 
-        body = parser.parse_statements(['name:endpatch'], drop_needle=True)
+class DependencyRecordingEnvironment(Environment):
+    """
+    Jinja environment recording the templates used while rendering a template,
+    whether they are pulled in by include, extends, import, override or patch.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(DependencyRecordingEnvironment, self).__init__(*args, **kwargs)
+        self._recording = threading.local()
+
+    def get_template(self, name, parent=None, globals=None):
+        dependencies = getattr(self._recording, 'dependencies', None)
+        if dependencies is not None:
+            dependencies.add(name)
+        return super(DependencyRecordingEnvironment, self).get_template(
+            name,
+            parent=parent,
+            globals=globals,
+        )
+
+    def record_dependencies(self, names):
+        """ Record templates used by the template being rendered without getting them,
+        e.g. because their rendered output was cached
+
+        :param names: iterable of template names
+        """
+        dependencies = getattr(self._recording, 'dependencies', None)
+        if dependencies is not None:
+            dependencies.update(names)
+
+    def render_template(self, name):
+        """ Render a template and collect its dependencies, they are also recorded
+        as dependencies of the template being rendered, if any.
+
+        :param name: name of the template to render
+        :return: (rendered string, set of the names of the templates it used) tuple
+        """
+        previous_dependencies = getattr(self._recording, 'dependencies', None)
+        self._recording.dependencies = dependencies = set()
+        try:
+            rendered = self.get_template(name).render()
+        finally:
+            self._recording.dependencies = previous_dependencies
+            if previous_dependencies is not None:
+                previous_dependencies.update(dependencies)
+
+        dependencies.discard(name)
+        return rendered, dependencies
+
+
+class AtomicFileSystemBytecodeCache(FileSystemBytecodeCache):
+    """
+    Bytecode cache that can be shared by several processes: the compiled
+    templates are written to a temporary file renamed once complete, so
+    other processes never read partially written files.
+    """
 
-        return nodes.CallBlock(
-            self.call_method('_override', [nodes.Const(filename)]),
-            [],
-            [],
-            body,
-        ).set_lineno(lineno)
+    def dump_bytecode(self, bucket):
+        atomic_write(self._get_cache_filename(bucket), bucket.write_bytecode)
 
-    def _override(self, filename, caller=None):
-        override_str = caller()
-        base_str = self.environment.get_template(filename).render()
 
-        return json_soft_update(base_str, override_str)
+class TemplateDependencyGraph(object):
+    """
+    Records the templates each template used the last time it was rendered,
+    to find the templates that have to be rendered again when one changes.
+    """
+
+    def __init__(self):
+        self._dependencies = {}
+        self._dependents = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def set_dependencies(self, name, dependencies):
+        """ Replace the dependencies of a template
+
+        :param name: name of the template
+        :param dependencies: names of the templates it used
+        """
+        dependencies = frozenset(dependencies)
+        with self._lock:
+            for dependency in self._dependencies.get(name, ()):
+                self._dependents[dependency].discard(name)
+            self._dependencies[name] = dependencies
+            for dependency in dependencies:
+                self._dependents[dependency].add(name)
+
+    def discard(self, name):
+        """ Forget the dependencies of a template, e.g. because it was removed
+
+        :param name: name of the template
+        """
+        self.set_dependencies(name, ())
+        with self._lock:
+            self._dependencies.pop(name, None)
+
+    def update(self, dependencies_by_name):
+        """ Merge the dependencies recorded by another graph
+
+        :param dependencies_by_name: dictionary of template name -> names of the templates
+            it used, as returned by get_dependencies_by_name
+        """
+        for name, dependencies in six.iteritems(dependencies_by_name):
+            self.set_dependencies(name, dependencies)
+
+    def get_dependencies_by_name(self):
+        """
+        :return: dictionary of template name -> frozenset of the names of the templates it used
+        """
+        with self._lock:
+            return dict(self._dependencies)
+
+    def get_dependents(self, names):
+        """ Find all the templates that used, directly or not, the given templates
+
+        :param names: iterable of template names
+        :return: set of the names of the dependent templates
+        """
+        dependents = set()
+        with self._lock:
+            to_visit = list(names)
+            while to_visit:
+                for dependent in self._dependents.get(to_visit.pop(), ()):
+                    if dependent not in dependents:
+                        dependents.add(dependent)
+                        to_visit.append(dependent)
+        return dependents
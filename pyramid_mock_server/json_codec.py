@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+JSON codecs used to parse and serialize the mock responses, the fast optional
+backends are used when they are installed and requested.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import json
+from collections import namedtuple
+
+
+class JSONCodec(namedtuple('JSONCodec', ['name', 'loads', 'dumps'])):
+    """ A JSON backend.
+
+    loads parses a JSON string, dumps(document, indent=None) serializes a document
+    to a string with sorted keys, pretty printed if indent is not None and without
+    any whitespace otherwise. The non-ascii characters are not escaped.
+    """
+
+
+def _make_json_codec():
+    def dumps(document, indent=None):
+        # Explicit separators so that python 2 does not leave trailing spaces
+        separators = (',', ':') if indent is None else (',', ': ')
+        serialized = json.dumps(
+            document,
+            sort_keys=True,
+            indent=indent,
+            separators=separators,
+            ensure_ascii=False,
+        )
+        # The python 2 json module returns bytes for ascii only documents
+        if isinstance(serialized, bytes):  # pragma: no cover
+            serialized = serialized.decode('utf-8')
+        return serialized
+
+    return JSONCodec('json', json.loads, dumps)
+
+
+def _make_orjson_codec():
+    import orjson
+
+    def dumps(document, indent=None):
+        # orjson only knows how to indent by 2 spaces
+        option = orjson.OPT_SORT_KEYS
+        if indent is not None:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(document, option=option).decode('utf-8')
+
+    return JSONCodec('orjson', orjson.loads, dumps)
+
+
+def _make_ujson_codec():
+    import ujson
+
+    def dumps(document, indent=None):
+        return ujson.dumps(
+            document,
+            sort_keys=True,
+            indent=indent or 0,
+            ensure_ascii=False,
+            escape_forward_slashes=False,
+        )
+
+    return JSONCodec('ujson', ujson.loads, dumps)
+
+
+_CODEC_FACTORIES = {
+    'json': _make_json_codec,
+    'orjson': _make_orjson_codec,
+    'ujson': _make_ujson_codec,
+}
+
+# Order in which auto picks the installed backends
+_AUTO_CODECS = ('orjson', 'ujson', 'json')
+
+_codecs = {}
+
+
+def get_json_codec(name=None):
+    """ Get a JSON codec by name
+
+    :param name: 'json' (the standard library, the default), 'orjson', 'ujson', or 'auto'
+        to pick the fastest installed backend.
+    :raises: ValueError if the name is unknown, ImportError if the backend is not installed
+    :return: JSONCodec instance
+    """
+    if name is None:
+        name = 'json'
+
+    if name == 'auto':
+        for auto_name in _AUTO_CODECS:  # pragma: no branch
+            try:
+                return get_json_codec(auto_name)
+            except ImportError:
+                pass
+
+    codec = _codecs.get(name)
+    if codec is None:
+        try:
+            factory = _CODEC_FACTORIES[name]
+        except KeyError:
+            raise ValueError(
+                'Unknown JSON codec {0!r}, valid ones are {1}'.format(
+                    name,
+                    ', '.join(sorted(_CODEC_FACTORIES) + ['auto']),
+                ),
+            )
+        codec = _codecs[name] = factory()
+    return codec
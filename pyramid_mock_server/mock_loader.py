@@ -2,77 +2,738 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import fnmatch
+import logging
+import multiprocessing
 import os
+import re
+import sys
+import threading
 from collections import namedtuple
+from functools import partial
 
 import jinja2
+import six
 
+from pyramid_mock_server.jinja_utils import AtomicFileSystemBytecodeCache
+from pyramid_mock_server.jinja_utils import DependencyRecordingEnvironment
 from pyramid_mock_server.jinja_utils import JSONOverrideExtension
 from pyramid_mock_server.jinja_utils import JSONPatchExtension
+from pyramid_mock_server.jinja_utils import TemplateDependencyGraph
+from pyramid_mock_server.json_codec import get_json_codec
+from pyramid_mock_server.render_cache import RenderCache
+from pyramid_mock_server.response_body import BodyInterner
+from pyramid_mock_server.response_body import encode_body
+from pyramid_mock_server.response_body import SharedFileSnapshot
+from pyramid_mock_server.response_body import snapshot_body
+from pyramid_mock_server.response_body import store_in_arena
+from pyramid_mock_server.util import check_file_is_valid
+from pyramid_mock_server.util import ensure_directory
 from pyramid_mock_server.util import extract_operation_and_response_code_from_filename
 
+try:
+    from os import scandir
+except ImportError:  # pragma: no cover (python < 3.5)
+    from scandir import scandir
 
-MockResponse = namedtuple(
-    'MockResponse',
-    [
-        'operation',
-        'json_str',
-        'http_response_code',
-    ],
-)
 
+log = logging.getLogger(__name__)
 
-def _make_json_template_loader(mock_responses_directory):
+
+class MockResponse(namedtuple(
+    'MockResponseBase', ['operation', 'json_str', 'http_response_code', 'body']
+)):
+    """ A loaded mock response, body holds the EncodedBody sent to the clients.
+    It is computed from json_str if not given.
+    """
+    def __new__(cls, operation, json_str, http_response_code, body=None):
+        if body is None:
+            body = encode_body(json_str)
+        return super(MockResponse, cls).__new__(
+            cls,
+            operation=operation,
+            json_str=json_str,
+            http_response_code=http_response_code,
+            body=body,
+        )
+
+
+class _DeferredMockResponse(MockResponse):
+    """ A MockResponse computing some of its fields when they are accessed, the
+    underlying tuple holds None for them. Iterating, comparing, hashing and replacing
+    go through the fields like for the other MockResponses.
+    """
+    def __iter__(self):
+        return (getattr(self, field) for field in self._fields)
+
+    def __eq__(self, other):
+        if not isinstance(other, tuple):
+            return NotImplemented
+        return tuple(self) == tuple(other)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def _replace(self, **kwargs):
+        """ :return: a MockResponse holding all its fields """
+        fields = self._asdict()
+        fields.update(kwargs)
+        return MockResponse(**fields)
+
+
+class _LazyMockResponse(_DeferredMockResponse):
+    """ A MockResponse whose template is only rendered the first time its
+    json_str or body is accessed.
+    """
+    def __new__(cls, operation, http_response_code, render):
+        """
+        :param operation: Operation
+        :param http_response_code: int
+        :param render: function returning the (json_str, body) of the response
+        """
+        self = super(MockResponse, cls).__new__(
+            cls,
+            operation=operation,
+            json_str=None,
+            http_response_code=http_response_code,
+            body=None,
+        )
+        self._render = render
+        self._rendered = None
+        self._lock = threading.Lock()
+        return self
+
+    def _get_rendered(self):
+        rendered = self._rendered
+        if rendered is None:
+            with self._lock:
+                if self._rendered is None:  # pragma: no branch
+                    self._rendered = self._render()
+                rendered = self._rendered
+        return rendered
+
+    @property
+    def json_str(self):
+        return self._get_rendered()[0]
+
+    @property
+    def body(self):
+        return self._get_rendered()[1]
+
+
+class _SharedMockResponse(_DeferredMockResponse):
+    """ A MockResponse whose body lives in shared memory, its json_str is only read
+    from it when it is accessed.
+    """
+    def __new__(cls, operation, http_response_code, body):
+        """
+        :param operation: Operation
+        :param http_response_code: int
+        :param body: EncodedBody whose data is a SharedFileSnapshot or an ArenaSlice
+        """
+        return super(MockResponse, cls).__new__(
+            cls,
+            operation=operation,
+            json_str=None,
+            http_response_code=http_response_code,
+            body=body,
+        )
+
+    def __getnewargs__(self):
+        return self.operation, self.http_response_code, self.body
+
+    @property
+    def json_str(self):
+        return self.body.data.read().decode('utf-8')
+
+
+class MockRenderingError(Exception):
+    """ Raised when a mock response template cannot be rendered, or when it does
+    not render valid JSON while the JSON is validated
+    """
+
+
+class LoadStats(object):
+    """ Statistics of a load_responses call
+    """
+
+    def __init__(self):
+        #: number of json files found
+        self.json_files = 0
+        #: number of mock responses loaded
+        self.mock_responses = 0
+        #: paths of the json files not named like mock responses, they are only
+        #: used as templates by the other files
+        self.invalid_names = []
+        #: size in bytes of the response arena, 0 without arena
+        self.arena_size = 0
+        #: number of mock responses rendered during the load
+        self.rendered_bodies = 0
+        #: number of distinct bodies among them, the identical ones are stored once
+        self.unique_bodies = 0
+        #: size in bytes of the rendered bodies, with their gzip variants
+        self.rendered_body_size = 0
+        #: size in bytes of the distinct bodies, with their gzip variants
+        self.unique_body_size = 0
+
+    @property
+    def dedup_ratio(self):
+        """ Size of the rendered bodies over the size of the stored ones, 1 if none were
+        identical
+        """
+        if not self.unique_body_size:
+            return 1.0
+        return float(self.rendered_body_size) / self.unique_body_size
+
+
+# Files with this extension are served as is, without being rendered
+RAW_JSON_EXTENSION = '.raw.json'
+
+# load_responses response_arena value storing the bodies in anonymous shared memory
+MEMORY_RESPONSE_ARENA = ':memory:'
+
+# Strings marking the jinja syntax, files without any of them are static
+_TEMPLATE_DELIMITERS = (b'{%', b'{{', b'{#')
+
+# json_format -> indent passed to the JSON codec
+_JSON_FORMAT_INDENTS = {
+    'compact': None,
+    'pretty': 4,
+}
+
+
+def _make_json_template_loader(
+    mock_responses_directory,
+    render_cache_directory=None,
+    bytecode_cache_directory=None,
+    template_cache_size=-1,
+    dependency_graph=None,
+    json_codec=None,
+    auto_reload=False,
+):
     """ Generate a rendering function that uses jinja in the context of mock_responses_directory
         to render json files.
 
         :param: mock_responses_directory: path to root responses directory
+        :param: render_cache_directory: if not None, directory where the rendered templates are
+            cached across loads
+        :param: bytecode_cache_directory: if not None, directory where the compiled templates are
+            cached across loads
+        :param: template_cache_size: number of compiled templates kept in memory, -1 keeps all
+            of them, which fits a load as base templates are used by many others.
+        :param: dependency_graph: if not None, TemplateDependencyGraph recording the templates
+            each rendered template used
+        :param: json_codec: name of the JSON codec parsing and serializing the documents,
+            see get_json_codec
+        :param: auto_reload: if True, the templates modified since they were compiled or
+            parsed are loaded again
         :return: loader function, that take a path of the json file one wants to load and returns
             a rendered json string
     """
-    env = jinja2.Environment(
+    bytecode_cache = None
+    if bytecode_cache_directory is not None:
+        ensure_directory(bytecode_cache_directory)
+        bytecode_cache = AtomicFileSystemBytecodeCache(bytecode_cache_directory)
+
+    env = DependencyRecordingEnvironment(
         loader=jinja2.FileSystemLoader(mock_responses_directory),
-        extensions=[JSONOverrideExtension, JSONPatchExtension]
+        extensions=[JSONOverrideExtension, JSONPatchExtension],
+        bytecode_cache=bytecode_cache,
+        cache_size=template_cache_size,
+        auto_reload=auto_reload,
     )
+    env.json_codec = get_json_codec(json_codec)
+    render_cache = None
+    if render_cache_directory is not None:
+        render_cache = RenderCache(
+            render_cache_directory,
+            mock_responses_directory,
+            json_codec=env.json_codec,
+        )
 
     def _load_json_template(filepath):
         template_filepath = os.path.relpath(
             filepath,
             start=mock_responses_directory,
         )
-        return env.get_template(template_filepath).render()
+        cached = render_cache.get(template_filepath) if render_cache is not None else None
+        if cached is not None:
+            json_str, dependencies = cached
+        else:
+            try:
+                json_str, dependencies = env.render_template(template_filepath)
+            except Exception as e:
+                six.reraise(
+                    MockRenderingError,
+                    MockRenderingError('Unable to render {0}: {1!r}'.format(filepath, e)),
+                    sys.exc_info()[2],
+                )
+            if render_cache is not None:
+                render_cache.set(template_filepath, dependencies, json_str)
+
+        if dependency_graph is not None:
+            dependency_graph.set_dependencies(template_filepath, dependencies)
+        return json_str
 
     return _load_json_template
 
 
-def load_responses(mock_responses_directory):
+def make_mock_response_loader(
+    mock_responses_directory,
+    gzip_min_size=None,
+    cache_control=None,
+    lazy=False,
+    render_cache_directory=None,
+    bytecode_cache_directory=None,
+    dependency_graph=None,
+    json_codec=None,
+    json_format=None,
+    detect_static_files=False,
+):
+    """ Generate a function loading a mock response from a json file in mock_responses_directory.
+
+        :param: mock_responses_directory: path to root responses directory
+        :param: gzip_min_size: if not None, responses of at least this size in bytes are also
+            stored gzip compressed
+        :param: cache_control: value of the Cache-Control header sent with the responses, or None
+        :param: lazy: if True, the templates are only rendered the first time their response
+            is needed
+        :param: render_cache_directory: if not None, directory where the rendered templates are
+            cached across loads
+        :param: bytecode_cache_directory: if not None, directory where the compiled templates are
+            cached across loads
+        :param: dependency_graph: if not None, TemplateDependencyGraph recording the templates
+            each rendered template used
+        :param: json_codec: name of the JSON codec parsing and serializing the documents,
+            see get_json_codec
+        :param: json_format: if None the responses are served as rendered, otherwise they are
+            validated and serialized again, 'compact' without whitespace or 'pretty' indented
+        :param: detect_static_files: if True, the files without any jinja syntax are served like
+            the RAW_JSON_EXTENSION files: copied once in shared memory, as is
+        :return: loader function, that takes the path of a json file and its name without
+            extension and returns a MockResponse, or None if the name is not a mock response name.
+            The identical responses it renders share their json_str and body.
+    """
+    load_json_template_fn = _make_json_template_loader(
+        mock_responses_directory,
+        render_cache_directory=render_cache_directory,
+        bytecode_cache_directory=bytecode_cache_directory,
+        # The lazy loader lives as long as the application, bound its memory usage
+        template_cache_size=400 if lazy else -1,
+        dependency_graph=dependency_graph,
+        json_codec=json_codec,
+        # Templates do not change during a load, but the lazy templates are rendered
+        # later, after the reloads of the mock files if their dependencies are recorded
+        auto_reload=lazy and dependency_graph is not None,
+    )
+    if json_format is not None and json_format not in _JSON_FORMAT_INDENTS:
+        raise ValueError(
+            'Unknown JSON format {0!r}, valid ones are {1}'.format(
+                json_format,
+                ', '.join(sorted(_JSON_FORMAT_INDENTS)),
+            ),
+        )
+    codec = get_json_codec(json_codec)
+    body_interner = BodyInterner(gzip_min_size=gzip_min_size, cache_control=cache_control)
+
+    def parse(json_filepath, json_str):
+        try:
+            return codec.loads(json_str)
+        except ValueError as e:
+            six.reraise(
+                MockRenderingError,
+                MockRenderingError('Invalid JSON in {0}: {1!r}'.format(json_filepath, e)),
+                sys.exc_info()[2],
+            )
+
+    def render(json_filepath):
+        json_str = load_json_template_fn(json_filepath)
+        if json_format is not None:
+            json_str = codec.dumps(
+                parse(json_filepath, json_str),
+                indent=_JSON_FORMAT_INDENTS[json_format],
+            )
+        return body_interner.encode(json_str)
+
+    def snapshot_static_file(json_filepath):
+        """ Snapshot the file if it is served as is
+
+        :return: SharedFileSnapshot, or None if the file has to be rendered
+        """
+        if not json_filepath.endswith(RAW_JSON_EXTENSION) and not detect_static_files:
+            return None
+
+        try:
+            file_snapshot = SharedFileSnapshot(json_filepath)
+        except (IOError, OSError) as e:
+            six.reraise(
+                MockRenderingError,
+                MockRenderingError('Unable to read {0}: {1!r}'.format(json_filepath, e)),
+                sys.exc_info()[2],
+            )
+        if not json_filepath.endswith(RAW_JSON_EXTENSION) and any(
+            file_snapshot.find(delimiter) != -1 for delimiter in _TEMPLATE_DELIMITERS
+        ):
+            return None
+
+        # Static files are checked but never reformatted, they are sent as is
+        if json_format is not None:
+            parse(json_filepath, file_snapshot.read().decode('utf-8'))
+        return file_snapshot
+
+    def _load_mock_response(json_filepath, response_name):
+        # Files that are not mock responses, e.g. base templates, are never read
+        operation, response_code = extract_operation_and_response_code_from_filename(
+            response_name
+        )
+        if operation is None or response_code is None:
+            return None
+
+        file_snapshot = snapshot_static_file(json_filepath)
+        if file_snapshot is not None:
+            return _SharedMockResponse(
+                operation=operation,
+                http_response_code=response_code,
+                body=snapshot_body(file_snapshot, cache_control=cache_control),
+            )
+        if lazy:
+            return _LazyMockResponse(
+                operation=operation,
+                http_response_code=response_code,
+                render=partial(render, json_filepath),
+            )
+        json_str, body = render(json_filepath)
+        return MockResponse(
+            operation=operation,
+            json_str=json_str,
+            http_response_code=response_code,
+            body=body,
+        )
+
+    return _load_mock_response
+
+
+def _compile_ignore_patterns(ignore_patterns):
+    """ Compile glob patterns into a single regular expression
+
+    :param ignore_patterns: iterable of glob patterns, or None
+    :return: compiled regular expression, or None if there is no pattern
+    """
+    if not ignore_patterns:
+        return None
+    return re.compile('|'.join(
+        '(?:{0})'.format(fnmatch.translate(pattern)) for pattern in ignore_patterns
+    ))
+
+
+def find_json_files(mock_responses_directory, ignore_patterns=None):
+    """ List the json files of the given directory and its subdirectories, in the
+        order os.walk would list them.
+
+        :param: mock_responses_directory: path to root responses directory
+        :param: ignore_patterns: glob patterns of the files and directories to skip, they are
+            matched against their name and their path relative to mock_responses_directory,
+            using / as separator
+        :return: list of (json file path, file name without extension) tuples
+    """
+    ignore_regex = _compile_ignore_patterns(ignore_patterns)
+    json_files = []
+
+    def scan(directory, relative_directory):
+        try:
+            entries = list(scandir(directory))
+        except OSError:
+            # Like os.walk, skip the directories that cannot be listed
+            return
+
+        subdirectories = []
+        for entry in entries:
+            name = entry.name
+            if ignore_regex is not None and (
+                ignore_regex.match(name) or ignore_regex.match(relative_directory + name)
+            ):
+                continue
+
+            if entry.is_dir():
+                # Like os.walk, do not follow the symbolic links to directories
+                if not entry.is_symlink():
+                    subdirectories.append(entry)
+            elif name.endswith(RAW_JSON_EXTENSION):
+                json_files.append((entry.path, name[:-len(RAW_JSON_EXTENSION)]))
+            elif name.endswith('.json'):
+                json_files.append((entry.path, name[:-len('.json')]))
+
+        for entry in subdirectories:
+            scan(entry.path, relative_directory + entry.name + '/')
+
+    scan(mock_responses_directory, '')
+    return json_files
+
+
+def _load_mock_responses_chunk(args):
+    """ Load a list of json files, this runs in the load_responses worker processes.
+
+        :param: args: (mock_responses_directory, json_files, loader_kwargs) tuple, json_files
+            being a list of (json file path, file name without extension) tuples and loader_kwargs
+            the keyword arguments of make_mock_response_loader
+        :return: list of (MockResponse or None, rendering error message or None) tuples
+    """
+    mock_responses_directory, json_files, loader_kwargs = args
+    load_mock_response_fn = make_mock_response_loader(mock_responses_directory, **loader_kwargs)
+
+    results = []
+    for json_filepath, response_name in json_files:
+        try:
+            results.append((load_mock_response_fn(json_filepath, response_name), None))
+        except MockRenderingError as e:
+            results.append((None, six.text_type(e)))
+    return results
+
+
+def _load_mock_responses_chunk_in_worker(args):
+    """ Load a list of json files in a load_responses worker process, recording
+        the template dependencies in a graph local to the worker.
+
+        :param: args: (mock_responses_directory, json_files, loader_kwargs, record_dependencies)
+            tuple, see _load_mock_responses_chunk
+        :return: (list of (MockResponse or None, rendering error message or None) tuples,
+            dictionary of template name -> names of the templates it used) tuple
+    """
+    mock_responses_directory, json_files, loader_kwargs, record_dependencies = args
+    dependency_graph = TemplateDependencyGraph() if record_dependencies else None
+    results = _load_mock_responses_chunk((
+        mock_responses_directory,
+        json_files,
+        dict(loader_kwargs, dependency_graph=dependency_graph),
+    ))
+    return results, dependency_graph.get_dependencies_by_name() if record_dependencies else {}
+
+
+def _is_rendered(mock_response):
+    # The lazy responses are rendered later, the static ones never are
+    return not isinstance(mock_response, _DeferredMockResponse)
+
+
+def _body_size(body):
+    return len(body.data) + (len(body.gzip_data) if body.gzip_data is not None else 0)
+
+
+def _intern_bodies(mock_responses, load_stats):
+    """ Share the json_str and the body of the identical rendered mock responses. The
+    loader shares them already, this shares the ones rendered by different processes.
+
+    :param mock_responses: list of MockResponse
+    :param load_stats: LoadStats filled with the number and size of the bodies
+    :return: list of MockResponse
+    """
+    body_interner = BodyInterner()
+    # {id of an EncodedBody: its size}
+    unique_body_sizes = {}
+    rendered_body_sizes = []
+    interned_responses = []
+    for mock_response in mock_responses:
+        if _is_rendered(mock_response):
+            json_str, body = body_interner.intern(mock_response.json_str, mock_response.body)
+            if body is not mock_response.body:
+                mock_response = MockResponse(
+                    operation=mock_response.operation,
+                    json_str=json_str,
+                    http_response_code=mock_response.http_response_code,
+                    body=body,
+                )
+            body_size = unique_body_sizes.setdefault(id(body), _body_size(body))
+            rendered_body_sizes.append(body_size)
+        interned_responses.append(mock_response)
+
+    load_stats.rendered_bodies = len(rendered_body_sizes)
+    load_stats.rendered_body_size = sum(rendered_body_sizes)
+    load_stats.unique_bodies = len(unique_body_sizes)
+    load_stats.unique_body_size = sum(unique_body_sizes.values())
+    return interned_responses
+
+
+def _move_bodies_to_arena(mock_responses, path=None):
+    """ Store the rendered bodies of mock responses in a response arena, the shared
+    bodies are stored once.
+
+    :param mock_responses: list of MockResponse, the lazy and static ones are kept as is
+    :param path: file of the arena, or None for anonymous shared memory
+    :return: (list of MockResponse, arena size in bytes) tuple
+    """
+    # {id of an EncodedBody: EncodedBody}, for the bodies to store
+    bodies = {}
+    for mock_response in mock_responses:
+        if _is_rendered(mock_response):
+            bodies.setdefault(id(mock_response.body), mock_response.body)
+
+    datas = []
+    for body in bodies.values():
+        datas.append(body.data)
+        if body.gzip_data is not None:
+            datas.append(body.gzip_data)
+    slices = iter(store_in_arena(datas, path=path))
+    arena_bodies = {
+        body_id: body._replace(
+            data=next(slices),
+            gzip_data=next(slices) if body.gzip_data is not None else None,
+        )
+        for body_id, body in bodies.items()
+    }
+
+    return [
+        _SharedMockResponse(
+            operation=mock_response.operation,
+            http_response_code=mock_response.http_response_code,
+            body=arena_bodies[id(mock_response.body)],
+        ) if _is_rendered(mock_response) else mock_response
+        for mock_response in mock_responses
+    ], sum(len(data) for data in datas)
+
+
+def load_responses(
+    mock_responses_directory,
+    gzip_min_size=None,
+    cache_control=None,
+    lazy=False,
+    workers=None,
+    render_cache_directory=None,
+    bytecode_cache_directory=None,
+    dependency_graph=None,
+    json_codec=None,
+    json_format=None,
+    detect_static_files=False,
+    ignore_patterns=None,
+    load_stats=None,
+    response_arena=None,
+):
     """ Load all sample json files in the given directory that match the naming pattern, ignoring
         all others.
 
         :param: mock_responses_directory: path to root responses directory
+        :param: gzip_min_size: if not None, responses of at least this size in bytes are also
+            stored gzip compressed
+        :param: cache_control: value of the Cache-Control header sent with the responses, or None
+        :param: lazy: if True, the templates are only rendered the first time their response
+            is needed
+        :param: workers: number of processes rendering the templates, the responses are rendered
+            in the current process if it is None or lower than 2. It is ignored, with a
+            warning, if lazy is True as the templates are not rendered during the load
+        :param: render_cache_directory: if not None, directory where the rendered templates are
+            cached, templates are only rendered again if they or the templates they use changed
+        :param: bytecode_cache_directory: if not None, directory where the compiled templates are
+            cached, it can be shared by several processes
+        :param: dependency_graph: if not None, TemplateDependencyGraph recording the templates
+            each rendered template used
+        :param: json_codec: name of the JSON codec parsing and serializing the documents,
+            see get_json_codec
+        :param: json_format: if None the responses are served as rendered, otherwise they are
+            validated and serialized again, 'compact' without whitespace or 'pretty' indented
+        :param: detect_static_files: if True, the files without any jinja syntax are served like
+            the RAW_JSON_EXTENSION files: copied once in shared memory, as is
+        :param: ignore_patterns: glob patterns of the files and directories to skip, see
+            find_json_files
+        :param: load_stats: if not None, LoadStats filled with the statistics of the load. The
+            identical rendered responses share their json_str and body, they are counted once
+            in its unique_bodies.
+        :param: response_arena: if not None, the rendered bodies are moved to a response arena,
+            a single memory mapping shared by the processes forked after the load, see
+            store_in_arena. It is the path of the file holding it, or MEMORY_RESPONSE_ARENA
+            for anonymous shared memory. The lazily rendered bodies are not moved.
+        :raises: MockRenderingError listing all the files that could not be rendered, or whose
+            JSON is invalid if json_format is set
         :return: array of MockResponse
     """
-    mock_responses = []
-    load_json_template_fn = _make_json_template_loader(mock_responses_directory)
-
-    for root, _, files in os.walk(mock_responses_directory):
-        for filename in files:
-            response_name, ext = os.path.splitext(filename)
-            if ext != ".json":
-                continue
+    json_files = []
+    invalid_names = []
+    for json_filepath, response_name in find_json_files(mock_responses_directory, ignore_patterns):
+        if check_file_is_valid(response_name):
+            json_files.append((json_filepath, response_name))
+        else:
+            invalid_names.append(json_filepath)
+    loader_kwargs = dict(
+        gzip_min_size=gzip_min_size,
+        cache_control=cache_control,
+        lazy=lazy,
+        render_cache_directory=render_cache_directory,
+        bytecode_cache_directory=bytecode_cache_directory,
+        json_codec=json_codec,
+        json_format=json_format,
+        detect_static_files=detect_static_files,
+    )
 
-            json_filepath = os.path.join(root, filename)
-            json_str = load_json_template_fn(json_filepath)
+    if workers and workers > 1 and lazy:
+        log.warning(
+            '%d load workers ignored, the lazy responses are rendered by the process serving them',
+            workers,
+        )
 
-            operation, response_code = extract_operation_and_response_code_from_filename(
-                response_name
+    if workers and workers > 1 and not lazy:
+        # A few chunks per worker balances the load while keeping the jinja
+        # environments, built once per chunk, useful.
+        chunk_size = max(1, len(json_files) // (workers * 4))
+        chunks = [
+            (
+                mock_responses_directory,
+                json_files[i:i + chunk_size],
+                loader_kwargs,
+                dependency_graph is not None,
             )
+            for i in range(0, len(json_files), chunk_size)
+        ]
+        pool = multiprocessing.Pool(workers)
+        try:
+            chunk_results = pool.map(_load_mock_responses_chunk_in_worker, chunks)
+        finally:
+            pool.close()
+            pool.join()
 
-            if operation is not None and response_code is not None:
-                mock_responses.append(MockResponse(
-                    operation=operation,
-                    json_str=json_str,
-                    http_response_code=response_code,
-                ))
+        # map keeps the order of the chunks, the result is the same as a sequential load
+        results = []
+        for chunk_result, dependencies_by_name in chunk_results:
+            results.extend(chunk_result)
+            if dependency_graph is not None:
+                dependency_graph.update(dependencies_by_name)
+    else:
+        results = _load_mock_responses_chunk((
+            mock_responses_directory,
+            json_files,
+            dict(loader_kwargs, dependency_graph=dependency_graph),
+        ))
 
+    errors = [error for _, error in results if error is not None]
+    if errors:
+        raise MockRenderingError('\n'.join(errors))
+
+    if load_stats is None:
+        load_stats = LoadStats()
+    mock_responses = _intern_bodies(
+        [mock_response for mock_response, _ in results if mock_response is not None],
+        load_stats,
+    )
+    load_stats.arena_size = 0
+    if response_arena is not None:
+        mock_responses, load_stats.arena_size = _move_bodies_to_arena(
+            mock_responses,
+            path=None if response_arena == MEMORY_RESPONSE_ARENA else response_arena,
+        )
+    log.info(
+        'Loaded %d mock responses from %s, %d json files are not named like mock responses',
+        len(mock_responses),
+        mock_responses_directory,
+        len(invalid_names),
+    )
+    log.info(
+        '%d distinct bodies among the %d rendered mock responses, dedup ratio %.2f',
+        load_stats.unique_bodies,
+        load_stats.rendered_bodies,
+        load_stats.dedup_ratio,
+    )
+    log.debug('json files not named like mock responses: %s', ', '.join(invalid_names))
+    load_stats.json_files = len(json_files) + len(invalid_names)
+    load_stats.mock_responses = len(mock_responses)
+    load_stats.invalid_names = invalid_names
     return mock_responses
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Hot reload of the mock responses: the changes made to the mock files are
+applied to the live ResponseCollection, without restarting the application.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import logging
+import os
+import threading
+
+import six
+
+from pyramid_mock_server.mock_loader import find_json_files
+from pyramid_mock_server.mock_loader import make_mock_response_loader
+from pyramid_mock_server.mock_loader import MockRenderingError
+from pyramid_mock_server.util import extract_operation_and_response_code_from_filename
+
+
+log = logging.getLogger(__name__)
+
+
+class MockReloader(object):
+    """ Watch a mock responses directory and apply the changes of its files to
+    a ResponseCollection. Only the added, modified and removed files, and the
+    files using them as templates, are loaded.
+    """
+
+    def __init__(
+        self,
+        mock_responses_directory,
+        response_collection,
+        dependency_graph=None,
+        ignore_patterns=None,
+        **loader_kwargs
+    ):
+        """
+        :param mock_responses_directory: path to root responses directory
+        :param response_collection: ResponseCollection loaded from mock_responses_directory
+        :param dependency_graph: TemplateDependencyGraph filled while loading response_collection,
+            if None the files using a modified template are not loaded again.
+        :param ignore_patterns: glob patterns of the files and directories that are not watched
+        :param loader_kwargs: keyword arguments of the mock response loader, they should be
+            the ones the response collection was loaded with.
+        """
+        self._mock_responses_directory = mock_responses_directory
+        self._response_collection = response_collection
+        self._dependency_graph = dependency_graph
+        self._ignore_patterns = ignore_patterns
+        self._loader_kwargs = loader_kwargs
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._file_states = self._scan()
+
+    def _scan(self):
+        """ Get the state of the json files of the directory
+
+        :return: dictionary of json file path -> (modification time, size, response name)
+        """
+        file_states = {}
+        for json_filepath, response_name in find_json_files(
+            self._mock_responses_directory,
+            self._ignore_patterns,
+        ):
+            try:
+                stat = os.stat(json_filepath)
+            except OSError:
+                # Removed since the directory was listed
+                continue
+            file_states[json_filepath] = (stat.st_mtime, stat.st_size, response_name)
+        return file_states
+
+    def poll(self):
+        """ Look for the files that changed since the previous poll and update
+        the response collection accordingly.
+        A file that cannot be rendered is logged, its previous version is kept.
+
+        :return: sorted list of the paths of the added, modified and removed files
+        """
+        with self._lock:
+            file_states = self._scan()
+            changed_files = sorted(
+                json_filepath
+                for json_filepath, state in six.iteritems(file_states)
+                if self._file_states.get(json_filepath) != state
+            )
+            removed_files = sorted(
+                json_filepath
+                for json_filepath in self._file_states
+                if json_filepath not in file_states
+            )
+
+            removed_operations = set()
+            for json_filepath in removed_files:
+                operation, _ = extract_operation_and_response_code_from_filename(
+                    self._file_states[json_filepath][2],
+                )
+                if operation is not None:
+                    self._response_collection.remove_operation(operation)
+                    removed_operations.add(operation)
+
+            # Other files may define the operations of the removed files
+            files_to_load = set(changed_files)
+            if self._dependency_graph is not None:
+                files_to_load.update(self._get_dependent_files(
+                    file_states,
+                    changed_files + removed_files,
+                ))
+            if removed_operations:
+                for json_filepath, (_, _, response_name) in six.iteritems(file_states):
+                    operation, _ = extract_operation_and_response_code_from_filename(
+                        response_name,
+                    )
+                    if operation in removed_operations:
+                        files_to_load.add(json_filepath)
+
+            if files_to_load:
+                load_mock_response_fn = make_mock_response_loader(
+                    self._mock_responses_directory,
+                    dependency_graph=self._dependency_graph,
+                    **self._loader_kwargs
+                )
+            for json_filepath in sorted(files_to_load):
+                try:
+                    mock_response = load_mock_response_fn(
+                        json_filepath,
+                        file_states[json_filepath][2],
+                    )
+                except MockRenderingError:
+                    log.exception('Unable to reload %s', json_filepath)
+                    continue
+                if mock_response is not None:
+                    self._response_collection.add_mock_response(mock_response)
+
+            self._file_states = file_states
+            return sorted(changed_files + removed_files)
+
+    def _get_dependent_files(self, file_states, json_filepaths):
+        """ Find the files using the given files as templates, directly or not
+
+        :param file_states: current state of the json files, as returned by _scan
+        :param json_filepaths: paths of the files that changed
+        :return: set of the paths of the dependent files
+        """
+        template_names = [
+            os.path.relpath(json_filepath, start=self._mock_responses_directory)
+            for json_filepath in json_filepaths
+        ]
+        dependent_names = self._dependency_graph.get_dependents(template_names)
+
+        for json_filepath, template_name in zip(json_filepaths, template_names):
+            if json_filepath not in file_states:
+                self._dependency_graph.discard(template_name)
+
+        return set(
+            json_filepath
+            for json_filepath in file_states
+            if os.path.relpath(json_filepath, start=self._mock_responses_directory)
+            in dependent_names
+        )
+
+    def start(self, interval):
+        """ Poll the directory from a daemon thread until stop is called
+
+        :param interval: number of seconds between two polls
+        :return: the polling thread
+        """
+        thread = threading.Thread(
+            target=self._poll_until_stopped,
+            args=(interval,),
+            name='pyramid_mock_server.mock_reloader',
+        )
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def stop(self):
+        """ Stop polling the directory
+        """
+        self._stopped.set()
+
+    def _poll_until_stopped(self, interval):
+        while not self._stopped.wait(interval):
+            try:
+                self.poll()
+            except Exception:
+                log.exception('Unable to reload %s', self._mock_responses_directory)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of the rendered mock templates, it allows restarts to skip
+rendering the templates that did not change since the previous load.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import hashlib
+import os
+
+import six
+
+from pyramid_mock_server.json_codec import get_json_codec
+from pyramid_mock_server.util import atomic_write
+from pyramid_mock_server.util import ensure_directory
+
+# Bump it when the rendering output changes for unchanged templates
+_RENDER_CACHE_VERSION = 1
+
+
+class RenderCache(object):
+    """ Store the rendered templates of a mock responses directory.
+
+    An entry is keyed by the template name and holds the hashes of the template
+    and of all the templates it pulled in while being rendered, it is stale as
+    soon as one of them changes.
+    """
+
+    def __init__(self, cache_directory, mock_responses_directory, json_codec=None):
+        """
+        :param cache_directory: directory where the rendered templates are stored,
+            it is created if needed and can be shared by several processes.
+        :param mock_responses_directory: path to root responses directory
+        :param json_codec: JSONCodec reading and writing the entries, the entries written
+            by another codec are ignored as the templates were rendered with it.
+            Defaults to the standard library.
+        """
+        self._cache_directory = cache_directory
+        self._mock_responses_directory = mock_responses_directory
+        self._json_codec = json_codec or get_json_codec()
+        # Templates are hashed once per load, most are shared by many others
+        self._template_hashes = {}
+
+        ensure_directory(cache_directory)
+
+    def template_hash(self, template_name):
+        """ Hash the content of a template
+
+        :param template_name: name of the template, relative to the responses directory
+        :return: hash string, or None if the template cannot be read
+        """
+        try:
+            return self._template_hashes[template_name]
+        except KeyError:
+            pass
+
+        try:
+            with open(os.path.join(self._mock_responses_directory, template_name), 'rb') as f:
+                template_hash = hashlib.sha1(f.read()).hexdigest()
+        except (IOError, OSError):
+            template_hash = None
+
+        self._template_hashes[template_name] = template_hash
+        return template_hash
+
+    def _entry_path(self, template_name):
+        entry_name = hashlib.sha1(template_name.encode('utf-8')).hexdigest()
+        return os.path.join(self._cache_directory, entry_name + '.json')
+
+    def get(self, template_name):
+        """ Read a rendered template from the cache
+
+        :param template_name: name of the template, relative to the responses directory
+        :return: (rendered string, set of the names of the templates it used) tuple, or None if
+            there is no valid entry for the template
+        """
+        try:
+            with open(self._entry_path(template_name), 'rb') as f:
+                entry = self._json_codec.loads(f.read().decode('utf-8'))
+        except (IOError, OSError, ValueError):
+            return None
+
+        if (
+            entry.get('version') != _RENDER_CACHE_VERSION or
+            entry.get('json_codec') != self._json_codec.name or
+            entry.get('template') != template_name
+        ):
+            return None
+
+        for name, template_hash in six.iteritems(entry['hashes']):
+            if self.template_hash(name) != template_hash:
+                return None
+
+        dependencies = set(entry['hashes'])
+        dependencies.discard(template_name)
+        return entry['rendered'], dependencies
+
+    def set(self, template_name, dependencies, rendered):
+        """ Store a rendered template in the cache
+
+        :param template_name: name of the template, relative to the responses directory
+        :param dependencies: names of the templates used to render it
+        :param rendered: rendered string
+        """
+        entry = {
+            'version': _RENDER_CACHE_VERSION,
+            'json_codec': self._json_codec.name,
+            'template': template_name,
+            'hashes': {
+                name: self.template_hash(name)
+                for name in set(dependencies) | set([template_name])
+            },
+            'rendered': rendered,
+        }
+
+        # Concurrent readers never see partial entries
+        data = self._json_codec.dumps(entry).encode('utf-8')
+        atomic_write(self._entry_path(template_name), lambda f: f.write(data))
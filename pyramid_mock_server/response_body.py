@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""
+Mock bodies never change once loaded, everything needed to send them is
+computed here once instead of on every request.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import hashlib
+import io
+import mmap
+import os
+import zlib
+from collections import namedtuple
+
+from pyramid_mock_server.util import atomic_write
+
+
+JSON_CONTENT_TYPE = str('application/json')
+
+# Size of the blocks in which the file snapshots are copied and sent
+_CHUNK_SIZE = 64 * 1024
+
+
+class EncodedBody(namedtuple(
+    'EncodedBodyBase', ['data', 'headerlist', 'gzip_data', 'gzip_headerlist', 'etag']
+)):
+    """ Encoded mock response body and the headers describing it.
+    gzip_data and gzip_headerlist are only set if a gzip compressed
+    variant of the body is available.
+    """
+    def __new__(cls, data, headerlist, gzip_data=None, gzip_headerlist=None, etag=None):
+        return super(EncodedBody, cls).__new__(
+            cls,
+            data=data,
+            headerlist=headerlist,
+            gzip_data=gzip_data,
+            gzip_headerlist=gzip_headerlist,
+            etag=etag,
+        )
+
+    def select(self, accept_encoding):
+        """ Pick the variant of the body to send to a client
+
+        :param accept_encoding: value of the Accept-Encoding request header, or None
+        :return: (data, headerlist) tuple
+        """
+        if self.gzip_data is not None and accepts_gzip(accept_encoding):
+            return self.gzip_data, self.gzip_headerlist
+        return self.data, self.headerlist
+
+
+class SharedFileSnapshot(object):
+    """ Snapshot of a file in an anonymous shared memory mapping. Its content is shared
+    by the processes forked after it was read instead of being copied in their heap,
+    and the file can be modified or removed without affecting it.
+
+    Unlike a mapping of the file itself, it keeps no file descriptor open.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path of the file
+        :raises: IOError or OSError if the file cannot be read
+        """
+        self.path = path
+        with io.open(path, 'rb') as f:
+            self.size = os.fstat(f.fileno()).st_size
+            # Empty mappings are not allowed
+            self._mapping = b''
+            if self.size:
+                self._mapping = mmap.mmap(-1, self.size)
+                # The file is copied one block at a time, it is never held in the heap
+                copied = 0
+                while copied < self.size:
+                    chunk = f.read(min(_CHUNK_SIZE, self.size - copied))
+                    if not chunk:
+                        raise IOError('{0} was truncated while it was read'.format(path))
+                    self._mapping.write(chunk)
+                    copied += len(chunk)
+                self._mapping.seek(0)
+
+    def __reduce__(self):
+        # Mappings cannot be pickled, the file is read again by the unpickling process
+        return SharedFileSnapshot, (self.path,)
+
+    def find(self, sub):
+        return self._mapping.find(sub, 0)
+
+    def sha1(self):
+        return hashlib.sha1(self._mapping).hexdigest()
+
+    def read(self):
+        """ Copy the content of the file
+
+        :return: bytes
+        """
+        return self._mapping[:]
+
+    def iter_chunks(self):
+        """ Iterate over the content of the file, one block at a time
+
+        :return: iterator of bytes
+        """
+        for start in range(0, self.size, _CHUNK_SIZE):
+            yield self._mapping[start:start + _CHUNK_SIZE]
+
+    def app_iter(self, environ):
+        """ Make the WSGI application iterator sending the content of the file.
+        The server file_wrapper would send the current content of the file, it is
+        not used.
+
+        :param environ: WSGI environ of the request
+        :return: iterable of bytes
+        """
+        return self.iter_chunks()
+
+
+class ArenaSlice(object):
+    """ Body stored in a response arena, see store_in_arena. Only its position is
+    kept in the heap.
+    """
+    __slots__ = ('_mapping', 'offset', 'size')
+
+    def __init__(self, mapping, offset, size):
+        self._mapping = mapping
+        self.offset = offset
+        self.size = size
+
+    def read(self):
+        """ Copy the content of the slice
+
+        :return: bytes
+        """
+        return self._mapping[self.offset:self.offset + self.size]
+
+    def iter_chunks(self):
+        """ Iterate over the content of the slice, one block at a time
+
+        :return: iterator of bytes
+        """
+        end = self.offset + self.size
+        for start in range(self.offset, end, _CHUNK_SIZE):
+            yield self._mapping[start:min(start + _CHUNK_SIZE, end)]
+
+    def app_iter(self, environ):
+        """ Make the WSGI application iterator sending the content of the slice.
+        The server file_wrapper sends whole files, it cannot be used.
+
+        :param environ: WSGI environ of the request
+        :return: iterable of bytes
+        """
+        return self.iter_chunks()
+
+
+def store_in_arena(datas, path=None):
+    """ Write bodies one after the other in a single read-only memory mapping, the
+    response arena. Unlike bytes objects, whose reference counts are written to by
+    every process using them, its pages stay shared by the processes forked after
+    it was built.
+
+    :param datas: list of bytes
+    :param path: file the arena is written to then mapped from, it is replaced if it
+        exists. The arena is anonymous shared memory if it is None.
+    :return: list of ArenaSlice, one per data
+    """
+    size = sum(len(data) for data in datas)
+    # Empty mappings are not allowed
+    mapping = b''
+    if path is None:
+        if size:
+            mapping = mmap.mmap(-1, size)
+            for data in datas:
+                mapping.write(data)
+    else:
+        def write_datas(f):
+            for data in datas:
+                f.write(data)
+
+        # The processes mapping the previous arena keep their pages
+        atomic_write(path, write_datas)
+        if size:
+            with open(path, 'rb') as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    slices = []
+    offset = 0
+    for data in datas:
+        slices.append(ArenaSlice(mapping, offset, len(data)))
+        offset += len(data)
+    return slices
+
+
+def _gzip(data):
+    # wbits=31 writes a gzip container, the header has no timestamp nor file name
+    # so the output only depends on data.
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _parse_quality(params):
+    """
+    :param params: parameters of an Accept-Encoding entry, e.g. 'q=0.5'
+    :return: its quality, 1 if it has none and 0 if it is invalid
+    """
+    for param in params.split(';'):
+        name, _, value = param.partition('=')
+        if name.strip() == 'q':
+            try:
+                return float(value)
+            except ValueError:
+                return 0
+    return 1
+
+
+def accepts_gzip(accept_encoding):
+    """ Check whether an Accept-Encoding header allows gzip encoded content,
+    an explicit gzip entry takes precedence over the * one.
+
+    :param accept_encoding: value of the Accept-Encoding request header, or None
+    :return: boolean
+    """
+    if not accept_encoding:
+        return False
+    accept_encoding = accept_encoding.lower()
+    if 'gzip' not in accept_encoding and '*' not in accept_encoding:
+        return False
+
+    # coding -> quality, of the gzip and * entries
+    qualities = {}
+    for coding in accept_encoding.split(','):
+        name, _, params = coding.partition(';')
+        name = name.strip()
+        if name in ('gzip', '*'):
+            qualities[name] = _parse_quality(params)
+
+    return qualities.get('gzip', qualities.get('*', 0)) > 0
+
+
+def _extra_headers(cache_control):
+    if cache_control:
+        return ((str('Cache-Control'), str(cache_control)),)
+    return ()
+
+
+def snapshot_body(file_snapshot, cache_control=None):
+    """ Build the headers describing a file snapshot sent as is, it is never compressed
+    as the compressed copy would live in the heap.
+
+    :param file_snapshot: SharedFileSnapshot
+    :param cache_control: value of the Cache-Control header sent with the body, or None
+    :return: EncodedBody whose data is the SharedFileSnapshot
+    """
+    etag = file_snapshot.sha1()
+    return EncodedBody(
+        data=file_snapshot,
+        headerlist=(
+            (str('Content-Type'), JSON_CONTENT_TYPE),
+            (str('Content-Length'), str(file_snapshot.size)),
+            (str('ETag'), str('"{0}"'.format(etag))),
+        ) + _extra_headers(cache_control),
+        etag=etag,
+    )
+
+
+def encode_body(json_str, gzip_min_size=None, cache_control=None):
+    """ Encode a rendered mock response and build the headers describing it.
+
+    :param json_str: rendered json string
+    :param gzip_min_size: if not None, bodies of at least this size in bytes get a gzip
+        compressed variant
+    :param cache_control: value of the Cache-Control header sent with the body, or None
+    :return: EncodedBody
+    """
+    data = json_str.encode('utf-8')
+    return _encode_data(data, hashlib.sha1(data).hexdigest(), gzip_min_size, cache_control)
+
+
+def _encode_data(data, etag, gzip_min_size, cache_control):
+    extra_headers = _extra_headers(cache_control)
+
+    if gzip_min_size is None or len(data) < gzip_min_size:
+        return EncodedBody(
+            data=data,
+            headerlist=(
+                (str('Content-Type'), JSON_CONTENT_TYPE),
+                (str('Content-Length'), str(len(data))),
+                (str('ETag'), str('"{0}"'.format(etag))),
+            ) + extra_headers,
+            etag=etag,
+        )
+
+    # The compressed variant is a different representation, it needs its own strong ETag
+    gzip_data = _gzip(data)
+    return EncodedBody(
+        data=data,
+        headerlist=(
+            (str('Content-Type'), JSON_CONTENT_TYPE),
+            (str('Content-Length'), str(len(data))),
+            (str('ETag'), str('"{0}"'.format(etag))),
+            (str('Vary'), str('Accept-Encoding')),
+        ) + extra_headers,
+        gzip_data=gzip_data,
+        gzip_headerlist=(
+            (str('Content-Type'), JSON_CONTENT_TYPE),
+            (str('Content-Encoding'), str('gzip')),
+            (str('Content-Length'), str(len(gzip_data))),
+            (str('ETag'), str('"{0}-gzip"'.format(etag))),
+            (str('Vary'), str('Accept-Encoding')),
+        ) + extra_headers,
+        etag=etag,
+    )
+
+
+class BodyInterner(object):
+    """ Content addressed store of the rendered mock responses: the identical ones,
+    eg. the same 404 payload under many names, share one json_str and one EncodedBody,
+    which is only encoded and compressed once.
+    """
+
+    def __init__(self, gzip_min_size=None, cache_control=None):
+        """
+        :param gzip_min_size: see encode_body
+        :param cache_control: see encode_body
+        """
+        self._gzip_min_size = gzip_min_size
+        self._cache_control = cache_control
+        # {sha1 of the body: (json_str, EncodedBody)}
+        self._bodies = {}
+
+    def encode(self, json_str):
+        """ Encode a rendered mock response, unless an identical one already was
+
+        :param json_str: rendered json string
+        :return: (json_str, EncodedBody) tuple, the ones of the first identical response
+        """
+        data = json_str.encode('utf-8')
+        etag = hashlib.sha1(data).hexdigest()
+        interned = self._bodies.get(etag)
+        if interned is None:
+            interned = self._bodies.setdefault(
+                etag,
+                (json_str, _encode_data(data, etag, self._gzip_min_size, self._cache_control)),
+            )
+        return interned
+
+    def intern(self, json_str, body):
+        """ Share an already encoded mock response, eg. one rendered by another process
+
+        :param json_str: rendered json string
+        :param body: EncodedBody of json_str, encoded with the settings of the interner
+        :return: (json_str, EncodedBody) tuple, the ones of the first identical response
+        """
+        return self._bodies.setdefault(body.etag, (json_str, body))
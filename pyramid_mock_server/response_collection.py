@@ -2,43 +2,123 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
-from collections import Counter
+import threading
 from collections import defaultdict
-from itertools import chain
+from collections import namedtuple
+from collections import OrderedDict
 
 import six
 
-from pyramid_mock_server.util import extract_arg_pattern_from_query_args
-from pyramid_mock_server.util import extract_arg_pattern_from_response_name
+from pyramid_mock_server.util import get_arg_patterns
 from pyramid_mock_server.util import norm_operation
 
 
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+# Marks the arguments missing from the request in the match cache keys
+_MISSING = object()
+
+
+class _LRUCache(object):
+    """ Thread-safe bounded mapping evicting the least recently used entries
+    """
+
+    def __init__(self, maxsize):
+        """
+        :param maxsize: maximum number of entries kept in the cache
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+
 class _ResponseVariations(object):
     """ Group the different possible response variations and actually performs
     the matching from the parameters
     """
 
-    def __init__(self, mock_responses=None):
+    def __init__(self, mock_responses=None, match_cache_size=None):
         """ Initialize the instance.
         The optional parameter is here to test this object.
 
         :param mock_responses: List of mock response names
+        :param match_cache_size: number of match results to memoize, None or 0 disables
+            the memoization
         """
         self._arg_pattern_by_operation = {}
         self._mock_response_by_operation = {}
+        self._match_cache_size = match_cache_size
+        self._index = None
+        # Variations can be updated while requests are served, the lock
+        # guarantees that an index is built from a consistent state.
+        self._lock = threading.Lock()
 
         if mock_responses:
             for mock_response in mock_responses:
                 self.add_mock_response(mock_response)
 
+    def __len__(self):
+        return len(self._mock_response_by_operation)
+
     def add_mock_response(self, mock_response):
-        arg_pattern = extract_arg_pattern_from_response_name(mock_response.operation.response_name)
-        if mock_response.operation.query_args:
-            arg_pattern.update(
-                extract_arg_pattern_from_query_args(mock_response.operation.query_args)
-            )
-        self._arg_pattern_by_operation[mock_response.operation] = arg_pattern
-        self._mock_response_by_operation[mock_response.operation] = mock_response
+        arg_pattern = get_arg_patterns(mock_response.operation).combined
+        with self._lock:
+            self._arg_pattern_by_operation[mock_response.operation] = arg_pattern
+            self._mock_response_by_operation[mock_response.operation] = mock_response
+            self._index = None
+
+    def remove_operation(self, operation):
+        """ Remove the variation of the given operation, if any
+
+        :param operation: Operation of the variation
+        """
+        with self._lock:
+            self._arg_pattern_by_operation.pop(operation, None)
+            self._mock_response_by_operation.pop(operation, None)
+            self._index = None
+
+    def _get_index(self):
+        """ Return the matching index, compiling it if the variations changed
+        since the last call.
+
+        :return: _VariationsIndex instance
+        """
+        index = self._index
+        if index is None:
+            with self._lock:
+                index = self._index
+                if index is None:  # pragma: no branch
+                    index = self._index = _VariationsIndex(
+                        self._arg_pattern_by_operation,
+                        self._mock_response_by_operation,
+                        match_cache_size=self._match_cache_size,
+                    )
+        return index
 
     def get_arg_list(self):
         """ Return the list of arguments that is defined by the list of
@@ -46,11 +126,15 @@ class _ResponseVariations(object):
 
         :return: list of arguments as an array of strings
         """
-        arg_list = {}
-        for pattern in six.itervalues(self._arg_pattern_by_operation):
-            arg_list.update(pattern)
+        return self._get_index().arg_list
 
-        return arg_list.keys()
+    def get_single_mock_response(self):
+        """ Return the mock response if there is only one variation, it then
+        has to be returned whatever the request arguments are.
+
+        :return: MockResponse or None
+        """
+        return self._get_index().single_mock_response
 
     def generate_string_replacement_dict(self):
         """ Return all the variations as dictionaries that can be used to
@@ -80,31 +164,121 @@ class _ResponseVariations(object):
         :param arg_dict: the requests arguments
         :return: best known matching MockResponse
         """
+        return self._get_index().match(arg_dict)
 
-        # If their is only one alternative, return it directly
+    def match_cache_info(self):
+        """ Return the statistics of the match memoization, they are reset
+        whenever the variations change.
+
+        :return: CacheInfo instance, or None if memoization is disabled
+        """
+        match_cache = self._get_index().match_cache
+        if match_cache is None:
+            return None
+        return match_cache.info()
+
+
+class _VariationsIndex(object):
+    """ Inverted index of the argument patterns of a set of variations.
+
+    Every operation gets one vote per argument it matches: a vote for each
+    (argument, value) pair its pattern defines, or, if no operation defines
+    the requested value, a vote for each argument it leaves generic.
+    The operation with most votes wins, ties are broken by the order in
+    which the votes were cast.
+
+    The index is never updated, it is replaced when the variations change,
+    and so is its match cache.
+    """
+
+    def __init__(self, arg_pattern_by_operation, mock_response_by_operation, match_cache_size=None):
+        """
+        :param arg_pattern_by_operation: dictionary of operation -> argument pattern
+        :param mock_response_by_operation: dictionary of operation -> MockResponse
+        :param match_cache_size: number of match results to memoize, None or 0 disables
+            the memoization
+        """
+        self._mock_response_by_operation = dict(mock_response_by_operation)
+        self.single_mock_response = None
         if len(self._mock_response_by_operation) == 1:
-            return next(six.itervalues(self._mock_response_by_operation))
+            self.single_mock_response = next(six.itervalues(self._mock_response_by_operation))
+        self.match_cache = _LRUCache(match_cache_size) if match_cache_size else None
+
+        arg_list = {}
+        for pattern in six.itervalues(arg_pattern_by_operation):
+            arg_list.update(pattern)
+        self.arg_list = arg_list.keys()
+
+        self._operations_by_arg_value = defaultdict(list)
+        for operation, pattern in six.iteritems(arg_pattern_by_operation):
+            for arg, value in six.iteritems(pattern):
+                self._operations_by_arg_value[(arg, value)].append(operation)
+        self._operations_by_arg_value = dict(self._operations_by_arg_value)
+
+        self._default_operations_by_arg = [
+            (
+                arg,
+                [
+                    operation
+                    for operation, pattern in six.iteritems(arg_pattern_by_operation)
+                    if pattern.get(arg) is None
+                ],
+            )
+            for arg in self.arg_list
+        ]
+
+    def match(self, arg_dict):
+        """ Find the mock response whose pattern matches arg_dict best
+
+        :param arg_dict: the requests arguments
+        :return: best matching MockResponse
+        """
+        # If their is only one alternative, return it directly
+        if self.single_mock_response is not None:
+            return self.single_mock_response
+
+        if self.match_cache is None:
+            return self._mock_response_by_operation[self._match_operation(arg_dict)]
+
+        cache_key = tuple(arg_dict.get(arg, _MISSING) for arg in self.arg_list)
+        mock_response = self.match_cache.get(cache_key)
+        if mock_response is None:
+            mock_response = self._mock_response_by_operation[self._match_operation(arg_dict)]
+            self.match_cache.set(cache_key, mock_response)
+        return mock_response
+
+    def _match_operation(self, arg_dict):
+        """ Find the operation whose pattern matches arg_dict best,
+        prioritizing most specific value match over the generic.
+
+        :param arg_dict: the requests arguments
+        :return: best matching operation
+        """
+        scores = {}
+        matched_args = set()
 
-        # Find the alternative that matches arguments best prioritizing
-        # most specific value match over the generic.
-        matchs = defaultdict(list)
         for key, value in six.iteritems(arg_dict):
-            for operation, pattern in six.iteritems(self._arg_pattern_by_operation):
-                if key in pattern and pattern[key] == value:
-                    matchs[key].append(operation)
+            operations = self._operations_by_arg_value.get((key, value))
+            if operations:
+                matched_args.add(key)
+                for operation in operations:
+                    scores[operation] = scores.get(operation, 0) + 1
 
-        for key in self.get_arg_list():
+        for key, operations in self._default_operations_by_arg:
             # We only try to match the default pattern if no particular pattern
             # has been found.
-            if not matchs[key]:
-                for operation, pattern in six.iteritems(self._arg_pattern_by_operation):
-                    if pattern.get(key) is None:
-                        matchs[key].append(operation)
+            if key not in matched_args:
+                for operation in operations:
+                    scores[operation] = scores.get(operation, 0) + 1
+
+        if not scores:
+            raise LookupError(
+                'No variation matches arguments {0}'.format(sorted(six.iteritems(arg_dict)))
+            )
 
-        # We use Counter to get the most matched name in the previous step
-        all_matches = chain.from_iterable(six.itervalues(matchs))
-        best_matched_operation = Counter(all_matches).most_common(1)[0][0]
-        return self._mock_response_by_operation[best_matched_operation]
+        # max returns the first of the highest scores, which mirrors the
+        # ordering of Counter.most_common
+        return max(scores, key=scores.get)
 
 
 class ResponseCollection(object):
@@ -113,17 +287,40 @@ class ResponseCollection(object):
     which this view should be used
     """
 
-    def __init__(self, mock_responses):
+    def __init__(self, mock_responses, match_cache_size=None):
         """
         :param mock_responses: array of read MockResponses
+        :param match_cache_size: number of match results memoized per endpoint,
+            None or 0 disables the memoization
         """
-        self._internal_storage = defaultdict(_ResponseVariations)
+        self._internal_storage = defaultdict(
+            lambda: _ResponseVariations(match_cache_size=match_cache_size),
+        )
+        # Incremented on every change, it lets the views know when the variations
+        # they were built from are outdated.
+        self.version = 0
         for mock_response in mock_responses:
             self.add_mock_response(mock_response)
 
     def add_mock_response(self, mock_response):
         normed = norm_operation(mock_response.operation)
         self._internal_storage[normed].add_mock_response(mock_response)
+        self.version += 1
+
+    def remove_operation(self, operation):
+        """ Remove the mock response of the given operation, if any
+
+        :param operation: Operation of the mock response
+        """
+        normed = norm_operation(operation)
+        variations = self._internal_storage.get(normed)
+        if variations is None:
+            return
+
+        variations.remove_operation(operation)
+        if not variations:
+            del self._internal_storage[normed]
+        self.version += 1
 
     def get_variations(self, response_operation):
         normed_operation = norm_operation(response_operation)
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Routes mapper matching the routes through a radix tree of their path segments,
+instead of trying every route in turn like the default pyramid mapper.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import re
+import threading
+
+from pyramid.exceptions import URLDecodeError
+from pyramid.interfaces import IRoutesMapper
+from pyramid.urldispatch import RoutesMapper
+
+
+_PARAMETER_SEGMENT_REGEX = re.compile(r'^{([_a-zA-Z]\w*)}$')
+
+
+def parse_route_pattern(pattern):
+    """ Split a route pattern into its segments, if it only uses plain segments
+    and {name} segments.
+
+    :param pattern: pyramid route pattern
+    :return: list of (is_parameter, segment or parameter name) tuples, or None if
+        the pattern uses other features: regular expressions, remainders, ...
+    """
+    if pattern.startswith('/'):
+        pattern = pattern[1:]
+
+    segments = []
+    for segment in pattern.split('/'):
+        match = _PARAMETER_SEGMENT_REGEX.match(segment)
+        if match:
+            segments.append((True, match.group(1)))
+        elif any(character in segment for character in '{}:*'):
+            return None
+        else:
+            segments.append((False, segment))
+    return segments
+
+
+class _Node(object):
+    __slots__ = ('static_children', 'parameter_child', 'routes', 'min_index')
+
+    def __init__(self, index):
+        self.static_children = {}
+        self.parameter_child = None
+        # (index, route, parameter names) tuples of the routes ending here, by index
+        self.routes = []
+        # Lowest index of the routes below this node, to skip the subtrees that
+        # cannot hold a better match
+        self.min_index = index
+
+
+class RadixTree(object):
+    """ Radix tree of the route patterns made of plain and {name} segments.
+
+    When several routes match a path, the one with the lowest index wins, like
+    the first route registered wins with pyramid.
+    """
+
+    def __init__(self):
+        self._root = _Node(None)
+
+    def add(self, index, route, segments):
+        """
+        :param index: position of the route in the routes list, routes are added by index
+        :param route: pyramid route
+        :param segments: segments of the route pattern, as returned by parse_route_pattern
+        """
+        node = self._root
+        if node.min_index is None:
+            node.min_index = index
+        for is_parameter, segment in segments:
+            if is_parameter:
+                if node.parameter_child is None:
+                    node.parameter_child = _Node(index)
+                node = node.parameter_child
+            else:
+                child = node.static_children.get(segment)
+                if child is None:
+                    child = node.static_children[segment] = _Node(index)
+                node = child
+        names = tuple(segment for is_parameter, segment in segments if is_parameter)
+        node.routes.append((index, route, names))
+
+    def match(self, path):
+        """ Find the route matching a path
+
+        :param path: decoded path of the request
+        :return: (index, route, matchdict) tuple, or None if no route matches
+        """
+        if not path.startswith('/') or self._root.min_index is None:
+            return None
+
+        segments = path[1:].split('/')
+        segments_count = len(segments)
+        best = [None]
+
+        def visit(node, position, values):
+            if best[0] is not None and node.min_index >= best[0][0]:
+                return
+            if position == segments_count:
+                if node.routes:
+                    index, route, names = node.routes[0]
+                    best[0] = (index, route, dict(zip(names, values)))
+                return
+
+            segment = segments[position]
+            child = node.static_children.get(segment)
+            if child is not None:
+                visit(child, position + 1, values)
+            # Like pyramid, parameters match non empty segments
+            if node.parameter_child is not None and segment:
+                visit(node.parameter_child, position + 1, values + (segment,))
+
+        visit(self._root, 0, ())
+        return best[0]
+
+
+def build_route_index(routes):
+    """ Index routes for the lookups made like the pyramid mapper: the routes
+    whose pattern cannot be represented in a RadixTree, or which have route
+    predicates, have to be tried in turn.
+
+    :param routes: list of pyramid routes, in registration order
+    :return: (RadixTree, list of (index, route) tuples of the other routes) tuple
+    """
+    tree = RadixTree()
+    other_routes = []
+    for route_index, route in enumerate(routes):
+        segments = parse_route_pattern(route.pattern)
+        if segments is None or route.predicates:
+            other_routes.append((route_index, route))
+        else:
+            tree.add(route_index, route, segments)
+    return tree, other_routes
+
+
+class RadixRoutesMapper(RoutesMapper):
+    """ Routes mapper looking the routes up in a RadixTree.
+
+    The routes whose pattern cannot be represented in the tree, or which have
+    route predicates, are tried in turn, in registration order, before the best
+    match of the tree. Matching is otherwise identical to the pyramid mapper.
+    """
+
+    def __init__(self):
+        super(RadixRoutesMapper, self).__init__()
+        self._index = None
+        self._lock = threading.Lock()
+
+    def connect(self, *args, **kwargs):
+        route = super(RadixRoutesMapper, self).connect(*args, **kwargs)
+        self._index = None
+        return route
+
+    def _get_index(self):
+        """
+        :return: (RadixTree, list of (index, route) tuples of the other routes) tuple
+        """
+        index = self._index
+        if index is None:
+            with self._lock:
+                index = self._index
+                if index is None:  # pragma: no branch
+                    index = self._index = build_route_index(self.routelist)
+        return index
+
+    def __call__(self, request):
+        try:
+            # empty if mounted under a path in mod_wsgi, for example
+            path = request.path_info or '/'
+        except KeyError:
+            path = '/'
+        except UnicodeDecodeError as e:
+            raise URLDecodeError(e.encoding, e.object, e.start, e.end, e.reason)
+
+        tree, other_routes = self._get_index()
+        tree_match = tree.match(path)
+
+        for route_index, route in other_routes:
+            if tree_match is not None and route_index > tree_match[0]:
+                break
+            match = route.match(path)
+            if match is not None:
+                predicates = route.predicates
+                info = {'match': match, 'route': route}
+                if predicates and not all(p(info, request) for p in predicates):
+                    continue
+                return info
+
+        if tree_match is not None:
+            return {'match': tree_match[2], 'route': tree_match[1]}
+        return {'route': None, 'match': None}
+
+
+def use_radix_routes_mapper(config):
+    """ Replace the routes mapper of a pyramid configuration by a RadixRoutesMapper,
+    keeping the routes already registered.
+
+    :param config: pyramid config, the routes mapper must be replaced before the
+        WSGI application is made.
+    """
+    mapper = config.registry.queryUtility(IRoutesMapper)
+    if isinstance(mapper, RadixRoutesMapper):
+        return
+
+    radix_mapper = RadixRoutesMapper()
+    if mapper is not None:
+        radix_mapper.routelist = list(mapper.routelist)
+        radix_mapper.static_routes = list(mapper.static_routes)
+        radix_mapper.routes = dict(mapper.routes)
+    config.registry.registerUtility(radix_mapper, IRoutesMapper)
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+Prefork HTTP server for the mock server: the mock responses are loaded once in the
+parent process, then the workers are forked and share the read-only mock data
+copy-on-write, along with one listening socket.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import errno
+import gc
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from argparse import ArgumentParser
+from wsgiref.simple_server import WSGIRequestHandler
+from wsgiref.simple_server import WSGIServer
+
+from pyramid.config import Configurator
+from six.moves.socketserver import ThreadingMixIn
+
+from pyramid_mock_server.fast_app import FastMockApp
+
+# Delay before forking again a worker which exited shortly after it was forked,
+# doubled for each of them in a row
+_RESPAWN_DELAY = 0.1
+_MAX_RESPAWN_DELAY = 5
+# Minimum lifetime in seconds of a worker which did not exit at startup
+_MIN_WORKER_LIFETIME = 1
+
+
+def make_wsgi_app(swagger_spec_path, mock_responses_path, custom_view_packages=None, settings=None):
+    """ Create the mock server pyramid application of a swagger spec
+
+    :param swagger_spec_path: path of the swagger 2.0 spec
+    :param mock_responses_path: path of the mock responses directory
+    :param custom_view_packages: list of the packages to import custom views from
+    :param settings: extra pyramid settings, eg. {'pyramid_mock_server.gzip_min_size': '1024'}.
+        The response validation is turned off with gzip_min_size unless they enable it, it
+        cannot read the compressed bodies.
+    :return: pyramid Router
+    """
+    settings = dict(settings or {})
+    if settings.get('pyramid_mock_server.gzip_min_size') is not None:
+        settings.setdefault('pyramid_swagger.enable_response_validation', False)
+
+    config = Configurator(settings=dict({
+        'service_name': 'mobile_api_mock_server',
+
+        'pyramid_swagger.dereference_served_schema': True,
+        'pyramid_swagger.schema_directory': os.path.abspath(os.path.dirname(swagger_spec_path)),
+        'pyramid_swagger.schema_file': os.path.basename(swagger_spec_path),
+        'pyramid_swagger.swagger_versions': ['2.0'],
+        'pyramid_swagger.enable_request_validation': False,
+        'pyramid_swagger.enable_response_validation': True,
+
+        # pyramid_mock_server config
+        'pyramid_mock_server.mock_responses_path': mock_responses_path,
+        'pyramid_mock_server.get_resources_from_pyramid_swagger_2_0_schema': True,
+        'pyramid_mock_server.custom_view_packages': custom_view_packages or [],
+    }, **settings))
+
+    config.include('pyramid_mock_server')
+
+    return config.make_wsgi_app()
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class _WorkerServer(ThreadingMixIn, WSGIServer):
+    """ WSGI server accepting the connections of an already listening socket,
+    one thread per connection.
+    """
+    daemon_threads = True
+
+    def __init__(self, listen_socket, access_log=False):
+        WSGIServer.__init__(
+            self,
+            listen_socket.getsockname()[:2],
+            WSGIRequestHandler if access_log else _QuietRequestHandler,
+            bind_and_activate=False,
+        )
+        self.socket.close()
+        self.socket = listen_socket
+        # What server_bind sets up for the sockets bound by the server
+        host, port = listen_socket.getsockname()[:2]
+        self.server_name = socket.getfqdn(host)
+        self.server_port = port
+        self.setup_environ()
+
+
+def _make_listen_socket(host, port, backlog):
+    address_info = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0]
+    listen_socket = socket.socket(address_info[0], socket.SOCK_STREAM)
+    listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listen_socket.bind(address_info[4])
+    listen_socket.listen(backlog)
+    return listen_socket
+
+
+def _run_worker(server):
+    """ Serve the requests in a forked worker, until it is terminated """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # The parent terminates the workers on Ctrl-C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    status = 0
+    try:
+        server.serve_forever()
+    except Exception:
+        traceback.print_exc()
+        status = 1
+    finally:
+        os._exit(status)
+
+
+def _serve_prefork(server, workers):
+    """ Fork the workers serving the requests, and fork them again when they die,
+    until the parent process gets SIGTERM or SIGINT. The workers dying at startup
+    are forked again with an increasing delay.
+
+    :param server: _WorkerServer, its application is loaded
+    :param workers: number of worker processes
+    """
+    # {pid: time the worker was forked}
+    children = {}
+    stopping = []
+    # Number of workers in a row which exited at startup
+    early_exits = 0
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in list(children):
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # Keep the garbage collector from writing to, and so copying, the pages of
+    # the objects loaded before the fork
+    gc.collect()
+    if hasattr(gc, 'freeze'):  # pragma: no branch
+        gc.freeze()
+
+    while True:
+        while not stopping and len(children) < workers:
+            if early_exits:
+                time.sleep(min(_RESPAWN_DELAY * 2 ** (early_exits - 1), _MAX_RESPAWN_DELAY))
+                if stopping:
+                    break
+            pid = os.fork()
+            if pid == 0:
+                _run_worker(server)
+            children[pid] = time.time()
+
+        if not children:
+            return
+
+        try:
+            pid, status = os.wait()
+        except OSError as e:
+            # Interrupted by a signal, on python 2
+            if e.errno != errno.EINTR:
+                raise
+        else:
+            forked_at = children.pop(pid)
+            if not stopping:
+                print('Worker {0} exited with status {1}'.format(pid, status), file=sys.stderr)
+                if time.time() - forked_at < _MIN_WORKER_LIFETIME:
+                    early_exits += 1
+                else:
+                    early_exits = 0
+
+
+def _parse_setting(setting):
+    name, separator, value = setting.partition('=')
+    if not separator:
+        raise ValueError(setting)
+    return name, value
+
+
+def main(argv=None):
+    parser = ArgumentParser(description='pyramid-mock-server tools')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    serve_parser = subparsers.add_parser(
+        'serve',
+        help='Serve the mock responses of a swagger spec with preforked workers',
+    )
+    serve_parser.add_argument('swagger_spec', help='Path of the swagger-specs')
+    serve_parser.add_argument(
+        'mock_responses',
+        help='Path of the pyramid-mock-server mock responses',
+    )
+    serve_parser.add_argument('-c', '--custom-views', nargs='*', dest='custom_view')
+    serve_parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    serve_parser.add_argument('-p', '--port', type=int, default=8080, help='Port to listen on')
+    serve_parser.add_argument(
+        '-w',
+        '--workers',
+        type=int,
+        default=multiprocessing.cpu_count(),
+        help='Number of worker processes, one per core by default',
+    )
+    serve_parser.add_argument(
+        '--backlog',
+        type=int,
+        default=1024,
+        help='Maximum number of pending connections',
+    )
+    serve_parser.add_argument(
+        '-s',
+        '--setting',
+        dest='settings',
+        action='append',
+        default=[],
+        type=_parse_setting,
+        metavar='NAME=VALUE',
+        help='Pyramid setting, eg. pyramid_mock_server.gzip_min_size=1024, can be repeated',
+    )
+    serve_parser.add_argument(
+        '--fast',
+        action='store_true',
+        default=False,
+        help='Serve the mock responses with the FastMockApp, without the pyramid_swagger '
+             'validation',
+    )
+    serve_parser.add_argument(
+        '--access-log',
+        dest='access_log',
+        action='store_true',
+        default=False,
+        help='Log the requests on stderr',
+    )
+    args = parser.parse_args(argv)
+
+    settings = dict(args.settings)
+    if settings.get('pyramid_mock_server.reload_interval'):
+        parser.error('pyramid_mock_server.reload_interval is not supported by the workers')
+    # Unlike the heap, the pages of the arena stay shared by the workers
+    settings.setdefault('pyramid_mock_server.response_arena', ':memory:')
+
+    # Load the mock responses once, before forking
+    app = make_wsgi_app(
+        args.swagger_spec,
+        args.mock_responses,
+        custom_view_packages=args.custom_view,
+        settings=settings,
+    )
+    if args.fast:
+        app = FastMockApp(app)
+
+    listen_socket = _make_listen_socket(args.host, args.port, args.backlog)
+    server = _WorkerServer(listen_socket, access_log=args.access_log)
+    server.set_app(app)
+    print(
+        'Serving on http://{0}:{1} with {2} workers'.format(
+            args.host,
+            listen_socket.getsockname()[1],
+            args.workers,
+        ),
+        file=sys.stderr,
+    )
+    try:
+        _serve_prefork(server, args.workers)
+    finally:
+        server.server_close()
+
+    return 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    exit(main())
@@ -3,7 +3,24 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 
 import collections
+import errno
+import os
 import re
+import tempfile
+
+
+_NORMALIZED_ARGUMENT_REGEX = re.compile(r'{(\w+)(?:#\w+)?}')
+_ARGUMENT_REGEX = re.compile(r'{(.+?)}')
+_FILENAME_REGEX = re.compile(
+    r'^(?P<response_name>.+?)(_query(?P<query_args>(?:{[^{}#]+#[^{}#]+})+))?_response\.(?:(?P<http_code>\d+)\.)?(?P<http_verb>[A-Z]+)$',  # noqa
+)
+
+# The parsing results are memoized, there are as many entries as mock files and routes.
+# Filling them concurrently is harmless, the same values are computed.
+_interned_operations = {}
+_operations_by_filename = {}
+_normed_operations = {}
+_arg_patterns_by_operation = {}
 
 
 def extract_normalized_response_name(response_name):
@@ -14,7 +31,7 @@ def extract_normalized_response_name(response_name):
         :param response_name: a json mock response filename
         :return: cleaned-up response name
     """
-    return re.sub(r'{(\w+)(?:#\w+)?}', r'{\1}', response_name)
+    return _NORMALIZED_ARGUMENT_REGEX.sub(r'{\1}', response_name)
 
 
 def extract_arg_pattern_from_response_name(response_name):
@@ -25,11 +42,10 @@ def extract_arg_pattern_from_response_name(response_name):
         :return: argument pattern, a dictionary containing the arguments
             defined by the file name and their value (or None)
     """
-    arguments = re.findall(r'{(.+?)}', response_name)
     args_pattern = {}
 
-    for argument in arguments:
-        splits = re.split(r'#', argument)
+    for argument in _ARGUMENT_REGEX.findall(response_name):
+        splits = argument.split('#')
         if len(splits) == 1:
             param = splits[0]
             value = None
@@ -53,11 +69,10 @@ def extract_arg_pattern_from_query_args(query_args):
         :return: argument pattern, a dictionary containing the arguments
             defined by the file name and their valu
     """
-    arguments = re.findall(r'{(.+?)}', query_args)
     args_pattern = {}
 
-    for argument in arguments:
-        splits = re.split(r'#', argument)
+    for argument in _ARGUMENT_REGEX.findall(query_args):
+        splits = argument.split('#')
         if len(splits) == 2:
             param = splits[0]
             value = splits[1]
@@ -83,6 +98,47 @@ class Operation(collections.namedtuple(
         )
 
 
+def intern_operation(operation):
+    """ Return the canonical instance of an operation: equal operations share
+    a single instance, which makes comparing them and hashing them cheap.
+
+    :param operation: Operation
+    :return: Operation equal to operation
+    """
+    return _interned_operations.setdefault(operation, operation)
+
+
+class ArgPatterns(collections.namedtuple('ArgPatterns', ['path', 'query', 'combined'])):
+    """ Argument patterns of an operation: the ones defined by its response
+    name, by its query arguments and both of them together. The dictionaries
+    are shared and must not be modified.
+    """
+
+
+def get_arg_patterns(operation):
+    """ Extract, once per operation, the argument patterns of an operation
+
+    :param operation: Operation
+    :raises: ValueError if the arguments are not correctly defined
+    :return: ArgPatterns
+    """
+    try:
+        return _arg_patterns_by_operation[operation]
+    except KeyError:
+        pass
+
+    path = extract_arg_pattern_from_response_name(operation.response_name)
+    query = {}
+    if operation.query_args:
+        query = extract_arg_pattern_from_query_args(operation.query_args)
+    combined = dict(path)
+    combined.update(query)
+
+    arg_patterns = ArgPatterns(path, query, combined)
+    _arg_patterns_by_operation[intern_operation(operation)] = arg_patterns
+    return arg_patterns
+
+
 def make_operation_from_path(path, http_verb):
     """ Make an operation from a url path and the associated http_verb
 
@@ -95,7 +151,7 @@ def make_operation_from_path(path, http_verb):
     :return: (response_name, http_verb) tuple
     """
     name = path.strip('/').replace('/', '_')
-    return Operation(name, http_verb.upper())
+    return intern_operation(Operation(name, http_verb.upper()))
 
 
 def _filename_regex_match(filename):
@@ -105,15 +161,13 @@ def _filename_regex_match(filename):
     :param filename: the name of the response file, without extension
     :return: re.MatchObject or None if the filename is not valid
     """
-    return re.match(
-        r'^(?P<response_name>.+?)(_query(?P<query_args>(?:{[^{}#]+#[^{}#]+})+))?_response\.(?:(?P<http_code>\d+)\.)?(?P<http_verb>[A-Z]+)$',  # noqa
-        filename,
-    )
+    return _FILENAME_REGEX.match(filename)
 
 
 def extract_operation_and_response_code_from_filename(filename):
     """ Extract from the filename, the operation (name + http verb) and eventual
     response http code defaulting to 200 if absent.
+    The result is memoized per filename.
 
     Sample result:
     'foo_{foo_id#404}_v1_response.404.GET'
@@ -122,6 +176,11 @@ def extract_operation_and_response_code_from_filename(filename):
     :param filename: the name of the response file, without extension
     :return: (response_name, http_verb) tuple and http_code int, or (None, None) if unvalid
     """
+    try:
+        return _operations_by_filename[filename]
+    except KeyError:
+        pass
+
     match = _filename_regex_match(filename)
     if match:
         response_name = match.group('response_name')
@@ -130,9 +189,13 @@ def extract_operation_and_response_code_from_filename(filename):
         http_code = int(http_code)
         query_args = match.group('query_args')
 
-        return Operation(response_name, http_verb, query_args=query_args), http_code
+        operation = Operation(response_name, http_verb, query_args=query_args)
+        result = intern_operation(operation), http_code
     else:
-        return None, None
+        result = None, None
+
+    _operations_by_filename[filename] = result
+    return result
 
 
 def check_file_is_valid(filename):
@@ -141,15 +204,54 @@ def check_file_is_valid(filename):
     :param filename: the name of the response file, without extension
     :return: True if filename is a valid mock file
     """
-    return _filename_regex_match(filename) is not None
+    return extract_operation_and_response_code_from_filename(filename)[0] is not None
 
 
 def norm_operation(operation):
     """ Return a normalized version of an operation, where the name is
-    normalized, http_verb is standardized and query arguments are removed
+    normalized, http_verb is standardized and query arguments are removed.
+    The result is memoized per operation.
 
     :param operation: Operation
     :return: normalized operation
     """
+    try:
+        return _normed_operations[operation]
+    except KeyError:
+        pass
+
     normed_name = extract_normalized_response_name(operation.response_name)
-    return Operation(normed_name, operation.http_verb.upper(), query_args=None)
+    normed = intern_operation(Operation(normed_name, operation.http_verb.upper(), query_args=None))
+    _normed_operations[intern_operation(operation)] = normed
+    return normed
+
+
+def ensure_directory(path):
+    """ Create a directory and its parents if they do not exist yet, several
+    processes can safely try to create it at the same time.
+
+    :param path: path of the directory
+    """
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def atomic_write(path, write_fn):
+    """ Write a file then rename it to path, so that the processes reading path
+    never see a partially written file and the ones which opened or mapped the
+    previous file keep its content.
+
+    :param path: path of the file, it is replaced if it exists
+    :param write_fn: function(f) writing the content to the binary file object f
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write_fn(f)
+        getattr(os, 'replace', os.rename)(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
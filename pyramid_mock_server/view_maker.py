@@ -2,37 +2,96 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import inspect
+import time
+
 import venusian
 from pyramid.response import Response
 from six import string_types
 
+from pyramid_mock_server.fault_profile import load_fault_profiles
+from pyramid_mock_server.jinja_utils import TemplateDependencyGraph
 from pyramid_mock_server.mock_loader import load_responses
+from pyramid_mock_server.mock_loader import LoadStats
+from pyramid_mock_server.mock_reloader import MockReloader
 from pyramid_mock_server.response_collection import ResponseCollection
+from pyramid_mock_server.router import use_radix_routes_mapper
 from pyramid_mock_server.util import make_operation_from_path
 
 
-def make_response(mock_response):
-    """Default endpoint response w/ its corresponding sample json data."""
+def make_response(mock_response, request=None):
+    """Default endpoint response w/ its corresponding sample json data.
+
+    :param mock_response: MockResponse to send
+    :param request: the pyramid request, used to pick the gzip compressed body
+        if the client accepts it, and to answer conditional requests.
+    """
+    environ = request.environ if request is not None else {}
+    data, headerlist = mock_response.body.select(environ.get('HTTP_ACCEPT_ENCODING'))
+    # Let webob answer 304 to the conditional requests matching the ETag
+    # of successful responses.
+    conditional_response = (
+        'HTTP_IF_NONE_MATCH' in environ and
+        200 <= mock_response.http_response_code < 300
+    )
     return Response(
-        mock_response.json_str,
         status=mock_response.http_response_code,
-        content_type=str('application/json'),
-        charset='UTF-8',
+        headerlist=list(headerlist),
+        app_iter=[data] if isinstance(data, bytes) else data.app_iter(environ),
+        conditional_response=conditional_response,
     )
 
 
 def make_servlet_view_fn(
     endpoint_operation,
     response_collection,
+    reloadable=False,
+    fault_profiles=None,
 ):
     """Create the given endpoint's servlet view function.
 
     :param endpoint_operation: Operation that will spawn the endpoint
     :param response_collection: ResponseCollection instance.
+    :param reloadable: if True, the view follows the changes made to response_collection
+        after its creation.
+    :param fault_profiles: FaultProfiles delaying the responses and injecting faults, or None.
     :return: a pyramid view function.
     """
-    variations = response_collection.get_variations(endpoint_operation)
-    if not variations:
+    if not reloadable:
+        return _make_specialized_view_fn(
+            endpoint_operation,
+            response_collection.get_variations(endpoint_operation),
+            fault_profiles,
+        )
+
+    # (response_collection version, view specialized for it)
+    specialized_view = [(None, None)]
+
+    def reloadable_view(request):
+        version, view = specialized_view[0]
+        if version != response_collection.version:
+            version = response_collection.version
+            view = _make_specialized_view_fn(
+                endpoint_operation,
+                response_collection.get_variations(endpoint_operation),
+                fault_profiles,
+            )
+            specialized_view[0] = (version, view)
+        return view(request)
+
+    return reloadable_view
+
+
+def _make_specialized_view_fn(endpoint_operation, variations, fault_profiles=None):
+    """Create a view function dedicated to the current variations of an endpoint.
+
+    :param endpoint_operation: Operation that will spawn the endpoint
+    :param variations: _ResponseVariations of the endpoint, or None
+    :param fault_profiles: FaultProfiles delaying the responses and injecting faults, or None.
+    :return: a pyramid view function.
+    """
+    match_mock_response = make_mock_response_matcher(variations)
+    if match_mock_response is None:
         def no_response_found(request):
             raise LookupError(
                 u"No json response found for {0} {1}".format(
@@ -42,23 +101,58 @@ def make_servlet_view_fn(
             )
         return no_response_found
 
-    def custom_view(request):
-        arg_list = variations.get_arg_list()
-        arg_dict = dict(
-            (arg, request.matchdict[arg])
-            for arg in arg_list
-            if arg in request.matchdict
+    if fault_profiles is None:
+        def view(request):
+            return make_response(
+                match_mock_response(request.matchdict, lambda: request.GET),
+                request,
+            )
+        return view
+
+    def fault_profile_view(request):
+        delay, mock_response = fault_profiles.apply(
+            match_mock_response(request.matchdict, lambda: request.GET),
         )
-        arg_dict.update(dict(
-            (arg, request.GET[arg]) for arg in arg_list
-            for arg in arg_list
-            if arg in request.GET
-        ))
+        # The WSGI worker is held during the delay, the ASGIMockApp does not need one
+        if delay:
+            time.sleep(delay)
+        return make_response(mock_response, request)
+    return fault_profile_view
 
-        matched_mock_response = variations.match_arg_dict(arg_dict)
-        return make_response(matched_mock_response)
 
-    return custom_view
+def make_mock_response_matcher(variations):
+    """Create a function picking the mock response of a request among the current
+    variations of an endpoint.
+
+    :param variations: _ResponseVariations of the endpoint, or None
+    :return: None if there is no variation, a function(matchdict, get_query) returning
+        the MockResponse matching the request otherwise. matchdict holds the path arguments,
+        get_query returns the mapping of the query arguments, it is only called if the
+        variations have arguments. The query arguments take precedence over the path ones.
+    """
+    if not variations:
+        return None
+
+    single_mock_response = variations.get_single_mock_response()
+    if single_mock_response is not None:
+        # Nothing to match, the arguments do not need to be extracted
+        def single_response_matcher(matchdict, get_query):
+            return single_mock_response
+        return single_response_matcher
+
+    arg_list = tuple(variations.get_arg_list())
+    match_arg_dict = variations.match_arg_dict
+
+    def args_matcher(matchdict, get_query):
+        arg_dict = {arg: matchdict[arg] for arg in arg_list if arg in matchdict}
+        query = get_query()
+        for arg in arg_list:
+            if arg in query:
+                arg_dict[arg] = query[arg]
+
+        return match_arg_dict(arg_dict)
+
+    return args_matcher
 
 
 def setup_routes_views(
@@ -67,6 +161,21 @@ def setup_routes_views(
     resources,
     custom_view_packages=None,
     excluded_paths=None,
+    match_cache_size=None,
+    gzip_min_size=None,
+    cache_control=None,
+    lazy_rendering=False,
+    load_workers=None,
+    render_cache_directory=None,
+    bytecode_cache_directory=None,
+    reload_interval=None,
+    json_codec=None,
+    json_format=None,
+    detect_static_files=False,
+    ignore_patterns=None,
+    radix_routing=False,
+    fault_profiles_path=None,
+    response_arena=None,
 ):
     """ Creates the default views when needed, get the custom views, register
     them all in a pyramid config.
@@ -77,18 +186,96 @@ def setup_routes_views(
     :param custom_view_packages: array of packages object that we should load custom view from.
     :param excluded_paths: array of path for which this function should not try to
         register views. Note ['foo'] would also exclude 'foo/whatever'.
+    :param match_cache_size: number of match results memoized per endpoint,
+        None or 0 disables the memoization.
+    :param gzip_min_size: if not None, responses of at least this size in bytes are
+        served gzip compressed to the clients accepting it.
+    :param cache_control: value of the Cache-Control header sent with the responses, or None.
+    :param lazy_rendering: if True, the mock templates are only rendered the first time
+        they are requested.
+    :param load_workers: number of processes rendering the mock templates at startup.
+        It is ignored, with a warning, if lazy_rendering is True.
+    :param render_cache_directory: directory where the rendered mock templates are cached
+        across restarts, or None.
+    :param bytecode_cache_directory: directory where the compiled mock templates are cached
+        across restarts, or None.
+    :param reload_interval: if set, the mock files are watched and the changes are served
+        without restarting, it is the number of seconds between two checks. The MockReloader
+        is available as the pyramid_mock_server_reloader attribute of the registry.
+    :param json_codec: name of the JSON codec parsing and serializing the mock responses,
+        'json' (the default), 'orjson', 'ujson' or 'auto'.
+    :param json_format: if set, the mock responses are validated when they are rendered and
+        served 'compact', without whitespace, or 'pretty', indented. They are served as
+        rendered otherwise.
+    :param detect_static_files: if True, the mock files without any jinja syntax are copied
+        once in shared memory and served as is, like the .raw.json files.
+    :param ignore_patterns: glob patterns of the files and directories of responses_path
+        that are skipped, e.g. ['.git', 'fixtures/*']. The LoadStats of the mock responses
+        are available as the pyramid_mock_server_load_stats attribute of the registry.
+        The ResponseCollection is its pyramid_mock_server_response_collection attribute.
+    :param radix_routing: if True, the routes of the application are looked up in a radix
+        tree of their path segments instead of being tried one after the other.
+    :param fault_profiles_path: path of a JSON file declaring the simulated latency and faults
+        of the mock responses, see fault_profile. The FaultProfiles are available as the
+        pyramid_mock_server_fault_profiles attribute of the registry.
+    :param response_arena: if set, the rendered mock responses are stored in a single memory
+        mapping which the processes forked after the load share, it is the path of its file
+        or ':memory:' for anonymous shared memory. The reloaded mock responses are not.
     """
 
     routes_added = set()
     routes_operation_added = set()
     view_registry = {}
+    # {route name: {http verb: operation}} of the routes served by the mock views
+    mock_operations_by_route = {}
+    # {route name: {http verb: view}} of the routes served by the custom views
+    custom_views_by_route = {}
     if not excluded_paths:
         excluded_paths = []
     if not custom_view_packages:
         custom_view_packages = []
+    if radix_routing:
+        use_radix_routes_mapper(config)
 
-    responses = load_responses(responses_path)
-    response_collections = ResponseCollection(responses)
+    loader_kwargs = dict(
+        gzip_min_size=gzip_min_size,
+        cache_control=cache_control,
+        lazy=lazy_rendering,
+        render_cache_directory=render_cache_directory,
+        bytecode_cache_directory=bytecode_cache_directory,
+        json_codec=json_codec,
+        json_format=json_format,
+        detect_static_files=detect_static_files,
+    )
+    # The reloader needs to know which files use the modified templates
+    dependency_graph = TemplateDependencyGraph() if reload_interval else None
+    load_stats = LoadStats()
+    responses = load_responses(
+        responses_path,
+        workers=load_workers,
+        dependency_graph=dependency_graph,
+        ignore_patterns=ignore_patterns,
+        load_stats=load_stats,
+        response_arena=response_arena,
+        **loader_kwargs
+    )
+    config.registry.pyramid_mock_server_load_stats = load_stats
+    fault_profiles = None
+    if fault_profiles_path:
+        fault_profiles = load_fault_profiles(fault_profiles_path, json_codec=json_codec)
+    config.registry.pyramid_mock_server_fault_profiles = fault_profiles
+    response_collections = ResponseCollection(responses, match_cache_size=match_cache_size)
+
+    if reload_interval:
+        reloader = MockReloader(
+            responses_path,
+            response_collections,
+            dependency_graph=dependency_graph,
+            ignore_patterns=ignore_patterns,
+            **loader_kwargs
+        )
+        reloader.start(reload_interval)
+        config.registry.pyramid_mock_server_reloader = reloader
 
     for package_or_path in custom_view_packages:
         if isinstance(package_or_path, string_types):
@@ -117,18 +304,54 @@ def setup_routes_views(
                 view_registry[endpoint_operation] = make_servlet_view_fn(
                     endpoint_operation,
                     response_collections,
+                    reloadable=bool(reload_interval),
+                    fault_profiles=fault_profiles,
                 )
+                mock_operations_by_route.setdefault(
+                    endpoint_operation.response_name, {},
+                )[endpoint_operation.http_verb] = endpoint_operation
+            else:
+                custom_views_by_route.setdefault(
+                    endpoint_operation.response_name, {},
+                )[endpoint_operation.http_verb] = view_registry[endpoint_operation]
             config.add_view(
-                view_registry[endpoint_operation],
+                _make_pyramid_view(view_registry[endpoint_operation]),
                 route_name=endpoint_operation.response_name,
                 request_method=endpoint_operation.http_verb,
             )
             routes_operation_added.add(endpoint_operation)
 
+    config.registry.pyramid_mock_server_response_collection = response_collections
+    config.registry.pyramid_mock_server_mock_operations = mock_operations_by_route
+    config.registry.pyramid_mock_server_custom_views = custom_views_by_route
+
+
+def is_coroutine_view(view):
+    """
+    :return: True if view is a coroutine function, they are only available on python 3.5+
+    """
+    iscoroutinefunction = getattr(inspect, 'iscoroutinefunction', None)
+    return iscoroutinefunction is not None and iscoroutinefunction(view)
+
+
+def _make_pyramid_view(view):
+    """ Make a view pyramid can call from a custom view
+
+    :param view: view function, or coroutine function
+    :return: view function
+    """
+    if is_coroutine_view(view):  # pragma: python3 only
+        # The coroutine syntax cannot be imported on python 2
+        from pyramid_mock_server.asgi_app import make_blocking_view
+        return make_blocking_view(view)
+    return view
+
 
 def register_custom_view(path, http_verb):
     """ Associate the decorated function with the given path.
     This allows for custom views not automatically generated to be used.
+    The function can be a coroutine function, it is then awaited by the ASGIMockApp
+    and run in its own event loop by pyramid.
 
         :param path: path as defined in swagger spec
         :param http_verb: http verb ('PUT', 'GET', ...)  for this view
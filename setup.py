@@ -34,15 +34,18 @@ setup(
     install_requires=[
         'jinja2 >= 2.7',
         'pyramid >= 1.4',
+        'scandir; python_version < "3.5"',
         'six',
         'venusian >= 1.0',
     ],
     extras_require={
         'pyramid-swagger': ['pyramid-swagger >= 2.3.0'],
         'cli': ['bravado_core', 'pyramid-swagger >= 2.3.0', 'webtest'],
+        'fast-json': ['orjson; python_version >= "3.6"', 'ujson; python_version < "3.6"'],
     },
     entry_points={
         'console_scripts': [
+            'pyramid-mock-server=pyramid_mock_server.serve:main',
             'pyramid-mock-server-spec-enhancer=pyramid_mock_server.enhance_swagger_spec:main',
         ],
     },
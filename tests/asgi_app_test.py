@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import asyncio
+import json
+import time
+
+import mock
+import pytest
+from pyramid.httpexceptions import HTTPForbidden
+from pyramid.httpexceptions import HTTPNotFound
+from pyramid.request import Request
+from pyramid.response import Response
+from webtest import TestApp
+
+from .conftest import _create_application
+from pyramid_mock_server.asgi_app import _make_environ
+from pyramid_mock_server.asgi_app import _send_response
+from pyramid_mock_server.asgi_app import ASGIMockApp
+from pyramid_mock_server.view_maker import register_custom_view
+
+
+@register_custom_view('/foo/{foo_id}/v1', 'POST')
+async def async_custom_view(request):
+    await asyncio.sleep(float(request.GET.get('sleep', 0)))
+    if 'forbidden' in request.GET:
+        raise HTTPForbidden()
+    return Response(
+        json.dumps({'message': request.matchdict['foo_id'], 'length': len(request.body)}),
+        content_type=str('application/json'),
+        charset='UTF-8',
+    )
+
+
+@register_custom_view('/mock/via/custom/view', 'GET')
+def not_found_custom_view(request):
+    raise HTTPNotFound()
+
+
+@pytest.fixture(
+    scope='module',
+    params=[
+        {},
+        {'pyramid_mock_server.detect_static_files': 'true'},
+        {'pyramid_mock_server.response_arena': ':memory:'},
+    ],
+    ids=['', 'static_files', 'response_arena'],
+)
+def pyramid_app(request):
+    return _create_application(
+        schema_directory='tests/view_maker_test_files',
+        responses_directory='tests/view_maker_test_files/responses',
+        packages=['tests.view_maker_test', __name__],
+        excluded_path=['/exclude_me/am_i_excluded'],
+        settings=dict({
+            # The validation is done by a tween, the ASGIMockApp skips it
+            'pyramid_swagger.enable_request_validation': False,
+            'pyramid_swagger.enable_response_validation': False,
+            'pyramid_mock_server.gzip_min_size': '0',
+        }, **request.param),
+    )
+
+
+@pytest.fixture
+def asgi_app(pyramid_app):
+    return ASGIMockApp(pyramid_app, max_workers=2)
+
+
+async def _request(asgi_app, method, path, query_string=b'', headers=(), body_chunks=(b'',)):
+    messages = [
+        {'type': 'http.request', 'body': chunk, 'more_body': index < len(body_chunks) - 1}
+        for index, chunk in enumerate(body_chunks)
+    ]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi_app(
+        {
+            'type': 'http',
+            'method': method,
+            'path': path,
+            'query_string': query_string,
+            'headers': [
+                (name.encode('latin-1'), value.encode('latin-1')) for name, value in headers
+            ],
+            'client': ('127.0.0.1', 12345),
+        },
+        receive,
+        send,
+    )
+
+    assert sent[0]['type'] == 'http.response.start'
+    assert all(message['type'] == 'http.response.body' for message in sent[1:])
+    assert not sent[-1].get('more_body', False)
+    return sent[0]['status'], sent[0]['headers'], b''.join(message['body'] for message in sent[1:])
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+@pytest.mark.parametrize(
+    'path, query_string, request_method, headers',
+    [
+        ('/foo', '', 'GET', {}),
+        ('/foo', '', 'GET', {'Accept-Encoding': 'gzip'}),
+        ('/foo', 'offset=0&limit=1', 'GET', {}),
+        ('/foo/404/v1', '', 'GET', {}),
+        ('/exclude_me', '', 'GET', {}),
+        # Custom views
+        ('/foo/bar', '', 'POST', {}),
+        ('/foo/42/v1', '', 'POST', {}),
+        # Custom views raising HTTP exceptions
+        ('/foo/42/v1', 'forbidden=1', 'POST', {}),
+        ('/mock/via/custom/view', '', 'GET', {'Accept': 'application/json'}),
+        # Passed to pyramid
+        ('/exclude_me/am_i_excluded', '', 'GET', {}),
+        ('/unknown', '', 'GET', {}),
+        ('/foo', '', 'DELETE', {}),
+    ],
+)
+def test_asgi_mock_app_serves_like_pyramid(
+    pyramid_app,
+    asgi_app,
+    path,
+    query_string,
+    request_method,
+    headers,
+):
+    expected = Request.blank(
+        path + ('?' + query_string if query_string else ''),
+        method=request_method,
+        headers=headers,
+    ).get_response(pyramid_app)
+    status, headerlist, body = _run(_request(
+        asgi_app,
+        request_method,
+        path,
+        query_string=query_string.encode('latin-1'),
+        headers=headers.items(),
+    ))
+
+    assert status == expected.status_int
+    assert sorted(headerlist) == sorted(
+        (name.lower().encode('latin-1'), value.encode('latin-1'))
+        for name, value in expected.headerlist
+    )
+    assert body == expected.body
+
+
+def test_asgi_mock_app_conditional_requests(asgi_app):
+    headerlist = dict(_run(_request(asgi_app, 'GET', '/foo'))[1])
+    status, _, body = _run(_request(
+        asgi_app,
+        'GET',
+        '/foo',
+        headers=[('If-None-Match', headerlist[b'etag'].decode('latin-1'))],
+    ))
+    assert status == 304
+    assert body == b''
+
+
+def test_asgi_mock_app_reads_the_request_body(asgi_app):
+    status, _, body = _run(_request(
+        asgi_app,
+        'POST',
+        '/foo/42/v1',
+        body_chunks=(b'{"a": ', b'1}'),
+    ))
+    assert status == 200
+    assert json.loads(body.decode('utf-8')) == {'message': '42', 'length': 8}
+
+
+def test_asgi_mock_app_awaits_the_coroutine_views_concurrently(asgi_app):
+    async def slow_requests():
+        return await asyncio.gather(*[
+            _request(asgi_app, 'POST', '/foo/{0}/v1'.format(index), query_string=b'sleep=0.2')
+            for index in range(50)
+        ])
+
+    start = time.time()
+    responses = _run(slow_requests())
+    # Far less than the 50 * 0.2 seconds, with only 2 threads
+    assert time.time() - start < 5
+    assert [json.loads(body.decode('utf-8'))['message'] for _, _, body in responses] == [
+        str(index) for index in range(50)
+    ]
+
+
+def test_coroutine_custom_views_in_pyramid(pyramid_app):
+    assert TestApp(pyramid_app).post('/foo/42/v1', 'body').json == {'message': '42', 'length': 4}
+
+
+def test_asgi_mock_app_lifespan(asgi_app):
+    messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    _run(asgi_app({'type': 'lifespan'}, receive, send))
+    assert sent == [{'type': 'lifespan.startup.complete'}, {'type': 'lifespan.shutdown.complete'}]
+
+
+def test_asgi_mock_app_unsupported_connection(asgi_app):
+    with pytest.raises(ValueError):
+        _run(asgi_app({'type': 'websocket'}, None, None))
+
+
+def test_send_response_in_chunks():
+    app_iter = mock.MagicMock()
+    app_iter.__iter__.return_value = iter([b'{"a": ', b'', b'1}'])
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    _run(_send_response(send, 200, [('Content-Type', 'application/json')], app_iter))
+    assert sent == [
+        {
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', b'application/json')],
+        },
+        {'type': 'http.response.body', 'body': b'{"a": ', 'more_body': True},
+        {'type': 'http.response.body', 'body': b'1}'},
+    ]
+    app_iter.close.assert_called_once_with()
+
+
+def test_make_environ():
+    environ = _make_environ({
+        'type': 'http',
+        'method': 'GET',
+        'path': '/é',
+        'root_path': '/mock',
+        'query_string': b'a=1',
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'x-forwarded-for', b'1.1.1.1'),
+            (b'x-forwarded-for', b'2.2.2.2'),
+        ],
+        'server': ('mock-server', 8080),
+        'scheme': 'https',
+        'http_version': '2',
+    })
+
+    assert environ['PATH_INFO'] == '/é'.encode('utf-8').decode('latin-1')
+    assert environ['SCRIPT_NAME'] == '/mock'
+    assert environ['QUERY_STRING'] == 'a=1'
+    assert environ['CONTENT_TYPE'] == 'application/json'
+    assert environ['HTTP_X_FORWARDED_FOR'] == '1.1.1.1,2.2.2.2'
+    assert environ['SERVER_NAME'] == 'mock-server'
+    assert environ['SERVER_PORT'] == '8080'
+    assert environ['SERVER_PROTOCOL'] == 'HTTP/2'
+    assert environ['wsgi.url_scheme'] == 'https'
+    assert 'REMOTE_ADDR' not in environ
+
+
+def test_asgi_mock_app_fault_profiles(tmpdir):
+    fault_profiles_path = tmpdir.join('fault_profiles.json')
+    fault_profiles_path.write(json.dumps({
+        'foo_response.GET': {'latency': {'fixed': 0.2}, 'faults': [{'status': 503, 'rate': 1}]},
+    }))
+    asgi_app = ASGIMockApp(_create_application(
+        schema_directory='tests/view_maker_test_files',
+        responses_directory='tests/view_maker_test_files/responses',
+        packages=None,
+        excluded_path=None,
+        settings={'pyramid_mock_server.fault_profiles_path': str(fault_profiles_path)},
+    ), max_workers=1)
+
+    async def slow_requests():
+        return await asyncio.gather(*[_request(asgi_app, 'GET', '/foo') for _ in range(50)])
+
+    start = time.time()
+    responses = _run(slow_requests())
+    # The delays run concurrently
+    assert 0.2 <= time.time() - start < 5
+    assert {(status, body) for status, _, body in responses} == {
+        (503, b'{"message":"Injected fault"}'),
+    }
+
+    status, _, body = _run(_request(asgi_app, 'GET', '/foo/something/v1'))
+    assert (status, json.loads(body.decode('utf-8'))) == (200, {'message': 'default/get'})
@@ -6,11 +6,16 @@ import traceback
 
 import mock
 import pytest
+import six
 from pyramid.config import Configurator
 from pyramid.security import NO_PERMISSION_REQUIRED
 from webtest import TestApp
 
 
+# The ASGI application uses the coroutine syntax
+collect_ignore = ['asgi_app_test.py'] if six.PY2 else []
+
+
 # Let's turn off request validation for testing, so we can automagically
 # generate tests for every added simple route
 @pytest.yield_fixture(scope='session', autouse=True)
@@ -40,9 +45,10 @@ def _create_application(
     schema_directory,
     responses_directory,
     packages,
-    excluded_path
+    excluded_path,
+    settings=None,
 ):
-    config = Configurator(settings={
+    config = Configurator(settings=dict({
         # pyramid_swagger config
         'pyramid_swagger.schema_directory': schema_directory,
         'pyramid_swagger.swagger_versions': ['2.0'],
@@ -54,7 +60,7 @@ def _create_application(
         'pyramid_mock_server.mock_responses_path': responses_directory,
         'pyramid_mock_server.excluded_paths': excluded_path,
         'pyramid_mock_server.get_resources_from_pyramid_swagger_2_0_schema': True,
-    })
+    }, **(settings or {})))
 
     config.include('pyramid_mock_server')
 
@@ -73,10 +79,12 @@ def create_test_app(
     responses_directory,
     packages=None,
     excluded_path=None,
+    settings=None,
 ):
     return TestApp(_create_application(
         schema_directory=schema_directory,
         responses_directory=responses_directory,
         packages=packages,
         excluded_path=excluded_path,
+        settings=settings,
     ))
@@ -2,7 +2,10 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import io
 import json
+import shutil
+import sys
 
 import mock
 import pytest
@@ -42,13 +45,16 @@ def test_enhance_specs_with_custom_views(capsys, expected_enhances_specs):
     assert expected_enhances_specs == json.loads(stdout)
 
 
-def test_enhance_specs_save_on_file(tmpdir, expected_enhances_specs):
+@pytest.mark.parametrize('json_codec', ['json', 'auto'])
+def test_enhance_specs_save_on_file(tmpdir, expected_enhances_specs, json_codec):
     output_path = '{}/enhanced_swagger.json'.format(tmpdir.strpath)
     assert main([
         '-c',
         'tests/view_maker_test_files/custom_views',
         '-o',
         output_path,
+        '--json-codec',
+        json_codec,
         '--',
         'tests/view_maker_test_files/swagger.json',
         'tests/view_maker_test_files/responses',
@@ -77,3 +83,27 @@ def test_enhance_specs_validation(mock_Spec, capsys, ignore_validation, expected
         mock_Spec.from_dict.assert_called_once_with(json.loads(stdout))
 
     assert expected_enhances_specs == json.loads(stdout)
+
+
+@pytest.fixture
+def non_ascii_responses_directory(tmpdir):
+    directory = str(tmpdir.join('responses'))
+    shutil.copytree('tests/view_maker_test_files/responses', directory)
+    with io.open('{0}/foo_response.GET.json'.format(directory), 'w', encoding='utf-8') as f:
+        f.write('{"message": "Café"}')
+    return directory
+
+
+def test_enhance_specs_non_ascii_on_stdout(non_ascii_responses_directory):
+    # Like a pipe without a UTF-8 locale
+    stdout = io.TextIOWrapper(io.BytesIO(), encoding='ascii')
+    with mock.patch.object(sys, 'stdout', stdout):
+        assert main([
+            'tests/view_maker_test_files/swagger.json',
+            non_ascii_responses_directory,
+        ]) == 0
+
+    enhanced_specs = json.loads(stdout.buffer.getvalue().decode('utf-8'))
+    assert enhanced_specs['paths']['/foo']['get']['responses']['200']['examples'] == {
+        'application/json': {'message': 'Café'},
+    }
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import json
+
+import mock
+import pytest
+import six
+from pyramid.config import Configurator
+from webtest import TestApp
+
+from .conftest import _create_application
+from pyramid_mock_server.fast_app import _make_status
+from pyramid_mock_server.fast_app import FastMockApp
+from pyramid_mock_server.mock_loader import MockResponse
+from pyramid_mock_server.util import Operation
+
+
+@pytest.fixture(
+    scope='module',
+    params=[
+        {},
+        {'pyramid_mock_server.detect_static_files': 'true'},
+        {'pyramid_mock_server.response_arena': ':memory:'},
+    ],
+    ids=['', 'static_files', 'response_arena'],
+)
+def pyramid_app(request):
+    return _create_application(
+        schema_directory='tests/view_maker_test_files',
+        responses_directory='tests/view_maker_test_files/responses',
+        packages=['tests.view_maker_test'],
+        excluded_path=['/exclude_me/am_i_excluded'],
+        settings=dict({
+            # The validation is done by a tween, the FastMockApp skips it
+            'pyramid_swagger.enable_request_validation': False,
+            'pyramid_swagger.enable_response_validation': False,
+            'pyramid_mock_server.gzip_min_size': '0',
+        }, **request.param),
+    )
+
+
+@pytest.fixture
+def fast_app(pyramid_app):
+    fast_app = FastMockApp(pyramid_app)
+    fast_app._pyramid_app = mock.Mock(wraps=pyramid_app)
+    return fast_app
+
+
+@pytest.mark.parametrize(
+    'path, request_method, headers, served_by_pyramid',
+    [
+        ('/foo', 'GET', {}, False),
+        ('/foo', 'GET', {str('Accept-Encoding'): str('gzip')}, False),
+        ('/foo?offset=0&limit=1', 'GET', {}, False),
+        ('/foo?offset=1&offset=0&limit=1', 'GET', {}, False),
+        ('/foo?offset=1&limit=1', 'GET', {}, False),
+        ('/foo/something/v1', 'GET', {}, False),
+        ('/foo/404/v1', 'GET', {}, False),
+        ('/foo/something/v1?foo_id=404', 'GET', {}, False),
+        ('/foo/42/v1', 'POST', {}, False),
+        ('/exclude_me', 'GET', {}, False),
+        # Custom view
+        ('/foo/bar', 'POST', {}, True),
+        # Excluded path
+        ('/exclude_me/am_i_excluded', 'GET', {}, True),
+        # Unknown route or method
+        ('/unknown', 'GET', {}, True),
+        ('/foo', 'DELETE', {}, True),
+    ],
+)
+def test_fast_mock_app_serves_like_pyramid(
+    pyramid_app,
+    fast_app,
+    path,
+    request_method,
+    headers,
+    served_by_pyramid,
+):
+    expected = TestApp(pyramid_app).request(
+        path,
+        method=request_method,
+        headers=headers,
+        status='*',
+    )
+    result = TestApp(fast_app).request(
+        path,
+        method=request_method,
+        headers=headers,
+        status='*',
+    )
+
+    assert fast_app._pyramid_app.called == served_by_pyramid
+    assert result.status == expected.status
+    assert result.headerlist == expected.headerlist
+    assert result.body == expected.body
+
+
+@pytest.mark.parametrize(
+    'path_info, query_string',
+    [
+        ('/foo\xff', ''),
+        ('/foo', 'offset=%FF&limit=1'),
+    ],
+)
+def test_fast_mock_app_invalid_utf8(fast_app, path_info, query_string):
+    # WSGI strings are native strings holding the raw bytes
+    if six.PY2:  # pragma: no cover
+        path_info, query_string = path_info.encode('latin-1'), query_string.encode('latin-1')
+    environ = {'PATH_INFO': path_info, 'QUERY_STRING': query_string, 'REQUEST_METHOD': 'GET'}
+    assert fast_app.match(environ) is None
+
+
+def test_fast_mock_app_conditional_requests(fast_app):
+    response = TestApp(fast_app).get('/foo')
+    TestApp(fast_app).get('/foo', headers={'If-None-Match': response.etag}, status=304)
+    assert not fast_app._pyramid_app.called
+
+
+def test_fast_mock_app_follows_the_response_collection(pyramid_app, fast_app):
+    response_collection = pyramid_app.registry.pyramid_mock_server_response_collection
+    operation = Operation('foo', 'GET')
+    variations = response_collection.get_variations(operation)
+    assert fast_app.match({'PATH_INFO': '/foo', 'REQUEST_METHOD': 'GET'}).http_response_code == 200
+
+    with mock.patch.object(response_collection, 'get_variations', return_value=None), \
+            mock.patch.object(response_collection, 'version', response_collection.version + 1):
+        assert fast_app.match({'PATH_INFO': '/foo', 'REQUEST_METHOD': 'GET'}) is None
+
+    with mock.patch.object(
+        response_collection,
+        'get_variations',
+        return_value=mock.Mock(**{
+            'get_single_mock_response.return_value': MockResponse(operation, '{}', 201),
+        }),
+    ), mock.patch.object(response_collection, 'version', response_collection.version + 2):
+        mock_response = fast_app.match({'PATH_INFO': '/foo', 'REQUEST_METHOD': 'GET'})
+        assert mock_response.http_response_code == 201
+
+    assert variations is response_collection.get_variations(operation)
+
+
+def test_fast_mock_app_earlier_routes_win():
+    config = Configurator(settings={
+        'pyramid_mock_server.mock_responses_path': 'tests/view_maker_test_files/responses',
+        'pyramid_mock_server.resources': [('/foo', 'GET'), ('/foo/{foo_id}/v1', 'GET')],
+    })
+    config.add_route('regex', '/foo/{foo_id:\\d+}/v1')
+    config.add_view(lambda request: 'regex', route_name='regex', renderer='string')
+    config.include('pyramid_mock_server')
+    config.add_route('later_regex', '/{name:\\w+}')
+    config.add_view(lambda request: 'later_regex', route_name='later_regex', renderer='string')
+    fast_app = FastMockApp(config.make_wsgi_app())
+
+    assert TestApp(fast_app).get('/foo/123/v1').text == 'regex'
+    assert TestApp(fast_app).get('/foo/abc/v1').json['message'] == 'default/get'
+    assert TestApp(fast_app).get('/foo').json['message'] == 'You got foo'
+    assert TestApp(fast_app).get('/bar').text == 'later_regex'
+
+
+def test_fast_mock_app_needs_pyramid_mock_server():
+    with pytest.raises(ValueError):
+        FastMockApp(Configurator().make_wsgi_app())
+
+
+@pytest.mark.parametrize(
+    'code, expected_status',
+    [(200, '200 OK'), (404, '404 Not Found'), (299, '299 Success')],
+)
+def test_make_status(code, expected_status):
+    assert _make_status(code) == expected_status
+
+
+def test_fast_mock_app_fault_profiles(tmpdir):
+    fault_profiles_path = tmpdir.join('fault_profiles.json')
+    fault_profiles_path.write(json.dumps({
+        'foo_response.GET': {'latency': {'fixed': 0.5}, 'faults': [{'status': 503, 'rate': 1}]},
+    }))
+    fast_app = FastMockApp(_create_application(
+        schema_directory='tests/view_maker_test_files',
+        responses_directory='tests/view_maker_test_files/responses',
+        packages=None,
+        excluded_path=None,
+        settings={'pyramid_mock_server.fault_profiles_path': str(fault_profiles_path)},
+    ))
+
+    with mock.patch('pyramid_mock_server.fast_app.time.sleep') as mock_sleep:
+        assert TestApp(fast_app).get('/foo', status=503).json == {'message': 'Injected fault'}
+        mock_sleep.assert_called_once_with(0.5)
+
+        mock_sleep.reset_mock()
+        assert TestApp(fast_app).get('/foo/something/v1').json == {'message': 'default/get'}
+        assert not mock_sleep.called
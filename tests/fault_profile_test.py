@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import json
+import random
+
+import mock
+import pytest
+
+from .conftest import create_test_app
+from pyramid_mock_server.fault_profile import FaultProfile
+from pyramid_mock_server.fault_profile import FaultProfiles
+from pyramid_mock_server.fault_profile import load_fault_profiles
+from pyramid_mock_server.mock_loader import MockResponse
+from pyramid_mock_server.util import Operation
+
+
+OPERATION = Operation('foo', 'GET')
+MOCK_RESPONSE = MockResponse(OPERATION, '{"message": "You got foo"}', 200)
+
+
+@pytest.fixture
+def random_generator():
+    return mock.Mock(
+        spec=random.Random,
+        **{'random.return_value': 0.5, 'uniform.side_effect': lambda low, high: (low + high) / 2.0}
+    )
+
+
+@pytest.fixture
+def fault_profiles_path(tmpdir):
+    path = tmpdir.join('fault_profiles.json')
+    path.write(json.dumps({
+        'foo_response.GET': {
+            'latency': {'fixed': 0.5},
+            'faults': [{'status': 503, 'rate': 1, 'body': {'message': 'unavailable'}}],
+        },
+        'foo_{foo_id#404}_v1_response.404.GET.json': {
+            'latency': {'uniform': [1, 2]},
+        },
+    }))
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    'latency, draw, expected_delay',
+    [
+        (None, 0.5, 0),
+        ({'fixed': 0.2}, 0.5, 0.2),
+        ({'uniform': [1, 2]}, 0.5, 1.5),
+        ({'percentiles': {'50': 0.1, '90': 0.5, '99': 1.5}}, 0.3, 0.1),
+        ({'percentiles': {'50': 0.1, '90': 0.5, '99': 1.5}}, 0.7, 0.3),
+        ({'percentiles': {'50': 0.1, '90': 0.5, '99': 1.5}}, 0.995, 1.5),
+    ],
+)
+def test_fault_profile_latency(random_generator, latency, draw, expected_delay):
+    random_generator.random.return_value = draw
+    delay, mock_response = FaultProfile(OPERATION, latency=latency).apply(
+        MOCK_RESPONSE,
+        random_generator,
+    )
+    assert delay == pytest.approx(expected_delay)
+    assert mock_response is MOCK_RESPONSE
+
+
+@pytest.mark.parametrize(
+    'draw, expected_status, expected_body',
+    [
+        (0.05, 500, {'message': 'Injected fault'}),
+        (0.2, 503, {'message': 'unavailable'}),
+        (0.5, 200, {'message': 'You got foo'}),
+    ],
+)
+def test_fault_profile_faults(random_generator, draw, expected_status, expected_body):
+    random_generator.random.return_value = draw
+    profile = FaultProfile(OPERATION, faults=[
+        {'status': 500, 'rate': 0.1},
+        {'status': 503, 'rate': 0.2, 'body': {'message': 'unavailable'}},
+    ])
+
+    delay, mock_response = profile.apply(MOCK_RESPONSE, random_generator)
+    assert delay == 0
+    assert mock_response.http_response_code == expected_status
+    assert json.loads(mock_response.json_str) == expected_body
+
+
+@pytest.mark.parametrize(
+    'profile',
+    [
+        {'latency': {'fixed': -1}},
+        {'latency': {'uniform': [2, 1]}},
+        {'latency': {'percentiles': {}}},
+        {'latency': {'percentiles': {'50': 1, '99': 0.5}}},
+        {'latency': {'percentiles': {'101': 1}}},
+        {'latency': {'gaussian': 1}},
+        {'latency': {'fixed': 1, 'uniform': [1, 2]}},
+        {'latency': {'fixed': '1'}},
+        {'latency': {'uniform': 1}},
+        {'latency': {'uniform': [1, 2, 3]}},
+        {'latency': {'uniform': ['1', 2]}},
+        {'latency': {'percentiles': [1, 2]}},
+        {'latency': {'percentiles': {'50': None}}},
+        {'latency': [1]},
+        {'faults': [{'status': 500}]},
+        {'faults': [{'status': 500, 'rate': 2}]},
+        {'faults': [{'status': 500, 'rate': '0.5'}]},
+        {'faults': [{'status': '500', 'rate': 0.5}]},
+        {'faults': [{'status': True, 'rate': 0.5}]},
+        {'faults': [{'status': 99, 'rate': 0.5}]},
+        {'faults': [{'status': 600, 'rate': 0.5}]},
+        {'faults': [500]},
+        {'faults': [{'status': 500, 'rate': 0.5, 'delay': 1}]},
+        {'faults': [{'status': 500, 'rate': 0.6}, {'status': 503, 'rate': 0.6}]},
+        {'latancy': {'fixed': 1}},
+        [],
+    ],
+)
+def test_fault_profiles_invalid(profile):
+    with pytest.raises(ValueError):
+        FaultProfiles({'foo_response.GET': profile})
+
+
+@pytest.mark.parametrize('profiles', [[], None, 'foo_response.GET'])
+def test_fault_profiles_not_a_dict(profiles):
+    with pytest.raises(ValueError) as excinfo:
+        FaultProfiles(profiles)
+    assert 'Invalid fault profiles' in str(excinfo.value)
+
+
+def test_load_fault_profiles_not_an_object(tmpdir):
+    path = tmpdir.join('fault_profiles.json')
+    path.write(json.dumps([{'foo_response.GET': {}}]))
+    with pytest.raises(ValueError):
+        load_fault_profiles(str(path))
+
+
+def test_fault_profiles_invalid_name():
+    with pytest.raises(ValueError):
+        FaultProfiles({'foo.GET': {}})
+
+
+def test_fault_profiles_by_variation(fault_profiles_path, random_generator):
+    fault_profiles = load_fault_profiles(fault_profiles_path)
+    fault_profiles._random = random_generator
+
+    # The endpoint profile applies to all its variations
+    for operation in (OPERATION, Operation('foo', 'GET', '{limit#1}{offset#0}')):
+        delay, mock_response = fault_profiles.apply(MOCK_RESPONSE._replace(operation=operation))
+        assert delay == 0.5
+        assert mock_response.http_response_code == 503
+
+    # Unless they have their own
+    mock_response_404 = MockResponse(Operation('foo_{foo_id#404}_v1', 'GET'), '{}', 404)
+    assert fault_profiles.apply(mock_response_404) == (1.5, mock_response_404)
+
+    mock_response_42 = MockResponse(Operation('foo_{foo_id#42}_v1', 'POST'), '{}', 200)
+    assert fault_profiles.apply(mock_response_42) == (0, mock_response_42)
+
+
+@pytest.mark.parametrize('radix_routing', ['false', 'true'])
+def test_fault_profiles_in_views(fault_profiles_path, radix_routing):
+    mock_app = create_test_app(
+        'tests/view_maker_test_files',
+        'tests/view_maker_test_files/responses',
+        settings={
+            'pyramid_mock_server.fault_profiles_path': fault_profiles_path,
+            'pyramid_mock_server.radix_routing': radix_routing,
+            'pyramid_swagger.enable_response_validation': False,
+        },
+    )
+
+    with mock.patch('pyramid_mock_server.view_maker.time.sleep') as mock_sleep:
+        assert mock_app.get('/foo', status=503).json == {'message': 'unavailable'}
+        mock_sleep.assert_called_once_with(0.5)
+
+        mock_sleep.reset_mock()
+        assert mock_app.get('/foo/something/v1').json == {'message': 'default/get'}
+        assert not mock_sleep.called
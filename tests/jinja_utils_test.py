@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import json
+import os
+
+import jinja2
+import mock
+import pytest
+
+from pyramid_mock_server.jinja_utils import DependencyRecordingEnvironment
+from pyramid_mock_server.jinja_utils import json_hard_update
+from pyramid_mock_server.jinja_utils import json_soft_update
+from pyramid_mock_server.jinja_utils import JSONOverrideExtension
+from pyramid_mock_server.jinja_utils import JSONPatchExtension
+
+
+BASE = {
+    'value': 0,
+    'attr1': {
+        'value': 1,
+        'attr2': {
+            'value': 2,
+        },
+    },
+}
+
+
+@pytest.fixture
+def templates_directory(tmpdir):
+    tmpdir.join('base.json').write(json.dumps(BASE))
+    tmpdir.join('override.json').write(
+        '{% override "base.json" %}{"attr1": "override"}{% endoverride %}\n',
+    )
+    tmpdir.join('patch.json').write(
+        '{% patch "base.json" %}{"attr1": {"attr2": {"value": "patch"}}}{% endpatch %}',
+    )
+    tmpdir.join('nested.json').write(
+        '{% patch "override.json" %}{"attr1": {"value": "nested"}}{% endpatch %}',
+    )
+    tmpdir.join('nested_too.json').write(
+        '{% override "override.json" %}{"value": "nested"}{% endoverride %}',
+    )
+    return str(tmpdir)
+
+
+def _make_environment(
+    templates_directory,
+    environment_class=jinja2.Environment,
+    cache_size=-1,
+    auto_reload=False,
+):
+    return environment_class(
+        loader=jinja2.FileSystemLoader(templates_directory),
+        extensions=[JSONOverrideExtension, JSONPatchExtension],
+        cache_size=cache_size,
+        auto_reload=auto_reload,
+    )
+
+
+def _render(env, name):
+    return json.loads(env.get_template(name).render())
+
+
+def test_json_updates():
+    assert json.loads(json_hard_update('{"a": {"b": 1}}', '{"a": {"c": 2}}')) == {
+        'a': {'c': 2},
+    }
+    assert json.loads(json_soft_update('{"a": {"b": 1}}', '{"a": {"c": 2}}')) == {
+        'a': {'b': 1, 'c': 2},
+    }
+
+
+@pytest.mark.parametrize('json_update', [json_hard_update, json_soft_update])
+@pytest.mark.parametrize('base, update', [('[["k", 1]]', '{"x": 2}'), ('{}', '[]')])
+def test_json_updates_of_non_objects(json_update, base, update):
+    with pytest.raises(ValueError):
+        json_update(base, update)
+
+
+@pytest.mark.parametrize('tag', ['override', 'patch'])
+@pytest.mark.parametrize(
+    'base, update, expected_message',
+    [
+        ('[["k", 1]]', '{"x": 2}', 'list.json is not a JSON object'),
+        ('{}', '[]', 'its update is not a JSON object'),
+    ],
+)
+def test_json_update_extensions_non_objects(tmpdir, tag, base, update, expected_message):
+    tmpdir.join('list.json').write(base)
+    tmpdir.join('update.json').write(
+        '{{% {0} "list.json" %}}{1}{{% end{0} %}}'.format(tag, update),
+    )
+    env = _make_environment(str(tmpdir))
+
+    with pytest.raises(ValueError) as excinfo:
+        _render(env, 'update.json')
+    assert 'Cannot update list.json' in str(excinfo.value)
+    assert expected_message in str(excinfo.value)
+
+
+@pytest.mark.parametrize('environment_class', [jinja2.Environment, DependencyRecordingEnvironment])
+@pytest.mark.parametrize('cache_size', [-1, 0, 1])
+def test_json_update_extensions(templates_directory, environment_class, cache_size):
+    env = _make_environment(templates_directory, environment_class, cache_size)
+
+    # Render everything twice to use the cached documents
+    for _ in range(2):
+        assert _render(env, 'override.json') == {'value': 0, 'attr1': 'override'}
+        assert _render(env, 'patch.json') == {
+            'value': 0,
+            'attr1': {'value': 1, 'attr2': {'value': 'patch'}},
+        }
+        assert _render(env, 'nested.json') == {'value': 0, 'attr1': {'value': 'nested'}}
+        assert _render(env, 'nested_too.json') == {'value': 'nested', 'attr1': 'override'}
+        assert _render(env, 'base.json') == BASE
+
+
+def test_json_update_extensions_parse_base_once(templates_directory):
+    env = _make_environment(templates_directory)
+    mock_loads = mock.Mock(side_effect=json.loads)
+    env.json_codec = env.json_codec._replace(loads=mock_loads)
+    _render(env, 'patch.json')
+    _render(env, 'override.json')
+    _render(env, 'nested.json')
+    _render(env, 'nested_too.json')
+
+    parsed = [call[0][0].strip() for call in mock_loads.call_args_list]
+    assert parsed.count(json.dumps(BASE)) == 1
+    # The output of override.json is never parsed, its document is reused
+    assert env.get_template('override.json').render().strip() not in parsed
+    # The cached base document is left unchanged by the updates
+    assert _render(env, 'base.json') == BASE
+
+
+def test_json_update_extensions_record_cached_dependencies(templates_directory):
+    env = _make_environment(templates_directory, DependencyRecordingEnvironment)
+
+    assert env.render_template('nested.json')[1] == {'override.json', 'base.json'}
+    assert env.render_template('nested_too.json')[1] == {'override.json', 'base.json'}
+    assert env.render_template('patch.json')[1] == {'base.json'}
+
+
+@pytest.mark.parametrize('auto_reload', [False, True])
+def test_json_update_extensions_auto_reload(templates_directory, auto_reload):
+    env = _make_environment(templates_directory, DependencyRecordingEnvironment, -1, auto_reload)
+    assert _render(env, 'nested.json') == {'value': 0, 'attr1': {'value': 'nested'}}
+
+    base_path = os.path.join(templates_directory, 'base.json')
+    with open(base_path, 'w') as f:
+        f.write(json.dumps(dict(BASE, value='modified')))
+    mtime = os.path.getmtime(base_path) + 10
+    os.utime(base_path, (mtime, mtime))
+
+    assert _render(env, 'nested.json') == {
+        'value': 'modified' if auto_reload else 0,
+        'attr1': {'value': 'nested'},
+    }
+    assert env.render_template('nested.json')[1] == {'override.json', 'base.json'}
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import json
+import sys
+
+import mock
+import pytest
+import six
+
+from pyramid_mock_server import json_codec as json_codec_module
+from pyramid_mock_server.json_codec import get_json_codec
+
+
+DOCUMENT = {'b': [1, 2.5, None, True], 'a': {'d': 'é/', 'c': {}}}
+
+
+@pytest.fixture
+def orjson():
+    try:
+        import orjson
+    except ImportError:
+        # Stand in for the optional backend when it is not installed
+        orjson = mock.Mock(OPT_SORT_KEYS=1, OPT_INDENT_2=2, loads=json.loads)
+        orjson.dumps.side_effect = lambda document, option: json.dumps(
+            document,
+            sort_keys=True,
+            indent=2 if option & 2 else None,
+            separators=(',', ':'),
+            ensure_ascii=False,
+        ).encode('utf-8')
+    with mock.patch.dict(sys.modules, {'orjson': orjson}):
+        with mock.patch.dict(json_codec_module._codecs, clear=True):
+            yield orjson
+
+
+@pytest.fixture
+def fake_ujson():
+    ujson = mock.Mock(loads=json.loads)
+
+    def dumps(document, sort_keys, indent, ensure_ascii, escape_forward_slashes):
+        return json.dumps(
+            document,
+            sort_keys=sort_keys,
+            indent=indent or None,
+            separators=(',', ':'),
+            ensure_ascii=ensure_ascii,
+        )
+
+    ujson.dumps.side_effect = dumps
+    with mock.patch.dict(sys.modules, {'ujson': ujson}):
+        with mock.patch.dict(json_codec_module._codecs, clear=True):
+            yield ujson
+
+
+@pytest.mark.parametrize('name', ['json', 'orjson', 'ujson'])
+@pytest.mark.parametrize('indent', [None, 4])
+@pytest.mark.usefixtures('orjson', 'fake_ujson')
+def test_json_codecs(name, indent):
+    json_codec = get_json_codec(name)
+    assert json_codec.name == name
+
+    serialized = json_codec.dumps(DOCUMENT, indent=indent)
+    assert isinstance(serialized, six.text_type)
+    assert json_codec.loads(serialized) == DOCUMENT
+    assert '"é/"' in serialized
+    assert ('\n' in serialized) == (indent is not None)
+    assert (' ' in serialized) == (indent is not None)
+    assert serialized.index('"a"') < serialized.index('"b"')
+
+
+def test_get_json_codec_default():
+    assert get_json_codec() is get_json_codec('json')
+    assert get_json_codec().dumps(DOCUMENT, indent=4) == json.dumps(
+        DOCUMENT,
+        sort_keys=True,
+        indent=4,
+        separators=(',', ': '),
+        ensure_ascii=False,
+    )
+
+
+@pytest.mark.usefixtures('orjson')
+def test_get_json_codec_auto():
+    assert get_json_codec('auto').name == 'orjson'
+
+
+@pytest.mark.usefixtures('fake_ujson')
+def test_get_json_codec_auto_fallback():
+    def missing_backend():
+        raise ImportError
+
+    with mock.patch.dict(json_codec_module._CODEC_FACTORIES, orjson=missing_backend):
+        assert get_json_codec('auto').name == 'ujson'
+
+        with mock.patch.dict(json_codec_module._CODEC_FACTORIES, ujson=missing_backend), \
+                mock.patch.dict(json_codec_module._codecs, clear=True):
+            assert get_json_codec('auto').name == 'json'
+
+
+def test_get_json_codec_unknown():
+    with pytest.raises(ValueError) as excinfo:
+        get_json_codec('simplejson')
+    assert 'json, orjson, ujson, auto' in str(excinfo.value)
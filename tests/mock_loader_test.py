@@ -3,10 +3,33 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 
 import json
+import os
+import pickle
+import shutil
+import threading
 
+import jinja2
+import mock
+import pytest
+
+from pyramid_mock_server.jinja_utils import AtomicFileSystemBytecodeCache
+from pyramid_mock_server.jinja_utils import DependencyRecordingEnvironment
+from pyramid_mock_server.jinja_utils import JSONOverrideExtension
+from pyramid_mock_server.jinja_utils import JSONPatchExtension
+from pyramid_mock_server.jinja_utils import TemplateDependencyGraph
+from pyramid_mock_server.mock_loader import _LazyMockResponse
+from pyramid_mock_server.mock_loader import _load_mock_responses_chunk_in_worker
 from pyramid_mock_server.mock_loader import _make_json_template_loader
+from pyramid_mock_server.mock_loader import find_json_files
 from pyramid_mock_server.mock_loader import load_responses
+from pyramid_mock_server.mock_loader import LoadStats
+from pyramid_mock_server.mock_loader import make_mock_response_loader
+from pyramid_mock_server.mock_loader import MockRenderingError
 from pyramid_mock_server.mock_loader import MockResponse
+from pyramid_mock_server.response_body import _gzip
+from pyramid_mock_server.response_body import ArenaSlice
+from pyramid_mock_server.response_body import encode_body
+from pyramid_mock_server.response_body import SharedFileSnapshot
 from pyramid_mock_server.util import Operation
 
 
@@ -21,9 +44,11 @@ def test_load_responses():
     ])
 
 
-def test_make_json_template_loader():
+@pytest.mark.parametrize('json_codec', [None, 'auto'])
+def test_make_json_template_loader(json_codec):
     loader = _make_json_template_loader(
         'tests/jinja_templating_test_files',
+        json_codec=json_codec,
     )
     base = {
         'value': 0,
@@ -60,3 +85,491 @@ def test_make_json_template_loader():
             }
         }
     }
+
+
+def test_load_responses_lazy():
+    responses = load_responses('tests/mock_loader_test_responses', lazy=True)
+    eager_responses = load_responses('tests/mock_loader_test_responses')
+
+    assert sorted(
+        (response.operation, response.json_str, response.http_response_code, response.body)
+        for response in responses
+    ) == sorted(tuple(response) for response in eager_responses)
+
+
+def test_load_responses_lazy_renders_once():
+    render = mock.Mock(return_value=('{}', encode_body('{}')))
+    response = _LazyMockResponse(Operation('foo', 'GET'), 200, render)
+
+    threads = [threading.Thread(target=lambda: response.body) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert response.json_str == '{}'
+    assert render.call_count == 1
+
+
+def test_lazy_mock_response_fields():
+    operation = Operation('foo', 'GET')
+    response = _LazyMockResponse(operation, 200, lambda: ('{}', 'body'))
+    eager_response = MockResponse(operation, '{}', 200, 'body')
+
+    assert tuple(response) == (operation, '{}', 200, 'body')
+    assert response == eager_response
+    assert not response != eager_response
+    assert response != MockResponse(operation, '{"a": 1}', 200, 'body')
+    assert response != (operation, '{}', 200)
+    assert response != 'body'
+    assert hash(response) == hash(eager_response)
+    _, json_str, _, body = response
+    assert (json_str, body) == ('{}', 'body')
+
+    replaced = response._replace(http_response_code=404)
+    assert type(replaced) is MockResponse
+    assert replaced == (operation, '{}', 404, 'body')
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_load_responses_rendering_error(workers):
+    with pytest.raises(MockRenderingError) as excinfo:
+        load_responses('tests/mock_loader_test_broken_responses', workers=workers)
+    assert 'broken_response.GET.json' in str(excinfo.value)
+    assert 'broken_too_response.GET.json' in str(excinfo.value)
+
+
+def test_load_responses_workers():
+    responses = load_responses('tests/mock_loader_test_responses', workers=2)
+    assert responses == load_responses('tests/mock_loader_test_responses')
+
+
+def test_load_responses_lazy_ignores_workers():
+    with mock.patch('pyramid_mock_server.mock_loader.log') as mock_log, mock.patch(
+        'pyramid_mock_server.mock_loader.multiprocessing.Pool',
+    ) as mock_pool:
+        responses = load_responses('tests/mock_loader_test_responses', lazy=True, workers=2)
+    assert all(isinstance(response, _LazyMockResponse) for response in responses)
+    assert not mock_pool.called
+    mock_log.warning.assert_called_once_with(mock.ANY, 2)
+
+
+def test_load_responses_lazy_rendering_error():
+    responses = load_responses('tests/mock_loader_test_broken_responses', lazy=True)
+    assert sorted(response.operation for response in responses) == [
+        Operation('broken', 'GET'),
+        Operation('broken_too', 'GET'),
+    ]
+
+    for response in responses:
+        with pytest.raises(MockRenderingError) as excinfo:
+            response.body
+        assert response.operation.response_name + '_response.GET.json' in str(excinfo.value)
+
+
+def test_dependency_recording_environment():
+    env = DependencyRecordingEnvironment(
+        loader=jinja2.FileSystemLoader('tests/jinja_templating_test_files'),
+        extensions=[JSONOverrideExtension, JSONPatchExtension],
+    )
+
+    assert env.render_template('base.json')[1] == set()
+    assert env.render_template('include.json')[1] == {'base.json'}
+    assert env.render_template('override.json')[1] == {'base.json'}
+    # Templates used outside of render_template are not recorded anywhere
+    assert env.get_template('patch.json').render()
+    assert env.render_template('patch.json')[1] == {'base.json'}
+
+
+def test_load_responses_bytecode_cache(tmpdir):
+    bytecode_cache_directory = str(tmpdir.join('bytecode'))
+    responses = load_responses(
+        'tests/mock_loader_test_responses',
+        bytecode_cache_directory=bytecode_cache_directory,
+    )
+    assert os.listdir(bytecode_cache_directory)
+
+    assert load_responses(
+        'tests/mock_loader_test_responses',
+        bytecode_cache_directory=bytecode_cache_directory,
+    ) == responses
+
+
+def test_bytecode_cache_failed_write(tmpdir):
+    bytecode_cache = AtomicFileSystemBytecodeCache(str(tmpdir))
+    bucket = mock.Mock(key='key', write_bytecode=mock.Mock(side_effect=IOError))
+
+    with pytest.raises(IOError):
+        bytecode_cache.dump_bytecode(bucket)
+
+    assert tmpdir.listdir() == []
+
+
+def test_template_dependency_graph():
+    graph = TemplateDependencyGraph()
+    graph.set_dependencies('a', ['base'])
+    graph.set_dependencies('b', ['a', 'base'])
+    graph.set_dependencies('c', ['other'])
+
+    assert graph.get_dependents(['base']) == {'a', 'b'}
+    assert graph.get_dependents(['a']) == {'b'}
+    assert graph.get_dependents(['b', 'unknown']) == set()
+
+    graph.set_dependencies('b', ['other'])
+    assert graph.get_dependents(['base']) == {'a'}
+
+    graph.discard('a')
+    assert graph.get_dependents(['base']) == set()
+
+    other_graph = TemplateDependencyGraph()
+    other_graph.update(graph.get_dependencies_by_name())
+    assert other_graph.get_dependencies_by_name() == {
+        'b': frozenset(['other']),
+        'c': frozenset(['other']),
+    }
+
+
+@pytest.fixture
+def templated_responses_directory(tmpdir):
+    directory = str(tmpdir.join('responses'))
+    shutil.copytree('tests/jinja_templating_test_files', directory)
+    for name in ('include', 'override', 'patch'):
+        with open(os.path.join(directory, name + '_response.GET.json'), 'w') as f:
+            f.write('{{% include "{0}.json" %}}'.format(name))
+    return directory
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_load_responses_dependency_graph(templated_responses_directory, workers):
+    dependency_graph = TemplateDependencyGraph()
+    load_responses(
+        templated_responses_directory,
+        workers=workers,
+        dependency_graph=dependency_graph,
+    )
+    assert dependency_graph.get_dependents(['base.json']) == {
+        'include_response.GET.json',
+        'override_response.GET.json',
+        'patch_response.GET.json',
+    }
+
+
+@pytest.mark.parametrize('record_dependencies, expected', [
+    (False, {}),
+    (True, {'patch_response.GET.json': frozenset(['base.json', 'patch.json'])}),
+])
+def test_load_mock_responses_chunk_in_worker(
+    templated_responses_directory,
+    record_dependencies,
+    expected,
+):
+    results, dependencies_by_name = _load_mock_responses_chunk_in_worker((
+        templated_responses_directory,
+        [(
+            os.path.join(templated_responses_directory, 'patch_response.GET.json'),
+            'patch_response.GET',
+        )],
+        {},
+        record_dependencies,
+    ))
+    assert [mock_response.operation for mock_response, _ in results] == [Operation('patch', 'GET')]
+    assert dependencies_by_name == expected
+
+
+def test_load_responses_skips_invalid_names(templated_responses_directory):
+    load_stats = LoadStats()
+    with mock.patch(
+        'pyramid_mock_server.jinja_utils.DependencyRecordingEnvironment.render_template',
+        autospec=True,
+        side_effect=DependencyRecordingEnvironment.render_template,
+    ) as mock_render_template:
+        responses = load_responses(templated_responses_directory, load_stats=load_stats)
+
+    assert len(responses) == 3
+    # Only the mock responses are rendered, the other files as templates
+    assert sorted(
+        call[0][1] for call in mock_render_template.call_args_list
+        if call[0][1].endswith('_response.GET.json')
+    ) == ['include_response.GET.json', 'override_response.GET.json', 'patch_response.GET.json']
+    assert load_stats.json_files == 7
+    assert load_stats.mock_responses == 3
+    assert sorted(os.path.basename(path) for path in load_stats.invalid_names) == [
+        'base.json', 'include.json', 'override.json', 'patch.json',
+    ]
+
+
+def test_find_json_files(tmpdir):
+    tmpdir.join('a_response.GET.json').write('{}')
+    tmpdir.join('b.txt').write('')
+    tmpdir.join('c_response.GET.raw.json').write('{}')
+    tmpdir.mkdir('sub').join('d_response.GET.json').write('{}')
+    tmpdir.mkdir('.git').join('e.json').write('{}')
+    fixtures = tmpdir.mkdir('fixtures')
+    fixtures.join('f.json').write('{}')
+    fixtures.mkdir('sub').join('g.json').write('{}')
+    tmpdir.join('sub').join('fixtures').mkdir().join('h.json').write('{}')
+    tmpdir.join('link').mksymlinkto(tmpdir.join('sub'))
+
+    def find(ignore_patterns=None):
+        return sorted(
+            (os.path.relpath(path, str(tmpdir)), response_name)
+            for path, response_name in find_json_files(str(tmpdir), ignore_patterns)
+        )
+
+    assert find() == [
+        ('.git/e.json', 'e'),
+        ('a_response.GET.json', 'a_response.GET'),
+        ('c_response.GET.raw.json', 'c_response.GET'),
+        ('fixtures/f.json', 'f'),
+        ('fixtures/sub/g.json', 'g'),
+        ('sub/d_response.GET.json', 'd_response.GET'),
+        ('sub/fixtures/h.json', 'h'),
+    ]
+    # Names are matched anywhere, paths from the root of the directory
+    assert find(['.git', 'fixtures/*']) == [
+        ('a_response.GET.json', 'a_response.GET'),
+        ('c_response.GET.raw.json', 'c_response.GET'),
+        ('sub/d_response.GET.json', 'd_response.GET'),
+        ('sub/fixtures/h.json', 'h'),
+    ]
+    assert find(['*.raw.json', 'sub']) == [
+        ('.git/e.json', 'e'),
+        ('a_response.GET.json', 'a_response.GET'),
+        ('fixtures/f.json', 'f'),
+    ]
+
+
+def test_find_json_files_walk_order(tmpdir):
+    for directory in ('', 'a', 'a/b', 'c'):
+        tmpdir.ensure(directory, 'x.json')
+        tmpdir.ensure(directory, 'y.json')
+
+    walked = [
+        os.path.join(root, filename)
+        for root, _, files in os.walk(str(tmpdir))
+        for filename in files
+    ]
+    assert [path for path, _ in find_json_files(str(tmpdir))] == walked
+
+
+def test_find_json_files_unreadable_directory(tmpdir):
+    tmpdir.join('a.json').write('{}')
+    with mock.patch('pyramid_mock_server.mock_loader.scandir', side_effect=OSError):
+        assert find_json_files(str(tmpdir)) == []
+
+
+@pytest.fixture
+def formatted_responses_directory(tmpdir):
+    tmpdir.join('foo_response.GET.json').write_text(
+        '{\n  "b": [1, 2],\n  "a": "é"\n}\n',
+        encoding='utf-8',
+    )
+    return str(tmpdir)
+
+
+@pytest.mark.parametrize('json_format, expected_json_str', [
+    (None, '{\n  "b": [1, 2],\n  "a": "é"\n}'),
+    ('compact', '{"a":"é","b":[1,2]}'),
+    ('pretty', '{\n    "a": "é",\n    "b": [\n        1,\n        2\n    ]\n}'),
+])
+def test_load_responses_json_format(formatted_responses_directory, json_format, expected_json_str):
+    responses = load_responses(formatted_responses_directory, json_format=json_format)
+    assert responses == [
+        MockResponse(Operation('foo', 'GET'), expected_json_str, 200),
+    ]
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_load_responses_json_format_invalid_json(formatted_responses_directory, workers):
+    with open(os.path.join(formatted_responses_directory, 'bar_response.GET.json'), 'w') as f:
+        f.write('{"bar": }')
+
+    with pytest.raises(MockRenderingError) as excinfo:
+        load_responses(formatted_responses_directory, workers=workers, json_format='compact')
+    assert 'Invalid JSON in' in str(excinfo.value)
+    assert 'bar_response.GET.json' in str(excinfo.value)
+    assert 'foo_response.GET.json' not in str(excinfo.value)
+
+
+def test_load_responses_json_format_unknown(formatted_responses_directory):
+    with pytest.raises(ValueError):
+        load_responses(formatted_responses_directory, json_format='minified')
+
+
+@pytest.fixture
+def static_responses_directory(tmpdir):
+    tmpdir.join('raw_response.GET.raw.json').write('{"message": "{{ raw }}"}')
+    tmpdir.join('plain_response.GET.json').write('{"message":  "plain"}')
+    tmpdir.join('template_response.GET.json').write('{"message": "{{ 1 + 1 }}"}')
+    tmpdir.join('not_a_mock.raw.json').write('{}')
+    return str(tmpdir)
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+@pytest.mark.parametrize('detect_static_files, static_names', [
+    (False, ['raw']),
+    (True, ['plain', 'raw']),
+])
+def test_load_responses_static_files(
+    static_responses_directory,
+    workers,
+    detect_static_files,
+    static_names,
+):
+    responses = load_responses(
+        static_responses_directory,
+        workers=workers,
+        detect_static_files=detect_static_files,
+    )
+    responses_by_name = {response.operation.response_name: response for response in responses}
+    assert sorted(responses_by_name) == ['plain', 'raw', 'template']
+
+    assert responses_by_name['raw'].json_str == '{"message": "{{ raw }}"}'
+    assert responses_by_name['plain'].json_str == '{"message":  "plain"}'
+    assert responses_by_name['template'].json_str == '{"message": "2"}'
+    assert sorted(
+        name
+        for name, response in responses_by_name.items()
+        if isinstance(response.body.data, SharedFileSnapshot)
+    ) == static_names
+
+
+def test_load_responses_static_files_json_format(static_responses_directory):
+    responses = load_responses(static_responses_directory, json_format='compact')
+    raw_response, = [
+        response for response in responses if response.operation.response_name == 'raw'
+    ]
+    # Static files are validated, not reformatted
+    assert raw_response.json_str == '{"message": "{{ raw }}"}'
+
+    with open(os.path.join(static_responses_directory, 'raw_response.GET.raw.json'), 'w') as f:
+        f.write('{"message": {{ raw }}}')
+    with pytest.raises(MockRenderingError) as excinfo:
+        load_responses(static_responses_directory, json_format='compact')
+    assert 'Invalid JSON in' in str(excinfo.value)
+    assert 'raw_response.GET.raw.json' in str(excinfo.value)
+
+
+def test_load_missing_static_file(static_responses_directory):
+    load_mock_response_fn = make_mock_response_loader(static_responses_directory)
+    with pytest.raises(MockRenderingError) as excinfo:
+        load_mock_response_fn(
+            os.path.join(static_responses_directory, 'missing_response.GET.raw.json'),
+            'missing_response.GET',
+        )
+    assert 'Unable to read' in str(excinfo.value)
+
+
+def test_static_mock_response_pickle(static_responses_directory):
+    response, = [
+        response
+        for response in load_responses(static_responses_directory)
+        if response.operation.response_name == 'raw'
+    ]
+    unpickled = pickle.loads(pickle.dumps(response, pickle.HIGHEST_PROTOCOL))
+    assert unpickled.operation == response.operation
+    assert unpickled.json_str == response.json_str
+    assert unpickled.body.headerlist == response.body.headerlist
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+@pytest.mark.parametrize('in_file', [False, True])
+def test_load_responses_response_arena(static_responses_directory, tmpdir, workers, in_file):
+    response_arena = str(tmpdir.join('arena')) if in_file else ':memory:'
+    load_stats = LoadStats()
+    responses = load_responses(
+        static_responses_directory,
+        workers=workers,
+        gzip_min_size=20,
+        load_stats=load_stats,
+        response_arena=response_arena,
+    )
+    responses_by_name = {response.operation.response_name: response for response in responses}
+    expected_by_name = {
+        response.operation.response_name: response
+        for response in load_responses(
+            static_responses_directory,
+            gzip_min_size=20,
+        )
+    }
+
+    for name, response in responses_by_name.items():
+        expected = expected_by_name[name]
+        assert response.json_str == expected.json_str
+        assert response.body.headerlist == expected.body.headerlist
+        assert response.body.gzip_headerlist == expected.body.gzip_headerlist
+    # The static files stay in their snapshots
+    assert isinstance(responses_by_name['raw'].body.data, SharedFileSnapshot)
+    plain_body = responses_by_name['plain'].body
+    assert isinstance(plain_body.data, ArenaSlice)
+    assert plain_body.gzip_data.read() == expected_by_name['plain'].body.gzip_data
+    template_body = responses_by_name['template'].body
+    assert isinstance(template_body.data, ArenaSlice)
+    assert template_body.gzip_data is None
+    assert load_stats.arena_size == (
+        plain_body.data.size + plain_body.gzip_data.size + template_body.data.size
+    )
+
+
+def test_load_responses_response_arena_lazy(static_responses_directory):
+    load_stats = LoadStats()
+    responses = load_responses(
+        static_responses_directory,
+        lazy=True,
+        load_stats=load_stats,
+        response_arena=':memory:',
+    )
+    assert not any(isinstance(response.body.data, ArenaSlice) for response in responses)
+    assert load_stats.arena_size == 0
+
+
+@pytest.fixture
+def duplicated_responses_directory(tmpdir):
+    tmpdir.join('base.json').write('{"message": "not found"}')
+    for foo_id in range(3):
+        tmpdir.join('foo_{{foo_id#{0}}}_response.404.GET.json'.format(foo_id)).write(
+            '{% include "base.json" %}',
+        )
+    tmpdir.join('bar_response.404.GET.json').write('{"message": "not found"}')
+    tmpdir.join('foo_response.GET.json').write('{"message": "{{ 1 + 1 }}"}')
+    tmpdir.join('static_response.GET.raw.json').write('{"message": "not found"}')
+    return str(tmpdir)
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+@pytest.mark.parametrize('response_arena', [None, ':memory:'])
+def test_load_responses_dedup(duplicated_responses_directory, workers, response_arena):
+    load_stats = LoadStats()
+    responses = load_responses(
+        duplicated_responses_directory,
+        gzip_min_size=0,
+        workers=workers,
+        load_stats=load_stats,
+        response_arena=response_arena,
+    )
+
+    not_found_bodies = set(
+        id(response.body) for response in responses
+        if response.http_response_code == 404
+    )
+    assert len(not_found_bodies) == 1
+    if response_arena is None:
+        assert len(set(
+            id(response.json_str) for response in responses
+            if response.http_response_code == 404
+        )) == 1
+
+    not_found_size = len(b'{"message": "not found"}') + len(_gzip(b'{"message": "not found"}'))
+    two_size = len(b'{"message": "2"}') + len(_gzip(b'{"message": "2"}'))
+    assert load_stats.rendered_bodies == 5
+    assert load_stats.unique_bodies == 2
+    assert load_stats.rendered_body_size == 4 * not_found_size + two_size
+    assert load_stats.unique_body_size == not_found_size + two_size
+    assert load_stats.dedup_ratio == pytest.approx(
+        float(4 * not_found_size + two_size) / (not_found_size + two_size),
+    )
+    assert load_stats.arena_size == (0 if response_arena is None else load_stats.unique_body_size)
+
+
+def test_load_stats_dedup_ratio_without_bodies():
+    assert LoadStats().dedup_ratio == 1.0
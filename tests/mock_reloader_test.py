@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import json
+import os
+import shutil
+
+import mock
+import pytest
+
+from .conftest import create_test_app
+from pyramid_mock_server.jinja_utils import TemplateDependencyGraph
+from pyramid_mock_server.mock_loader import load_responses
+from pyramid_mock_server.mock_reloader import MockReloader
+from pyramid_mock_server.response_collection import ResponseCollection
+from pyramid_mock_server.util import Operation
+
+
+@pytest.fixture
+def responses_directory(tmpdir):
+    directory = str(tmpdir.join('responses'))
+    shutil.copytree('tests/view_maker_test_files/responses', directory)
+    return directory
+
+
+@pytest.fixture
+def response_collection(responses_directory):
+    return ResponseCollection(load_responses(responses_directory))
+
+
+@pytest.fixture
+def reloader(responses_directory, response_collection):
+    return MockReloader(responses_directory, response_collection)
+
+
+def _write(directory, filename, content):
+    with open(os.path.join(directory, filename), 'w') as f:
+        f.write(content)
+    return os.path.join(directory, filename)
+
+
+def _message(response_collection, operation, arg_dict=None):
+    variations = response_collection.get_variations(operation)
+    return json.loads(variations.match_arg_dict(arg_dict or {}).json_str)['message']
+
+
+def test_poll_no_change(reloader):
+    assert reloader.poll() == []
+
+
+def test_poll_modified_file(responses_directory, response_collection, reloader):
+    path = _write(responses_directory, 'foo_response.GET.json', '{"message": "modified"}')
+
+    assert reloader.poll() == [path]
+    assert _message(response_collection, Operation('foo', 'GET')) == 'modified'
+
+
+def test_poll_added_file(responses_directory, response_collection, reloader):
+    version = response_collection.version
+    path = _write(responses_directory, 'bar_response.GET.json', '{"message": "added"}')
+
+    assert reloader.poll() == [path]
+    assert _message(response_collection, Operation('bar', 'GET')) == 'added'
+    assert response_collection.version != version
+
+
+def test_poll_removed_file(responses_directory, response_collection, reloader):
+    path = os.path.join(responses_directory, 'foo_{foo_id#404}_v1_response.404.GET.json')
+    os.remove(path)
+
+    assert reloader.poll() == [path]
+    assert _message(
+        response_collection,
+        Operation('foo_{foo_id}_v1', 'GET'),
+        {'foo_id': '404'},
+    ) == 'default/get'
+
+
+def test_poll_removed_file_operation_defined_twice(responses_directory, response_collection):
+    os.mkdir(os.path.join(responses_directory, 'other'))
+    _write(responses_directory, 'other/foo_response.GET.json', '{"message": "other foo"}')
+    reloader = MockReloader(responses_directory, response_collection)
+
+    path = os.path.join(responses_directory, 'foo_response.GET.json')
+    os.remove(path)
+
+    assert reloader.poll() == [path]
+    assert _message(response_collection, Operation('foo', 'GET')) == 'other foo'
+
+
+def test_poll_removed_only_variation(responses_directory, response_collection, reloader):
+    os.remove(os.path.join(responses_directory, 'exclude_me_response.GET.json'))
+    reloader.poll()
+
+    assert response_collection.get_variations(Operation('exclude_me', 'GET')) is None
+
+
+def test_poll_invalid_file_names(responses_directory, response_collection, reloader):
+    version = response_collection.version
+    path = _write(responses_directory, 'not_a_mock.json', '{}')
+    assert reloader.poll() == [path]
+
+    os.remove(path)
+    assert reloader.poll() == [path]
+    assert response_collection.version == version
+
+
+def test_poll_rendering_error(responses_directory, response_collection, reloader):
+    path = _write(responses_directory, 'foo_response.GET.json', '{% patch "missing.json" %}')
+
+    with mock.patch('pyramid_mock_server.mock_reloader.log') as mock_log:
+        assert reloader.poll() == [path]
+
+    assert mock_log.exception.called
+    assert _message(response_collection, Operation('foo', 'GET')) == 'You got foo'
+    # The broken file is not loaded again until it changes
+    assert reloader.poll() == []
+
+
+def test_start_stop(reloader):
+    with mock.patch.object(reloader, 'poll', side_effect=[Exception, None]) as mock_poll:
+        with mock.patch('pyramid_mock_server.mock_reloader.log') as mock_log:
+            thread = reloader.start(0.01)
+            while mock_poll.call_count < 2:
+                thread.join(0.01)
+            reloader.stop()
+            thread.join()
+
+    assert mock_log.exception.called
+
+
+def test_reload_app(responses_directory):
+    mock_app = create_test_app(
+        'tests/view_maker_test_files',
+        responses_directory,
+        excluded_path=['/exclude_me'],
+        settings={'pyramid_mock_server.reload_interval': '3600'},
+    )
+    reloader = mock_app.app.registry.pyramid_mock_server_reloader
+    reloader.stop()
+
+    mock_app.request('/foo/bar', method='POST', status=500)
+    assert mock_app.request('/foo/12/v1', method='GET').json['message'] == 'default/get'
+
+    _write(responses_directory, 'foo_bar_response.POST.json', '{"message": "added"}')
+    _write(responses_directory, 'foo_{foo_id#12}_v1_response.GET.json', '{"message": "12"}')
+    reloader.poll()
+
+    assert mock_app.request('/foo/bar', method='POST').json['message'] == 'added'
+    assert mock_app.request('/foo/12/v1', method='GET').json['message'] == '12'
+    assert mock_app.request('/foo/13/v1', method='GET').json['message'] == 'default/get'
+
+
+def test_poll_file_removed_while_scanning(responses_directory, reloader):
+    path = os.path.join(responses_directory, 'foo_response.GET.json')
+    stat = os.stat
+
+    def _stat(filepath):
+        if filepath == path:
+            raise OSError
+        return stat(filepath)
+
+    with mock.patch('pyramid_mock_server.mock_reloader.os.stat', side_effect=_stat):
+        assert reloader.poll() == [path]
+
+
+def test_poll_template_dependents(responses_directory):
+    _write(responses_directory, 'base.json', '{"message": "base"}')
+    _write(responses_directory, 'bar_response.GET.json', '{% include "base.json" %}')
+    _write(
+        responses_directory,
+        'bar_{bar_id#1}_response.GET.json',
+        '{% patch "bar_response.GET.json" %}{"id": 1}{% endpatch %}',
+    )
+    dependency_graph = TemplateDependencyGraph()
+    response_collection = ResponseCollection(
+        load_responses(responses_directory, dependency_graph=dependency_graph),
+    )
+    reloader = MockReloader(
+        responses_directory,
+        response_collection,
+        dependency_graph=dependency_graph,
+    )
+
+    path = _write(responses_directory, 'base.json', '{"message": "modified"}')
+    with mock.patch(
+        'pyramid_mock_server.response_collection.ResponseCollection.add_mock_response',
+        autospec=True,
+        side_effect=ResponseCollection.add_mock_response,
+    ) as mock_add_mock_response:
+        assert reloader.poll() == [path]
+
+    assert sorted(
+        call[0][1].operation.response_name for call in mock_add_mock_response.call_args_list
+    ) == ['bar', 'bar_{bar_id#1}']
+    assert _message(response_collection, Operation('bar_{bar_id}', 'GET')) == 'modified'
+    assert _message(
+        response_collection,
+        Operation('bar_{bar_id}', 'GET'),
+        {'bar_id': '1'},
+    ) == 'modified'
+
+    os.remove(path)
+    reloader.poll()
+    assert _message(response_collection, Operation('bar_{bar_id}', 'GET')) == 'modified'
+    assert dependency_graph.get_dependents(['bar_response.GET.json']) == \
+        {'bar_{bar_id#1}_response.GET.json'}
+
+
+def test_poll_ignored_files(responses_directory, response_collection):
+    reloader = MockReloader(responses_directory, response_collection, ignore_patterns=['drafts'])
+    os.mkdir(os.path.join(responses_directory, 'drafts'))
+    _write(responses_directory, 'drafts/bar_response.GET.json', '{"message": "draft"}')
+    assert reloader.poll() == []
+    assert response_collection.get_variations(Operation('bar', 'GET')) is None
+
+
+def test_poll_lazy_template_dependents(responses_directory):
+    _write(responses_directory, 'base.json', '{"message": "base"}')
+    _write(responses_directory, 'bar_response.GET.json', '{% patch "base.json" %}{}{% endpatch %}')
+    _write(responses_directory, 'baz_response.GET.json', '{% patch "base.json" %}{}{% endpatch %}')
+    dependency_graph = TemplateDependencyGraph()
+    response_collection = ResponseCollection(
+        load_responses(responses_directory, lazy=True, dependency_graph=dependency_graph),
+    )
+    reloader = MockReloader(
+        responses_directory,
+        response_collection,
+        dependency_graph=dependency_graph,
+        lazy=True,
+    )
+    assert _message(response_collection, Operation('bar', 'GET')) == 'base'
+
+    path = _write(responses_directory, 'base.json', '{"message": "modified"}')
+    mtime = os.path.getmtime(path) + 10
+    os.utime(path, (mtime, mtime))
+    assert reloader.poll() == [path]
+
+    # baz was not rendered yet, it was not loaded again
+    assert _message(response_collection, Operation('baz', 'GET')) == 'modified'
+    assert _message(response_collection, Operation('bar', 'GET')) == 'modified'
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import errno
+import json
+import os
+import shutil
+
+import mock
+import pytest
+
+from pyramid_mock_server.jinja_utils import TemplateDependencyGraph
+from pyramid_mock_server.json_codec import get_json_codec
+from pyramid_mock_server.json_codec import JSONCodec
+from pyramid_mock_server.mock_loader import _make_json_template_loader
+from pyramid_mock_server.render_cache import RenderCache
+
+
+@pytest.fixture
+def templates_directory(tmpdir):
+    directory = str(tmpdir.join('templates'))
+    shutil.copytree('tests/jinja_templating_test_files', directory)
+    return directory
+
+
+@pytest.fixture
+def cache_directory(tmpdir):
+    return str(tmpdir.join('cache'))
+
+
+def _render_all(templates_directory, cache_directory):
+    loader = _make_json_template_loader(templates_directory, cache_directory)
+    return {
+        name: loader(os.path.join(templates_directory, name))
+        for name in ('base.json', 'include.json', 'override.json', 'patch.json')
+    }
+
+
+def test_render_cache_hits(templates_directory, cache_directory):
+    rendered = _render_all(templates_directory, cache_directory)
+
+    with mock.patch(
+        'pyramid_mock_server.jinja_utils.DependencyRecordingEnvironment.render_template',
+    ) as mock_render_template:
+        assert _render_all(templates_directory, cache_directory) == rendered
+
+    assert not mock_render_template.called
+
+
+def test_render_cache_dependency_changed(templates_directory, cache_directory):
+    _render_all(templates_directory, cache_directory)
+    with open(os.path.join(templates_directory, 'base.json'), 'w') as f:
+        f.write('{"changed": true}')
+
+    rendered = _render_all(templates_directory, cache_directory)
+
+    assert '"changed"' in rendered['include.json']
+    assert '"changed"' in rendered['override.json']
+    assert '"changed"' in rendered['patch.json']
+
+
+def test_render_cache_records_dependencies(templates_directory, cache_directory):
+    _render_all(templates_directory, cache_directory)
+    render_cache = RenderCache(cache_directory, templates_directory)
+
+    with open(os.path.join(templates_directory, 'include.json'), 'a') as f:
+        f.write(' ')
+    assert render_cache.get('include.json') is None
+    assert render_cache.get('override.json')[1] == {'base.json'}
+
+
+@pytest.mark.parametrize(
+    'entry',
+    [
+        b'not json',
+        b'{"version": 0, "template": "base.json", "hashes": {}, "rendered": "{}"}',
+        b'{"version": 1, "template": "other.json", "hashes": {}, "rendered": "{}"}',
+    ],
+)
+def test_render_cache_invalid_entry(templates_directory, cache_directory, entry):
+    _render_all(templates_directory, cache_directory)
+    render_cache = RenderCache(cache_directory, templates_directory)
+
+    with open(render_cache._entry_path('base.json'), 'wb') as f:
+        f.write(entry)
+    assert render_cache.get('base.json') is None
+
+
+def test_render_cache_missing_dependency(templates_directory, cache_directory):
+    _render_all(templates_directory, cache_directory)
+    os.remove(os.path.join(templates_directory, 'base.json'))
+
+    assert RenderCache(cache_directory, templates_directory).get('include.json') is None
+
+
+def test_render_cache_failed_write(templates_directory, cache_directory):
+    render_cache = RenderCache(
+        cache_directory,
+        templates_directory,
+        json_codec=JSONCodec('broken', json.loads, mock.Mock(side_effect=TypeError)),
+    )
+
+    with pytest.raises(TypeError):
+        render_cache.set('base.json', [], '{}')
+
+    assert os.listdir(cache_directory) == []
+
+
+def test_render_cache_unusable_directory(templates_directory, cache_directory):
+    with mock.patch(
+        'pyramid_mock_server.util.os.makedirs',
+        side_effect=OSError(errno.EACCES, 'Permission denied'),
+    ):
+        with pytest.raises(OSError):
+            RenderCache(cache_directory, templates_directory)
+
+
+def test_render_cache_hits_record_dependencies(templates_directory, cache_directory):
+    _render_all(templates_directory, cache_directory)
+
+    dependency_graph = TemplateDependencyGraph()
+    loader = _make_json_template_loader(
+        templates_directory,
+        cache_directory,
+        dependency_graph=dependency_graph,
+    )
+    with mock.patch(
+        'pyramid_mock_server.jinja_utils.DependencyRecordingEnvironment.render_template',
+    ) as mock_render_template:
+        loader(os.path.join(templates_directory, 'patch.json'))
+
+    assert not mock_render_template.called
+    assert dependency_graph.get_dependents(['base.json']) == {'patch.json'}
+
+
+def test_render_cache_ignores_other_json_codecs(templates_directory, cache_directory):
+    _render_all(templates_directory, cache_directory)
+
+    other_json_codec = JSONCodec('other', json.loads, get_json_codec().dumps)
+    render_cache = RenderCache(cache_directory, templates_directory, json_codec=other_json_codec)
+    assert render_cache.get('base.json') is None
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import hashlib
+import io
+import os
+import pickle
+import zlib
+
+import mock
+import pytest
+
+from pyramid_mock_server.response_body import accepts_gzip
+from pyramid_mock_server.response_body import BodyInterner
+from pyramid_mock_server.response_body import encode_body
+from pyramid_mock_server.response_body import EncodedBody
+from pyramid_mock_server.response_body import SharedFileSnapshot
+from pyramid_mock_server.response_body import snapshot_body
+from pyramid_mock_server.response_body import store_in_arena
+
+
+def test_encode_body():
+    data = '{"message": "é"}'.encode('utf-8')
+    etag = hashlib.sha1(data).hexdigest()
+    assert encode_body('{"message": "é"}') == EncodedBody(
+        data=data,
+        headerlist=(
+            ('Content-Type', 'application/json'),
+            ('Content-Length', '17'),
+            ('ETag', '"{0}"'.format(etag)),
+        ),
+        etag=etag,
+    )
+
+
+def test_encode_body_cache_control():
+    body = encode_body('{}', gzip_min_size=0, cache_control='max-age=60')
+    assert ('Cache-Control', 'max-age=60') in body.headerlist
+    assert ('Cache-Control', 'max-age=60') in body.gzip_headerlist
+
+
+def test_encode_body_gzip():
+    body = encode_body('{"message": "compress me"}', gzip_min_size=10)
+
+    assert zlib.decompress(body.gzip_data, 31) == body.data
+    assert body.select('gzip') == (body.gzip_data, body.gzip_headerlist)
+    assert body.select(None) == (body.data, body.headerlist)
+    assert ('Content-Encoding', 'gzip') in body.gzip_headerlist
+    assert ('Content-Length', str(len(body.gzip_data))) in body.gzip_headerlist
+    assert ('ETag', '"{0}-gzip"'.format(body.etag)) in body.gzip_headerlist
+
+
+def test_encode_body_gzip_below_min_size():
+    body = encode_body('{}', gzip_min_size=10)
+    assert body.gzip_data is None
+    assert body.select('gzip') == (body.data, body.headerlist)
+
+
+@pytest.mark.parametrize(
+    'accept_encoding, result',
+    [
+        (None, False),
+        ('', False),
+        ('identity', False),
+        ('gzip', True),
+        ('deflate, GZIP', True),
+        ('br;q=1.0, gzip;q=0.8', True),
+        ('gzip;q=0', False),
+        ('gzip; q=0.0', False),
+        ('gzip;q=wat', False),
+        ('*', True),
+        ('*;q=0, gzip', True),
+        ('gzip;q=0, *', False),
+        ('br, *;q=0', False),
+        ('gzip;level=1', True),
+        ('gzip;level=1;q=0', False),
+        ('gzipped', False),
+    ],
+)
+def test_accepts_gzip(accept_encoding, result):
+    assert accepts_gzip(accept_encoding) is result
+
+
+@pytest.fixture
+def file_snapshot(tmpdir):
+    path = tmpdir.join('foo_response.GET.raw.json')
+    path.write_binary(b'{"message": "\xc3\xa9"}')
+    return SharedFileSnapshot(str(path))
+
+
+def test_file_snapshot(file_snapshot):
+    assert file_snapshot.size == 17
+    assert file_snapshot.read() == b'{"message": "\xc3\xa9"}'
+    assert file_snapshot.find(b'{{') == -1
+    assert file_snapshot.sha1() == hashlib.sha1(file_snapshot.read()).hexdigest()
+
+    with mock.patch('pyramid_mock_server.response_body._CHUNK_SIZE', 5):
+        assert list(file_snapshot.iter_chunks()) == [
+            b'{"mes', b'sage"', b': "\xc3\xa9', b'"}',
+        ]
+
+
+class _RecordingFileIO(io.FileIO):
+    """ File recording the size of its reads """
+    def __init__(self, path):
+        super(_RecordingFileIO, self).__init__(path, 'r')
+        self.read_sizes = []
+
+    def read(self, size=-1):
+        self.read_sizes.append(size)
+        return super(_RecordingFileIO, self).read(size)
+
+
+def test_file_snapshot_copied_in_chunks(tmpdir):
+    path = tmpdir.join('foo_response.GET.raw.json')
+    path.write_binary(b'{"message": "\xc3\xa9"}')
+    recording_file = _RecordingFileIO(str(path))
+    with mock.patch('pyramid_mock_server.response_body._CHUNK_SIZE', 5), mock.patch(
+        'pyramid_mock_server.response_body.io.open', return_value=recording_file,
+    ):
+        file_snapshot = SharedFileSnapshot(str(path))
+    assert recording_file.read_sizes == [5, 5, 5, 2]
+    assert recording_file.closed
+    assert file_snapshot.read() == b'{"message": "\xc3\xa9"}'
+
+
+def test_file_snapshot_truncated_while_read(tmpdir):
+    path = tmpdir.join('foo_response.GET.raw.json')
+    path.write_binary(b'{}')
+    with mock.patch(
+        'pyramid_mock_server.response_body.os.fstat', return_value=mock.Mock(st_size=10),
+    ), pytest.raises(IOError) as excinfo:
+        SharedFileSnapshot(str(path))
+    assert 'was truncated while it was read' in str(excinfo.value)
+
+
+def test_file_snapshot_empty(tmpdir):
+    path = tmpdir.join('empty.json')
+    path.write_binary(b'')
+    file_snapshot = SharedFileSnapshot(str(path))
+    assert file_snapshot.read() == b''
+    assert list(file_snapshot.iter_chunks()) == []
+
+
+def test_file_snapshot_pickle(file_snapshot):
+    unpickled = pickle.loads(pickle.dumps(file_snapshot))
+    assert unpickled.path == file_snapshot.path
+    assert unpickled.read() == file_snapshot.read()
+
+
+def test_file_snapshot_app_iter(file_snapshot):
+    file_wrapper = mock.Mock()
+    app_iter = file_snapshot.app_iter({'wsgi.file_wrapper': file_wrapper})
+    assert list(app_iter) == [file_snapshot.read()]
+    assert not file_wrapper.called
+
+
+@pytest.mark.parametrize('replacement', [None, b'{}', b'{"message": "\xc3\xa9!"}'])
+def test_file_snapshot_is_a_snapshot(file_snapshot, replacement):
+    if replacement is None:
+        os.remove(file_snapshot.path)
+    else:
+        # Modified in place
+        with open(file_snapshot.path, 'r+b') as f:
+            f.write(replacement)
+            f.truncate()
+
+    assert file_snapshot.size == 17
+    assert file_snapshot.read() == b'{"message": "\xc3\xa9"}'
+    assert b''.join(file_snapshot.app_iter({})) == b'{"message": "\xc3\xa9"}'
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason='Lists the open file descriptors')
+def test_file_snapshot_keeps_no_file_descriptor(tmpdir):
+    paths = []
+    for index in range(20):
+        path = tmpdir.join('{0}_response.GET.raw.json'.format(index))
+        path.write('{}')
+        paths.append(str(path))
+
+    open_fds = len(os.listdir('/proc/self/fd'))
+    file_snapshots = [SharedFileSnapshot(path) for path in paths]
+    assert len(os.listdir('/proc/self/fd')) == open_fds
+    assert [file_snapshot.read() for file_snapshot in file_snapshots] == [b'{}'] * 20
+
+
+def test_snapshot_body(file_snapshot):
+    etag = hashlib.sha1(file_snapshot.read()).hexdigest()
+    assert snapshot_body(file_snapshot, cache_control='max-age=60') == EncodedBody(
+        data=file_snapshot,
+        headerlist=(
+            ('Content-Type', 'application/json'),
+            ('Content-Length', '17'),
+            ('ETag', '"{0}"'.format(etag)),
+            ('Cache-Control', 'max-age=60'),
+        ),
+        etag=etag,
+    )
+    body = snapshot_body(file_snapshot)
+    assert body.select('gzip') == (file_snapshot, body.headerlist)
+
+
+@pytest.fixture(params=[False, True], ids=['memory', 'file'])
+def arena_path(request, tmpdir):
+    return str(tmpdir.join('arena')) if request.param else None
+
+
+def test_store_in_arena(arena_path):
+    datas = [b'{"message": "\xc3\xa9"}', b'', b'{}']
+    slices = store_in_arena(datas, path=arena_path)
+
+    assert [arena_slice.read() for arena_slice in slices] == datas
+    assert [(arena_slice.offset, arena_slice.size) for arena_slice in slices] == [
+        (0, 17), (17, 0), (17, 2),
+    ]
+    with mock.patch('pyramid_mock_server.response_body._CHUNK_SIZE', 5):
+        assert list(slices[0].iter_chunks()) == [
+            b'{"mes', b'sage"', b': "\xc3\xa9', b'"}',
+        ]
+        assert list(slices[2].app_iter({'wsgi.file_wrapper': mock.Mock()})) == [b'{}']
+    assert list(slices[1].iter_chunks()) == []
+    if arena_path is not None:
+        with open(arena_path, 'rb') as f:
+            assert f.read() == b''.join(datas)
+
+
+def test_store_in_arena_empty(arena_path):
+    arena_slice, = store_in_arena([b''], path=arena_path)
+    assert arena_slice.read() == b''
+
+
+def test_store_in_arena_replaces_the_file(tmpdir):
+    path = str(tmpdir.join('arena'))
+    previous_slice, = store_in_arena([b'{"a": 1}'], path=path)
+    arena_slice, = store_in_arena([b'{}'], path=path)
+
+    # The previous arena stays mapped
+    assert previous_slice.read() == b'{"a": 1}'
+    assert arena_slice.read() == b'{}'
+
+
+def test_store_in_arena_failed_write(tmpdir):
+    path = str(tmpdir.join('arena'))
+    with mock.patch.object(os, 'replace', side_effect=OSError, create=True), \
+            mock.patch.object(os, 'rename', side_effect=OSError):
+        with pytest.raises(OSError):
+            store_in_arena([b'{}'], path=path)
+    assert tmpdir.listdir() == []
+
+
+def test_body_interner():
+    body_interner = BodyInterner(gzip_min_size=0, cache_control='max-age=60')
+    with mock.patch(
+        'pyramid_mock_server.response_body._gzip',
+        side_effect=lambda data: data,
+    ) as mock_gzip:
+        json_str, body = body_interner.encode('{"message": "not found"}')
+        # Built from a different string, shared anyway
+        same_json_str, same_body = body_interner.encode(''.join('{"message": "not found"}'))
+        assert same_json_str is json_str
+        assert same_body is body
+        assert mock_gzip.call_count == 1
+
+        other_json_str, other_body = body_interner.encode('{}')
+        assert (other_json_str, other_body.data) == ('{}', b'{}')
+        assert body == encode_body(
+            '{"message": "not found"}',
+            gzip_min_size=0,
+            cache_control='max-age=60',
+        )
+
+    assert body_interner.intern('{}', encode_body('{}')) == ('{}', other_body)
+    assert body_interner.intern('[]', encode_body('[]'))[1] == encode_body('[]')
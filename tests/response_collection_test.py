@@ -6,6 +6,7 @@ import pytest
 
 from pyramid_mock_server.mock_loader import MockResponse
 from pyramid_mock_server.response_collection import _ResponseVariations
+from pyramid_mock_server.response_collection import CacheInfo
 from pyramid_mock_server.response_collection import ResponseCollection
 from pyramid_mock_server.util import Operation
 
@@ -207,3 +208,76 @@ def test_match_arg_dict(mock_responses, arg_dict, output):
 def test_response_collection(response_names, response_operation, has_variation):
     collection = ResponseCollection(mock_responses=response_names)
     assert (collection.get_variations(response_operation) is None) != has_variation
+
+
+def test_match_arg_dict_no_matching_variation():
+    variations = _ResponseVariations(mock_responses=response_collection_foo[:2])
+    with pytest.raises(LookupError):
+        variations.match_arg_dict({'foo_id': '34'})
+
+
+def test_match_arg_dict_after_adding_variation():
+    variations = _ResponseVariations(mock_responses=response_variations_foo_bar[:2])
+    assert variations.match_arg_dict({'foo_id': 'bar', 'bar_id': '34'}).operation == \
+        Operation('foo_{foo_id}_bar_{bar_id}', 'GET')
+
+    variations.add_mock_response(response_variations_foo_bar[4])
+    assert variations.match_arg_dict({'foo_id': 'bar', 'bar_id': '34'}).operation == \
+        Operation('foo_{foo_id#bar}_bar_{bar_id}', 'GET')
+
+
+def test_match_arg_dict_cache():
+    variations = _ResponseVariations(mock_responses=response_variations_foo_bar, match_cache_size=2)
+    assert variations.match_cache_info() == CacheInfo(0, 0, 2, 0)
+
+    for arg_dict in (
+        {'foo_id': 'bar', 'bar_id': '33'},
+        {'foo_id': 'bar', 'bar_id': '33'},
+        {'foo_id': 'bar', 'bar_id': '34'},
+        {'foo_id': 'x', 'bar_id': 'x'},
+        {'foo_id': 'bar', 'bar_id': '33'},
+    ):
+        expected = _ResponseVariations(mock_responses=response_variations_foo_bar)
+        assert variations.match_arg_dict(arg_dict) == expected.match_arg_dict(arg_dict)
+
+    # The first arguments were evicted by the third and fourth ones
+    assert variations.match_cache_info() == CacheInfo(1, 4, 2, 2)
+
+    variations.add_mock_response(response_variations_foo_bar[0])
+    assert variations.match_cache_info() == CacheInfo(0, 0, 2, 0)
+
+
+def test_match_arg_dict_cache_disabled():
+    variations = _ResponseVariations(mock_responses=response_variations_foo_bar)
+    assert variations.match_cache_info() is None
+
+
+def test_get_single_mock_response_several_variations():
+    variations = _ResponseVariations(mock_responses=response_variations_foo_bar)
+    assert variations.get_single_mock_response() is None
+
+
+def test_get_single_mock_response():
+    variations = _ResponseVariations(mock_responses=response_collection_foo[:1])
+    assert variations.get_single_mock_response() == response_collection_foo[0]
+
+
+def test_response_collection_remove_operation():
+    collection = ResponseCollection(mock_responses=response_variations_foo_bar)
+    version = collection.version
+
+    collection.remove_operation(Operation('bar', 'GET'))
+    assert collection.version == version
+
+    removed_operation = Operation('foo_{foo_id#bar}_bar_{bar_id}', 'GET')
+    collection.remove_operation(removed_operation)
+    assert collection.version == version + 1
+
+    expected = _ResponseVariations(mock_responses=[
+        mock_response
+        for mock_response in response_variations_foo_bar
+        if mock_response.operation != removed_operation
+    ])
+    arg_dict = {'foo_id': 'bar', 'bar_id': '34'}
+    assert collection.get_variations(removed_operation).match_arg_dict(arg_dict) == \
+        expected.match_arg_dict(arg_dict)
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import mock
+import pytest
+from pyramid.config import Configurator
+from pyramid.exceptions import URLDecodeError
+from pyramid.interfaces import IRoutesMapper
+from pyramid.testing import DummyRequest
+from pyramid.urldispatch import RoutesMapper
+
+from pyramid_mock_server.router import build_route_index
+from pyramid_mock_server.router import parse_route_pattern
+from pyramid_mock_server.router import RadixRoutesMapper
+from pyramid_mock_server.router import use_radix_routes_mapper
+
+
+PATTERNS = [
+    '/',
+    '/foo',
+    '/foo/bar',
+    '/foo/{foo_id}',
+    '/foo/{foo_id}/bar',
+    '/{name}/bar',
+    '/{name}/{other}/baz',
+    'relative/{name}',
+    '/foo/{foo_id:\\d+}/qux',
+    '/foo/{foo_id}/qux',
+    '/files/*subpath',
+    '/prefix-{name}',
+    '/trailing/',
+    '/foo/bar',
+]
+
+PATHS = [
+    '/',
+    '',
+    '/foo',
+    '/foo/',
+    '/foo/bar',
+    '/foo/123',
+    '/foo/123/bar',
+    '/qux/bar',
+    '//bar',
+    '/a/b/baz',
+    '/relative/x',
+    '/foo/123/qux',
+    '/foo/abc/qux',
+    '/files/a/b',
+    '/prefix-x',
+    '/trailing',
+    '/trailing/',
+    '/unknown/path/with/segments',
+    '/foo/%C3%A9',
+]
+
+
+def _make_mappers(patterns):
+    mappers = RoutesMapper(), RadixRoutesMapper()
+    for mapper in mappers:
+        for index, pattern in enumerate(patterns):
+            mapper.connect('route_{0}'.format(index), pattern)
+    return mappers
+
+
+def _make_request(path):
+    # Pyramid 1 routes the PATH_INFO of the environ, pyramid 2 the request path_info
+    request = DummyRequest(path=path, environ={'PATH_INFO': str(path)})
+    request.path_info = path
+    return request
+
+
+def _describe(info):
+    route = info['route']
+    return (route.name if route is not None else None), info['match']
+
+
+@pytest.mark.parametrize(
+    'pattern, expected_segments',
+    [
+        ('/', [(False, '')]),
+        ('/foo/{foo_id}', [(False, 'foo'), (True, 'foo_id')]),
+        ('foo/{foo_id}/', [(False, 'foo'), (True, 'foo_id'), (False, '')]),
+        ('/foo/{foo_id:\\d+}', None),
+        ('/foo/prefix-{foo_id}', None),
+        ('/foo/*subpath', None),
+        ('/foo/:foo_id', None),
+    ],
+)
+def test_parse_route_pattern(pattern, expected_segments):
+    assert parse_route_pattern(pattern) == expected_segments
+
+
+def test_build_route_index():
+    mapper = RoutesMapper()
+    foo = mapper.connect('foo', '/foo/{foo_id}')
+    regex = mapper.connect('regex', '/foo/{foo_id:\\d+}')
+    predicate = mapper.connect('predicate', '/bar', predicates=[lambda info, request: True])
+
+    tree, other_routes = build_route_index(mapper.get_routes())
+    assert other_routes == [(1, regex), (2, predicate)]
+    assert tree.match('/foo/1') == (0, foo, {'foo_id': '1'})
+    assert tree.match('/bar') is None
+
+
+@pytest.mark.parametrize('path', PATHS)
+def test_radix_routes_mapper_matches_like_pyramid(path):
+    pyramid_mapper, radix_mapper = _make_mappers(PATTERNS)
+    request = _make_request(path)
+
+    assert _describe(radix_mapper(request)) == _describe(pyramid_mapper(request))
+
+
+@pytest.mark.parametrize('patterns', [PATTERNS, list(reversed(PATTERNS)), []])
+def test_radix_routes_mapper_first_registered_route_wins(patterns):
+    for path in PATHS:
+        pyramid_mapper, radix_mapper = _make_mappers(patterns)
+        request = _make_request(path)
+
+        assert _describe(radix_mapper(request)) == _describe(pyramid_mapper(request)), path
+
+
+def test_radix_routes_mapper_predicates():
+    radix_mapper = RadixRoutesMapper()
+    radix_mapper.connect('never', '/foo/{foo_id}', predicates=[lambda info, request: False])
+    radix_mapper.connect('always', '/foo/{foo_id}', predicates=[lambda info, request: True])
+    radix_mapper.connect('fallback', '/foo/{foo_id}')
+    request = DummyRequest(path='/foo/1')
+    request.path_info = '/foo/1'
+
+    assert _describe(radix_mapper(request)) == ('always', {'foo_id': '1'})
+
+
+def test_radix_routes_mapper_rebuilds_the_tree_on_connect():
+    radix_mapper = RadixRoutesMapper()
+    radix_mapper.connect('foo', '/foo')
+    request = DummyRequest(path='/bar')
+    request.path_info = '/bar'
+
+    assert _describe(radix_mapper(request)) == (None, None)
+
+    # Connecting a route with an existing name replaces it
+    radix_mapper.connect('foo', '/bar')
+    assert _describe(radix_mapper(request)) == ('foo', {})
+
+
+def test_radix_routes_mapper_path_info_errors():
+    radix_mapper = RadixRoutesMapper()
+    radix_mapper.connect('root', '/')
+
+    request = mock.Mock()
+    type(request).path_info = mock.PropertyMock(side_effect=KeyError)
+    assert _describe(radix_mapper(request)) == ('root', {})
+
+    type(request).path_info = mock.PropertyMock(
+        side_effect=UnicodeDecodeError(str('utf-8'), b'\xff', 0, 1, str('invalid')),
+    )
+    with pytest.raises(URLDecodeError):
+        radix_mapper(request)
+
+
+def test_use_radix_routes_mapper_keeps_the_routes():
+    config = Configurator()
+    config.add_route('foo', '/foo')
+    config.add_static_view('static', 'tests:')
+    config.commit()
+    mapper = config.registry.getUtility(IRoutesMapper)
+
+    use_radix_routes_mapper(config)
+    radix_mapper = config.registry.getUtility(IRoutesMapper)
+    assert isinstance(radix_mapper, RadixRoutesMapper)
+    assert radix_mapper.get_routes() == mapper.get_routes()
+    assert radix_mapper.get_routes(include_static=True) == mapper.get_routes(include_static=True)
+
+    use_radix_routes_mapper(config)
+    assert config.registry.getUtility(IRoutesMapper) is radix_mapper
+
+
+def test_use_radix_routes_mapper_without_routes():
+    config = Configurator()
+    use_radix_routes_mapper(config)
+    config.add_route('foo', '/foo')
+    config.commit()
+
+    radix_mapper = config.registry.getUtility(IRoutesMapper)
+    assert isinstance(radix_mapper, RadixRoutesMapper)
+    assert [route.name for route in radix_mapper.get_routes()] == ['foo']
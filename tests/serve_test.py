@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import errno
+import json
+import signal
+import threading
+
+import mock
+import pytest
+from pyramid.request import Request
+from six.moves.urllib.request import urlopen
+from webtest import TestApp
+
+from pyramid_mock_server import serve
+from pyramid_mock_server.fast_app import FastMockApp
+from pyramid_mock_server.serve import _make_listen_socket
+from pyramid_mock_server.serve import _run_worker
+from pyramid_mock_server.serve import _serve_prefork
+from pyramid_mock_server.serve import _WorkerServer
+from pyramid_mock_server.serve import main
+from pyramid_mock_server.serve import make_wsgi_app
+
+
+SWAGGER_SPEC = 'tests/view_maker_test_files/swagger.json'
+MOCK_RESPONSES = 'tests/view_maker_test_files/responses'
+
+
+@pytest.fixture
+def listen_socket():
+    listen_socket = _make_listen_socket('127.0.0.1', 0, 8)
+    yield listen_socket
+    listen_socket.close()
+
+
+@pytest.fixture
+def mock_os():
+    with mock.patch.object(serve, 'os') as mock_os, \
+            mock.patch.object(serve.signal, 'signal') as mock_signal:
+        mock_os.signal_handlers = mock_signal
+        yield mock_os
+
+
+@pytest.fixture
+def mock_time():
+    with mock.patch.object(serve, 'time') as mock_time:
+        mock_time.time.return_value = 0
+        yield mock_time
+
+
+def _stop(mock_os, signum):
+    handler = dict(call[0] for call in mock_os.signal_handlers.call_args_list)[signum]
+    handler(signum, None)
+
+
+def test_make_wsgi_app():
+    app = TestApp(make_wsgi_app(
+        SWAGGER_SPEC,
+        MOCK_RESPONSES,
+        custom_view_packages=['tests.view_maker_test'],
+        settings={'pyramid_mock_server.gzip_min_size': '0'},
+    ))
+
+    assert app.get('/foo').json == {'message': 'You got foo'}
+    assert app.post('/foo/bar').json == {'message': 'lloll'}
+    assert app.app.registry.settings['pyramid_mock_server.gzip_min_size'] == '0'
+
+    # The compressed bodies are not validated
+    request = Request.blank('/foo', headers={str('Accept-Encoding'): str('gzip')})
+    response = request.get_response(app.app)
+    assert response.content_encoding == 'gzip'
+    response.decode_content()
+    assert response.json == {'message': 'You got foo'}
+    assert not app.app.registry.settings['pyramid_swagger.enable_response_validation']
+
+
+def test_make_wsgi_app_validates_the_responses():
+    app = make_wsgi_app(SWAGGER_SPEC, MOCK_RESPONSES)
+    assert app.registry.settings['pyramid_swagger.enable_response_validation']
+
+
+@pytest.mark.parametrize('access_log', [False, True])
+def test_worker_server(listen_socket, access_log, capsys):
+    server = _WorkerServer(listen_socket, access_log=access_log)
+    server.set_app(make_wsgi_app(SWAGGER_SPEC, MOCK_RESPONSES))
+    port = listen_socket.getsockname()[1]
+    assert server.server_port == port
+
+    # Handle the request without a thread of its own, to wait for its end
+    with mock.patch.object(_WorkerServer, 'process_request', serve.WSGIServer.process_request):
+        thread = threading.Thread(target=server.handle_request)
+        thread.start()
+        response = urlopen('http://127.0.0.1:{0}/foo'.format(port))
+        thread.join()
+
+    assert json.loads(response.read().decode('utf-8')) == {'message': 'You got foo'}
+    assert ('GET /foo' in capsys.readouterr()[1]) == access_log
+
+
+@pytest.mark.parametrize(
+    'serve_forever_effect, expected_status',
+    [(None, 0), (RuntimeError, 1)],
+)
+def test_run_worker(mock_os, serve_forever_effect, expected_status):
+    server = mock.Mock(**{'serve_forever.side_effect': serve_forever_effect})
+    _run_worker(server)
+
+    mock_os._exit.assert_called_once_with(expected_status)
+    assert mock_os.signal_handlers.call_args_list == [
+        mock.call(signal.SIGTERM, signal.SIG_DFL),
+        mock.call(signal.SIGINT, signal.SIG_IGN),
+    ]
+
+
+def test_serve_prefork(mock_os, mock_time, capsys):
+    mock_os.fork.side_effect = [101, 102, 103]
+
+    wait_results = iter([
+        # A worker dies, it is replaced
+        lambda: (101, 256),
+        lambda: _stop(mock_os, signal.SIGTERM) or (102, 0),
+        lambda: OSError(errno.EINTR, 'Interrupted system call'),
+        lambda: (103, 0),
+    ])
+
+    def wait():
+        result = next(wait_results)()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    mock_os.wait.side_effect = wait
+    server = mock.Mock()
+
+    with mock.patch.object(serve.gc, 'freeze', create=True) as mock_freeze:
+        _serve_prefork(server, 2)
+
+    assert mock_freeze.called
+    assert mock_os.fork.call_count == 3
+    assert mock_os.kill.call_args_list in (
+        [mock.call(102, signal.SIGTERM), mock.call(103, signal.SIGTERM)],
+        [mock.call(103, signal.SIGTERM), mock.call(102, signal.SIGTERM)],
+    )
+    assert 'Worker 101 exited with status 256' in capsys.readouterr()[1]
+
+
+def test_serve_prefork_backs_off_the_workers_exiting_at_startup(mock_os, mock_time):
+    mock_os.fork.side_effect = [101, 102, 103, 104]
+    mock_os.wait.side_effect = [(101, 256), (102, 256), (103, 256), (104, 256)]
+    # Fork and exit times of the workers, the third one lives long enough
+    mock_time.time.side_effect = [0, 0.5, 1, 1.2, 2, 10, 10, 10.5]
+    sleeps = []
+
+    def sleep(delay):
+        sleeps.append(delay)
+        if len(sleeps) == 3:
+            _stop(mock_os, signal.SIGTERM)
+
+    mock_time.sleep.side_effect = sleep
+    _serve_prefork(mock.Mock(), 1)
+
+    assert sleeps == [0.1, 0.2, 0.1]
+    assert mock_os.fork.call_count == 4
+
+
+def test_serve_prefork_in_the_worker(mock_os, mock_time):
+    mock_os.fork.return_value = 0
+    with mock.patch.object(serve, '_run_worker', side_effect=SystemExit) as mock_run_worker:
+        with pytest.raises(SystemExit):
+            _serve_prefork(mock.sentinel.server, 2)
+    mock_run_worker.assert_called_once_with(mock.sentinel.server)
+
+
+def test_serve_prefork_wait_error(mock_os, mock_time):
+    mock_os.fork.side_effect = [101]
+    mock_os.wait.side_effect = OSError(errno.ECHILD, 'No child processes')
+    with pytest.raises(OSError):
+        _serve_prefork(mock.Mock(), 1)
+
+
+@pytest.mark.parametrize('fast', [False, True])
+def test_main(fast, capsys):
+    argv = [
+        'serve',
+        '--fast' if fast else '--access-log',
+        '--port', '0',
+        '--workers', '3',
+        '-s', 'pyramid_mock_server.gzip_min_size=0',
+        '-s', 'pyramid_swagger.enable_response_validation=',
+        '-c', 'tests.view_maker_test',
+        '--',
+        SWAGGER_SPEC,
+        MOCK_RESPONSES,
+    ]
+    with mock.patch.object(serve._WorkerServer, 'server_close', autospec=True) as mock_close:
+        with mock.patch.object(serve, '_serve_prefork') as mock_serve_prefork:
+            assert main(argv) == 0
+
+    server, workers = mock_serve_prefork.call_args[0]
+    assert workers == 3
+    assert isinstance(server.get_app(), FastMockApp) == fast
+    pyramid_app = server.get_app()._pyramid_app if fast else server.get_app()
+    # The bodies are stored in shared memory by default
+    assert pyramid_app.registry.pyramid_mock_server_load_stats.arena_size > 0
+    mock_close.assert_called_once_with(server)
+    server.server_close()
+    assert 'with 3 workers' in capsys.readouterr()[1]
+
+
+@pytest.mark.parametrize(
+    'argv',
+    [
+        [],
+        ['serve', SWAGGER_SPEC],
+        ['serve', '-s', 'no_value', SWAGGER_SPEC, MOCK_RESPONSES],
+        ['serve', '-s', 'pyramid_mock_server.reload_interval=1', SWAGGER_SPEC, MOCK_RESPONSES],
+    ],
+)
+def test_main_invalid_arguments(argv):
+    with pytest.raises(SystemExit):
+        main(argv)
@@ -132,4 +132,19 @@ def test_includeme():
         resources=[],
         excluded_paths=None,
         custom_view_packages=None,
+        match_cache_size=0,
+        gzip_min_size=None,
+        cache_control=None,
+        lazy_rendering=False,
+        load_workers=0,
+        render_cache_directory=None,
+        bytecode_cache_directory=None,
+        reload_interval=None,
+        json_codec=None,
+        json_format=None,
+        detect_static_files=False,
+        ignore_patterns=[],
+        radix_routing=False,
+        fault_profiles_path=None,
+        response_arena=None,
     )
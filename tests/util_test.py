@@ -2,19 +2,35 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import os
+
 import mock
 import pytest
 
+from pyramid_mock_server import util
+from pyramid_mock_server.util import ArgPatterns
+from pyramid_mock_server.util import atomic_write
 from pyramid_mock_server.util import check_file_is_valid
 from pyramid_mock_server.util import extract_arg_pattern_from_query_args
 from pyramid_mock_server.util import extract_arg_pattern_from_response_name
 from pyramid_mock_server.util import extract_normalized_response_name
 from pyramid_mock_server.util import extract_operation_and_response_code_from_filename
+from pyramid_mock_server.util import get_arg_patterns
+from pyramid_mock_server.util import intern_operation
 from pyramid_mock_server.util import make_operation_from_path
 from pyramid_mock_server.util import norm_operation
 from pyramid_mock_server.util import Operation
 
 
+@pytest.fixture(autouse=True)
+def empty_parsing_caches():
+    with mock.patch.dict(util._interned_operations, clear=True), \
+            mock.patch.dict(util._operations_by_filename, clear=True), \
+            mock.patch.dict(util._normed_operations, clear=True), \
+            mock.patch.dict(util._arg_patterns_by_operation, clear=True):
+        yield
+
+
 @pytest.mark.parametrize(
     'filename, result',
     [
@@ -233,3 +249,76 @@ def test_norm_operation_use_extract_normalized_response_name():
         norm_operation(Operation('foo_{business_id#12}', 'POST', '{business_ids#32,32,32}'))
 
     mocked_normalize.assert_called_once_with('foo_{business_id#12}')
+
+
+def test_extract_operation_and_response_code_from_filename_memoized():
+    filename = 'foo_{foo_id#1}_query{bar#2}_response.404.GET'
+    operation, http_code = extract_operation_and_response_code_from_filename(filename)
+    with mock.patch('pyramid_mock_server.util._filename_regex_match') as mock_match:
+        assert extract_operation_and_response_code_from_filename(filename) == (operation, 404)
+        assert extract_operation_and_response_code_from_filename(filename)[0] is operation
+        assert check_file_is_valid(filename) is True
+    assert not mock_match.called
+
+
+def test_intern_operation():
+    operation = Operation('foo_bar_interned', 'GET')
+    assert intern_operation(operation) is operation
+    assert intern_operation(Operation('foo_bar_interned', 'GET')) is operation
+    assert make_operation_from_path('/foo/bar_interned', 'get') is operation
+    assert extract_operation_and_response_code_from_filename(
+        'foo_bar_interned_response.GET',
+    )[0] is operation
+
+
+def test_norm_operation_memoized():
+    operation = Operation('foo_{foo_id#memoized}', 'post', query_args='{a#1}')
+    normed = norm_operation(operation)
+    assert normed == Operation('foo_{foo_id}', 'POST')
+    with mock.patch('pyramid_mock_server.util.extract_normalized_response_name') as mock_extract:
+        assert norm_operation(Operation('foo_{foo_id#memoized}', 'post', query_args='{a#1}')) \
+            is normed
+    assert not mock_extract.called
+
+
+def test_get_arg_patterns():
+    operation = Operation('foo_{foo_id#1}_{bar_id}', 'GET', query_args='{limit#2}{foo_id#3}')
+    arg_patterns = get_arg_patterns(operation)
+    assert arg_patterns == ArgPatterns(
+        path={'foo_id': '1', 'bar_id': None},
+        query={'limit': '2', 'foo_id': '3'},
+        combined={'foo_id': '3', 'bar_id': None, 'limit': '2'},
+    )
+    assert get_arg_patterns(Operation('foo_{foo_id#1}_{bar_id}', 'GET', '{limit#2}{foo_id#3}')) \
+        is arg_patterns
+
+    assert get_arg_patterns(Operation('foo', 'GET')) == ArgPatterns({}, {}, {})
+
+    # Errors are raised each time
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            get_arg_patterns(Operation('foo_{foo_id#1#2}', 'GET'))
+
+
+def test_atomic_write(tmpdir):
+    path = tmpdir.join('file')
+    path.write_binary(b'previous')
+    with open(str(path), 'rb') as previous_file:
+        atomic_write(str(path), lambda f: f.write(b'content'))
+        assert previous_file.read() == b'previous'
+    assert path.read_binary() == b'content'
+    assert tmpdir.listdir() == [path]
+
+
+@pytest.mark.parametrize('failing', ['write', 'rename'])
+def test_atomic_write_failure(tmpdir, failing):
+    def write(f):
+        if failing == 'write':
+            raise IOError
+        f.write(b'content')
+
+    with mock.patch.object(os, 'replace', side_effect=OSError, create=True), \
+            mock.patch.object(os, 'rename', side_effect=OSError):
+        with pytest.raises((IOError, OSError)):
+            atomic_write(str(tmpdir.join('file')), write)
+    assert tmpdir.listdir() == []
@@ -2,9 +2,13 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import json
 import sys
+import zlib
+from wsgiref.util import FileWrapper
 
 import pytest
+from pyramid.request import Request
 from pyramid.response import Response
 
 from .conftest import create_test_app
@@ -13,28 +17,35 @@ from pyramid_mock_server.view_maker import register_custom_view
 
 @pytest.fixture(
     scope='session',
-    params=[True, False],
-    ids=['custom_view_packages_as_string', 'custom_view_packages_as_python_module'],
+    params=[(True, False), (False, False), (True, True)],
+    ids=[
+        'custom_view_packages_as_string',
+        'custom_view_packages_as_python_module',
+        'radix_routing',
+    ],
 )
 def mock_app(request):
+    packages_as_string, radix_routing = request.param
     custom_view_packages = __name__
-    if not request.param:
+    if not packages_as_string:
         custom_view_packages = sys.modules[custom_view_packages]
 
     return create_test_app(
         'tests/view_maker_test_files',
         'tests/view_maker_test_files/responses',
         packages=[custom_view_packages],
+        settings={'pyramid_mock_server.radix_routing': str(radix_routing)},
     )
 
 
-@pytest.fixture(scope='session')
-def mock_app_exclude():
+@pytest.fixture(scope='session', params=[False, True], ids=['', 'radix_routing'])
+def mock_app_exclude(request):
     return create_test_app(
         'tests/view_maker_test_files',
         'tests/view_maker_test_files/responses',
         packages=None,
         excluded_path=['/exclude_me'],
+        settings={'pyramid_mock_server.radix_routing': str(request.param)},
     )
 
 
@@ -98,6 +109,13 @@ def custom_view(request):
             '404/get',
             404,
         ),
+        # The query arguments take precedence over the path ones
+        (
+            '/foo/something/v1?foo_id=404',
+            'GET',
+            '404/get',
+            404,
+        ),
         (
             '/foo/something/v1',
             'POST',
@@ -147,3 +165,112 @@ def test_not_found(mock_app_exclude, path, request_method, exception):
 )
 def test_excluded(mock_app_exclude, path, request_method):
     mock_app_exclude.request(path, method=request_method, status=404)
+
+
+def test_response_headers(mock_app):
+    result = mock_app.request('/foo', method='GET', status=200)
+    assert result.content_type == 'application/json'
+    assert result.content_length == len(result.body)
+
+
+@pytest.fixture(scope='session')
+def mock_app_gzip():
+    return create_test_app(
+        'tests/view_maker_test_files',
+        'tests/view_maker_test_files/responses',
+        settings={
+            # Response validation would be performed on the compressed body
+            'pyramid_swagger.enable_response_validation': False,
+            'pyramid_mock_server.gzip_min_size': '0',
+        },
+    )
+
+
+@pytest.mark.parametrize(
+    'accept_encoding, content_encoding',
+    [
+        (None, None),
+        ('identity', None),
+        ('gzip, deflate', 'gzip'),
+    ],
+)
+def test_gzip_response(mock_app_gzip, accept_encoding, content_encoding):
+    # TestApp transparently decodes the responses, let's look at what is actually sent
+    request = Request.blank('/foo')
+    if accept_encoding:
+        request.headers['Accept-Encoding'] = str(accept_encoding)
+    result = request.get_response(mock_app_gzip.app)
+
+    assert result.headers.get('Content-Encoding') == content_encoding
+    assert result.headers['Vary'] == 'Accept-Encoding'
+    body = result.body
+    if content_encoding:
+        body = zlib.decompress(body, 31)
+    assert json.loads(body.decode('utf-8'))['message'] == 'You got foo'
+
+
+@pytest.mark.parametrize(
+    'path, request_method, status, conditional_status',
+    [
+        ('/foo', 'GET', 200, 304),
+        ('/foo/something/v1', 'POST', 200, 200),
+        ('/foo/404/v1', 'GET', 404, 404),
+    ],
+)
+def test_if_none_match(mock_app, path, request_method, status, conditional_status):
+    etag = mock_app.request(path, method=request_method, status=status).headers['ETag']
+    result = mock_app.request(
+        path,
+        method=request_method,
+        headers={'If-None-Match': etag},
+        status=conditional_status,
+    )
+    assert result.headers['ETag'] == etag
+    assert (result.body == b'') == (conditional_status == 304)
+
+
+def test_if_none_match_other_etag(mock_app):
+    mock_app.request('/foo', method='GET', headers={'If-None-Match': str('"other"')}, status=200)
+
+
+def test_cache_control():
+    mock_app = create_test_app(
+        'tests/view_maker_test_files',
+        'tests/view_maker_test_files/responses',
+        settings={'pyramid_mock_server.cache_control': 'max-age=60'},
+    )
+    result = mock_app.request('/foo', method='GET', status=200)
+    assert result.headers['Cache-Control'] == 'max-age=60'
+
+
+def test_lazy_rendering():
+    mock_app = create_test_app(
+        'tests/view_maker_test_files',
+        'tests/view_maker_test_files/responses',
+        settings={'pyramid_mock_server.lazy_rendering': 'true'},
+    )
+    assert mock_app.request('/foo/42/v1', method='POST', status=200).json['message'] == '42'
+
+
+@pytest.fixture(scope='session')
+def mock_app_static_files():
+    return create_test_app(
+        'tests/view_maker_test_files',
+        'tests/view_maker_test_files/responses',
+        settings={'pyramid_mock_server.detect_static_files': 'true'},
+    )
+
+
+@pytest.mark.parametrize('file_wrapper', [None, FileWrapper])
+def test_static_files(mock_app_static_files, file_wrapper):
+    request = Request.blank('/foo')
+    if file_wrapper is not None:
+        request.environ['wsgi.file_wrapper'] = file_wrapper
+    result = request.get_response(mock_app_static_files.app)
+
+    assert result.status_int == 200
+    assert result.body == b'{\n\t"message": "You got foo"\n}\n'
+    assert result.content_length == len(result.body)
+
+    etag = result.headers['ETag']
+    mock_app_static_files.request('/foo', headers={'If-None-Match': etag}, status=304)